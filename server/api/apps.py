@@ -1,6 +1,7 @@
 # api/apps.py
 from django.apps import AppConfig
 import os
+import sys
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,12 @@ class ApiConfig(AppConfig):
     mqtt_handler = None
 
     def ready(self):
+        from . import signals  # noqa: F401 (invalidação do cache de rovers)
+
+        if not self._should_start_mqtt_handler():
+            logger.info("MQTT Handler desativado neste processo (ingestão externa)")
+            return
+
         if os.environ.get('RUN_MAIN', None) != 'true':
             logger.info("Iniciando MQTT Handler...")
             from .mqtt_handler import MQTTHandler
@@ -20,3 +27,11 @@ class ApiConfig(AppConfig):
                 logger.info("MQTT Handler iniciado com sucesso!")
             except Exception as e:
                 logger.error(f"Erro ao iniciar MQTT Handler: {e}", exc_info=True)
+
+    @staticmethod
+    def _should_start_mqtt_handler():
+        from django.conf import settings
+        # O serviço asyncio (`manage.py run_ingest`) substitui o MQTTHandler
+        if 'run_ingest' in sys.argv:
+            return False
+        return settings.MQTT_INGEST_MODE == 'thread'
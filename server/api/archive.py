@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from .models import RoverTelemetry, SensorReading, TelemetryArchive
+from .parquet_export import export_parquet
+
+logger = logging.getLogger(__name__)
+
+# Tabelas arquivadas (TelemetryArchive.table): modelo de origem. Os arquivos
+# usam as colunas e tipos de api.parquet_export.PARQUET_SOURCES.
+ARCHIVE_MODELS = {
+    'telemetry': RoverTelemetry,
+    'sensors': SensorReading,
+}
+
+# Índice de todas as partes, na raiz do arquivo frio (inspeção e restauração sem o banco)
+MANIFEST_NAME = 'manifest.json'
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir():
+    return Path(settings.TELEMETRY_ARCHIVE_DIR)
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def archive_days(table, before):
+    """
+    [(dia, {pks dos rovers})] com linhas de `table` no banco anteriores ao
+    dia `before` (UTC), do dia mais antigo em diante.
+    """
+    model = ARCHIVE_MODELS[table]
+    oldest = model.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None:
+        return []
+
+    days = []
+    day = oldest.astimezone(dt_timezone.utc).date()
+    while day < before:
+        start, end = day_bounds(day)
+        rovers = set(model.objects.filter(timestamp__gte=start, timestamp__lt=end).values_list('rover_id', flat=True).distinct())
+        if rovers:
+            days.append((day, rovers))
+        day += timedelta(days=1)
+    return days
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+        os.fsync(f.fileno())
+    return digest.hexdigest()
+
+
+def archive_day(table, rover, day):
+    """
+    Move as linhas de `table` do rover no dia (UTC) para um arquivo Parquet:
+    grava o arquivo (temporário, fsync e rename) e, em uma transação,
+    registra a parte no manifesto e remove do banco exatamente as linhas
+    gravadas. Retorna o TelemetryArchive criado, ou None se não houver linhas.
+    """
+    start, end = day_bounds(day)
+    queryset = ARCHIVE_MODELS[table].objects.filter(rover=rover, timestamp__gte=start, timestamp__lt=end)
+    # Linhas inseridas durante o arquivamento ficam para uma próxima parte
+    last_id = queryset.aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return None
+    queryset = queryset.filter(id__lte=last_id)
+
+    last_part = TelemetryArchive.objects.filter(table=table, rover=rover, day=day).aggregate(last=Max('part'))['last']
+    part = 0 if last_part is None else last_part + 1
+    name = f'{day.isoformat()}.parquet' if part == 0 else f'{day.isoformat()}.{part}.parquet'
+    relative = f"{table}/{rover.identifier.replace('/', '_')}/{name}"
+
+    path = archive_dir() / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp')
+    rows = export_parquet(table, queryset, str(temporary))
+    sha256 = _file_sha256(temporary)
+    os.replace(temporary, path)
+
+    try:
+        with transaction.atomic():
+            deleted, _ = queryset.delete()
+            if deleted != rows:
+                raise ArchiveError(
+                    f"{table} de {rover.identifier} em {day.isoformat()}: {rows} linhas gravadas, mas {deleted} removidas"
+                )
+            entry = TelemetryArchive.objects.create(
+                table=table,
+                rover=rover,
+                day=day,
+                part=part,
+                path=relative,
+                rows=rows,
+                size_bytes=path.stat().st_size,
+                sha256=sha256,
+            )
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    logger.info(f"{rows} linhas de {table} de {rover.identifier} em {day.isoformat()} arquivadas em {relative}")
+    return entry
+
+
+def write_manifest():
+    """Regrava o manifest.json com todas as partes arquivadas; retorna o número de partes."""
+    entries = [
+        {
+            'table': entry.table,
+            'rover': entry.rover.identifier,
+            'day': entry.day.isoformat(),
+            'part': entry.part,
+            'path': entry.path,
+            'rows': entry.rows,
+            'size_bytes': entry.size_bytes,
+            'sha256': entry.sha256,
+            'archived_at': entry.archived_at.isoformat(),
+        }
+        for entry in TelemetryArchive.objects.select_related('rover').order_by('table', 'day', 'rover__identifier', 'part')
+    ]
+    path = archive_dir() / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({'format': 'parquet', 'entries': entries}, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return len(entries)
+
+
+def archived_between(start, end, rover=None, table=None):
+    """Se algum dia de [start, end) já foi movido para o arquivo frio (do rover e da tabela, se dados)."""
+    entries = TelemetryArchive.objects.filter(
+        day__gte=start.astimezone(dt_timezone.utc).date(),
+        day__lte=(end - timedelta(microseconds=1)).astimezone(dt_timezone.utc).date(),
+    )
+    if rover is not None:
+        entries = entries.filter(rover=rover)
+    if table is not None:
+        entries = entries.filter(table=table)
+    return entries.exists()
@@ -0,0 +1,101 @@
+import struct
+from datetime import datetime, timezone as dt_timezone
+
+import msgpack
+from django.utils.dateparse import parse_datetime
+
+# Codificações compactas da telemetria dos rovers, alternativas ao JSON.
+# Os decodificadores devolvem o mesmo dicionário que o JSON produziria
+# ({'battery', 'temperature', 'speed', 'location': {'lat', 'lng'}, 'status',
+# 'timestamp', 'seq'}), de modo que os handlers não dependem do formato.
+
+# Layout binário fixo, little-endian. O primeiro byte é sempre a versão.
+#   v1: versão (B), status (B), seq (I), timestamp em ms (q),
+#       battery (f), temperature (f), speed (f), lat (d), lng (d) -> 42 bytes
+STRUCT_LAYOUTS = {
+    1: struct.Struct('<BBIqfffdd'),
+}
+STRUCT_VERSION = 1
+
+# Códigos de status do layout binário; códigos desconhecidos viram 'unknown'
+STATUS_CODES = ('unknown', 'active', 'idle', 'charging', 'maintenance', 'offline', 'online', 'error')
+STATUS_BY_NAME = {name: code for code, name in enumerate(STATUS_CODES)}
+
+
+def _iso_from_ms(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=dt_timezone.utc).isoformat()
+
+
+def _ms_from_iso(value):
+    if not value:
+        return int(datetime.now(tz=dt_timezone.utc).timestamp() * 1000)
+    # parse_datetime aceita o sufixo 'Z', recusado pelo fromisoformat do Python 3.10
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"Timestamp inválido: {value!r}")
+    return int(parsed.timestamp() * 1000)
+
+
+def decode_telemetry_struct(payload):
+    """Decodifica a telemetria no layout binário fixo (ver STRUCT_LAYOUTS)."""
+    if not payload:
+        raise ValueError("Payload binário vazio")
+    layout = STRUCT_LAYOUTS.get(payload[0])
+    if layout is None:
+        raise ValueError(f"Versão de layout binário desconhecida: {payload[0]}")
+    try:
+        _, status, seq, timestamp_ms, battery, temperature, speed, lat, lng = layout.unpack(payload)
+    except struct.error as e:
+        raise ValueError(f"Payload binário inválido: {e}") from e
+
+    return {
+        'battery': battery,
+        'temperature': temperature,
+        'speed': speed,
+        'location': {'lat': lat, 'lng': lng},
+        'status': STATUS_CODES[status] if status < len(STATUS_CODES) else 'unknown',
+        'timestamp': _iso_from_ms(timestamp_ms),
+        'seq': seq,
+    }
+
+
+def encode_telemetry_struct(data, version=STRUCT_VERSION):
+    """Codifica um dicionário de telemetria no layout binário (simuladores e testes)."""
+    location = data.get('location') or {}
+    return STRUCT_LAYOUTS[version].pack(
+        version,
+        STATUS_BY_NAME.get(data.get('status'), 0),
+        int(data.get('seq') or 0),
+        _ms_from_iso(data.get('timestamp')),
+        float(data.get('battery', 0)),
+        float(data.get('temperature', 0)),
+        float(data.get('speed', 0)),
+        float(location.get('lat', 0)),
+        float(location.get('lng', 0)),
+    )
+
+
+def decode_telemetry_msgpack(payload):
+    """
+    Decodifica a telemetria em MessagePack, com as mesmas chaves do JSON.
+    O timestamp pode vir como extensão Timestamp do msgpack, inteiro em ms
+    ou string ISO.
+    """
+    data = msgpack.unpackb(payload, raw=False, timestamp=3)
+    if not isinstance(data, dict):
+        raise ValueError("Payload MessagePack de telemetria deve ser um mapa")
+
+    timestamp = data.get('timestamp')
+    if isinstance(timestamp, datetime):
+        data['timestamp'] = timestamp.isoformat()
+    elif isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        data['timestamp'] = _iso_from_ms(timestamp)
+    return data
+
+
+def encode_telemetry_msgpack(data):
+    """Codifica um dicionário de telemetria em MessagePack (simuladores e testes)."""
+    data = dict(data)
+    if isinstance(data.get('timestamp'), str):
+        data['timestamp'] = _ms_from_iso(data['timestamp'])
+    return msgpack.packb(data, use_bin_type=True)
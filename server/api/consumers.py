@@ -1,6 +1,10 @@
+import base64
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 import logging
+from .image_frames import split_image_frame
+from .image_renditions import ORIGINAL, image_group_name, rendition_names
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +13,15 @@ class RoverConsumer(AsyncWebsocketConsumer):
         self.rover_id = self.scope['url_route']['kwargs']['rover_id']
         self.room_group_name = f'rover_{self.rover_id}'
 
+        # ?binary=1: imagens chegam como quadros binários (cabeçalho JSON + JPEG) em vez de base64 em JSON
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.binary_images = query.get('binary', ['0'])[0] in ('1', 'true')
+        # ?rendition=thumb|medium|original: resolução das imagens recebidas
+        self.rendition = query.get('rendition', [ORIGINAL])[0]
+        if self.rendition not in rendition_names():
+            self.rendition = ORIGINAL
+        self.image_group_name = image_group_name(self.rover_id, self.rendition)
+
         logger.info(f"Tentando conectar WebSocket para rover {self.rover_id}")
         logger.info(f"Nome do grupo: {self.room_group_name}")
 
@@ -17,6 +30,10 @@ class RoverConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_add(
+            self.image_group_name,
+            self.channel_name
+        )
 
         logger.info(f"WebSocket connection established for rover {self.rover_id}")
         await self.accept()
@@ -29,6 +46,10 @@ class RoverConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_discard(
+            self.image_group_name,
+            self.channel_name
+        )
         logger.info(f"WebSocket disconnected for rover {self.rover_id} with code {close_code}")
 
     async def telemetry_update(self, event):
@@ -68,11 +89,30 @@ class RoverConsumer(AsyncWebsocketConsumer):
     async def image_update(self, event):
         """
         Handler para atualizações de imagem.
+        Clientes em modo binário recebem o quadro pronto, sem cópias; os demais
+        continuam recebendo o JPEG em base64 dentro do JSON.
         """
         try:
+            frame = event.get('frame')
+            if frame is None:
+                # Evento no formato antigo (base64 em 'data')
+                await self.send(text_data=json.dumps({
+                    'type': 'image_update',
+                    'data': event['data']
+                }))
+                return
+
+            if self.binary_images:
+                await self.send(bytes_data=frame)
+                return
+
+            header, image_bytes = split_image_frame(frame)
             await self.send(text_data=json.dumps({
                 'type': 'image_update',
-                'data': event['data']
+                'data': {
+                    'image': base64.b64encode(image_bytes).decode('ascii'),
+                    'timestamp': header['timestamp']
+                }
             }))
         except Exception as e:
             logger.error(f"Error in image_update: {str(e)}")
@@ -0,0 +1,261 @@
+import json
+import logging
+import threading
+from datetime import timezone as dt_timezone
+
+import redis
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Rover
+from .mqtt_handler import FLEET_SNAPSHOT_KEY, FLEET_VERSION_KEY, telemetry_redis_key
+from .redis_batcher import bump_version
+from .redis_pool import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Colunas lidas na consulta única (rover + último estado, por LEFT JOIN)
+_FLEET_COLUMNS = [
+    'identifier',
+    'name',
+    'latest_state__timestamp',
+    'latest_state__battery_level',
+    'latest_state__temperature',
+    'latest_state__status',
+]
+
+
+def _fleet_queryset(substation_id):
+    return Rover.objects.filter(
+        substation__identifier=substation_id,
+        is_active=True
+    ).values_list(*_FLEET_COLUMNS)
+
+
+def _fleet_keys(substation_id, rovers):
+    return [telemetry_redis_key(substation_id, rover[0]) for rover in rovers]
+
+
+def _merge_fleet(rovers, values):
+    """Junta as linhas do banco com os valores do MGET (na mesma ordem)."""
+    rovers_data = []
+    for (identifier, name, timestamp, battery, temperature, status), data in zip(rovers, values):
+        if data:
+            telemetry = json.loads(data)
+            rovers_data.append({
+                'id': identifier,
+                'name': name,
+                'battery': telemetry.get('battery', 0),
+                'temperature': telemetry.get('temperature', 0),
+                'status': telemetry.get('status', 'unknown'),
+                'last_seen': 'now'  # Dados do Redis são sempre recentes
+            })
+        elif timestamp is not None:
+            rovers_data.append({
+                'id': identifier,
+                'name': name,
+                'battery': battery,
+                'temperature': temperature,
+                'status': status,
+                'last_seen': timestamp.isoformat()
+            })
+        # Rovers sem dados de telemetria ficam de fora
+    return rovers_data
+
+
+def list_fleet(substation_id, redis_client):
+    """
+    Rovers ativos da subestação com os últimos dados, com custo fixo por
+    requisição: uma consulta ao banco (rovers junto com RoverLatestState) e
+    um único MGET no Redis para todos os rovers. Rovers sem dados no Redis
+    (ou com o Redis indisponível) usam o último estado gravado; rovers sem
+    telemetria ficam de fora.
+    """
+    rovers = list(_fleet_queryset(substation_id))
+    if not rovers:
+        return []
+
+    try:
+        values = redis_client.mget(_fleet_keys(substation_id, rovers))
+    except redis.RedisError as e:
+        logger.warning(f"Redis indisponível ao listar os rovers de {substation_id}: {e}")
+        values = [None] * len(rovers)
+    return _merge_fleet(rovers, values)
+
+
+async def alist_fleet(substation_id, redis_client):
+    """list_fleet para views async: ORM async e cliente redis.asyncio."""
+    rovers = [rover async for rover in _fleet_queryset(substation_id)]
+    if not rovers:
+        return []
+
+    try:
+        values = await redis_client.mget(_fleet_keys(substation_id, rovers))
+    except redis.RedisError as e:
+        logger.warning(f"Redis indisponível ao listar os rovers de {substation_id}: {e}")
+        values = [None] * len(rovers)
+    return _merge_fleet(rovers, values)
+
+
+# Colunas do snapshot da frota: subestação, rover e último estado gravado
+_SNAPSHOT_COLUMNS = [
+    'substation__identifier',
+    'substation__name',
+    'identifier',
+    'name',
+    'latest_state__timestamp',
+    'latest_state__battery_level',
+    'latest_state__temperature',
+    'latest_state__speed',
+    'latest_state__latitude',
+    'latest_state__longitude',
+    'latest_state__status',
+]
+
+
+def _cached_state(cached):
+    """
+    Estado do rover no hash do snapshot e o horário em que o servidor o
+    recebeu. Entradas ilegíveis ou sem 'received_at' válido devolvem
+    (None, None): um rover com dados ruins cai para o estado do banco sem
+    derrubar o documento inteiro.
+    """
+    if not cached:
+        return None, None
+    try:
+        state = json.loads(cached)
+        received_at = parse_datetime(state['received_at'])
+    except (KeyError, TypeError, ValueError):
+        return None, None
+    if received_at is None:
+        return None, None
+    if timezone.is_naive(received_at):
+        received_at = timezone.make_aware(received_at, dt_timezone.utc)
+    return state, received_at
+
+
+def _snapshot_rover(row, cached):
+    """Entrada do rover no snapshot: o estado do Redis ou, se for mais antigo ou faltar, o do banco."""
+    (_, _, identifier, name, timestamp, battery, temperature, speed, latitude, longitude, status) = row
+    # Os dois lados são horários de recebimento no servidor (o relógio do rover não entra na comparação)
+    state, received_at = _cached_state(cached)
+    if state and (timestamp is None or received_at >= timestamp):
+        return {
+            'id': identifier,
+            'name': name,
+            'battery': state.get('battery'),
+            'temperature': state.get('temperature'),
+            'speed': state.get('speed'),
+            'latitude': state.get('latitude'),
+            'longitude': state.get('longitude'),
+            'status': state.get('status'),
+            'last_seen': received_at.isoformat(),
+        }
+    if timestamp is None:
+        # Rover sem telemetria: aparece na subestação, sem estado
+        return {'id': identifier, 'name': name, 'status': None, 'last_seen': None}
+    return {
+        'id': identifier,
+        'name': name,
+        'battery': battery,
+        'temperature': temperature,
+        'speed': speed,
+        'latitude': latitude,
+        'longitude': longitude,
+        'status': status,
+        'last_seen': timestamp.isoformat(),
+    }
+
+
+def build_fleet_snapshot(snapshot, version=None):
+    """
+    Documento do snapshot da frota: todas as subestações ativas com os
+    rovers ativos e o último estado de cada um, a partir do hash
+    FLEET_SNAPSHOT_KEY (identifier -> estado, mantido pela ingestão) e de
+    uma única consulta ao banco.
+    """
+    rows = Rover.objects.filter(is_active=True, substation__is_active=True).order_by(
+        'substation__identifier', 'identifier'
+    ).values_list(*_SNAPSHOT_COLUMNS)
+
+    substations = []
+    for row in rows:
+        if not substations or substations[-1]['id'] != row[0]:
+            substations.append({'id': row[0], 'name': row[1], 'rovers': []})
+        substations[-1]['rovers'].append(_snapshot_rover(row, snapshot.get(row[2])))
+    return {
+        'version': version,
+        'generated_at': timezone.now().isoformat(),
+        'substations': substations,
+    }
+
+
+class FleetSnapshot:
+    """
+    Snapshot da frota servido pelo /api/fleet-snapshot/.
+
+    A ingestão grava o último estado de cada rover no hash FLEET_SNAPSHOT_KEY
+    e incrementa FLEET_VERSION_KEY no mesmo pipeline; alterações de rovers e
+    subestações também incrementam a versão (ver signals.py). Cada processo
+    guarda em memória o documento serializado da última versão, de forma que
+    uma requisição custa um GET no Redis enquanto nada mudar e o documento é
+    remontado (um HGETALL e uma consulta) no máximo uma vez por versão.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or get_redis()
+        self._lock = threading.Lock()
+        self._version = None
+        self._body = None
+        self._stats = {'requests': 0, 'builds': 0}
+
+    def version(self):
+        """Versão atual do snapshot (cria o contador se o Redis o perdeu); None com o Redis indisponível."""
+        try:
+            version = self.redis_client.get(FLEET_VERSION_KEY)
+            return int(version) if version is not None else self.bump()
+        except redis.RedisError as e:
+            logger.warning(f"Redis indisponível ao ler a versão do snapshot da frota: {e}")
+            return None
+
+    def bump(self):
+        """Invalida o snapshot em todos os processos; retorna a nova versão."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        bump_version(pipe, FLEET_VERSION_KEY)
+        return pipe.execute()[-1]
+
+    def get(self, version):
+        """Documento JSON (bytes) da versão `version`, remontado só se a versão mudou."""
+        with self._lock:
+            self._stats['requests'] += 1
+            if version is not None and version == self._version:
+                return self._body
+
+        try:
+            snapshot = self.redis_client.hgetall(FLEET_SNAPSHOT_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Redis indisponível ao montar o snapshot da frota: {e}")
+            snapshot = {}
+        body = json.dumps(build_fleet_snapshot(snapshot, version)).encode()
+
+        with self._lock:
+            self._stats['builds'] += 1
+            # Não substitui uma versão mais nova montada por outra requisição
+            if version is not None and (self._version is None or version > self._version):
+                self._version, self._body = version, body
+        return body
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['version'] = self._version
+        return stats
+
+
+fleet_snapshot = FleetSnapshot()
+
+
+def bump_fleet_version():
+    try:
+        fleet_snapshot.bump()
+    except redis.RedisError as e:
+        logger.warning(f"Não foi possível invalidar o snapshot da frota: {e}")
@@ -0,0 +1,182 @@
+from django.db.models import Count, Min, Max, Q
+from .models import Rover
+
+# Geohash inteiro: latitude e longitude quantizadas em GEOHASH_BITS bits cada
+# e intercaladas (curva Z / Morton). Pontos próximos têm códigos próximos, e
+# cada célula da grade (em qualquer nível) é um intervalo contínuo de
+# códigos, o que permite buscas espaciais com um índice B-tree comum.
+# Com 26 bits, a célula mais fina tem ~0,3 m de lado.
+GEOHASH_BITS = 26
+_SCALE = 1 << GEOHASH_BITS
+
+# Máximo de células (intervalos de códigos) usadas para cobrir um retângulo
+MAX_COVER_CELLS = 32
+
+# Colunas da telemetria arquivada lidas por rovers_in_bbox (id e timestamp
+# primeiro, como em api.history.archived_rows)
+AREA_COLUMNS = ['id', 'timestamp', 'rover_id', 'latitude', 'longitude']
+
+
+def _quantize(value, low, span):
+    return min(max(int((value - low) / span * _SCALE), 0), _SCALE - 1)
+
+
+def _spread(value):
+    # Intercala zeros entre os bits: b25..b0 -> 0 b25 0 b24 ... 0 b0
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def _cell(latitude, longitude):
+    return _quantize(longitude, -180.0, 360.0), _quantize(latitude, -90.0, 180.0)
+
+
+def encode_geohash(latitude, longitude):
+    """Geohash inteiro (52 bits) da posição; None se a posição não existir."""
+    if latitude is None or longitude is None:
+        return None
+    x, y = _cell(latitude, longitude)
+    return (_spread(y) << 1) | _spread(x)
+
+
+def geohash_sql(vendor, latitude_column='latitude', longitude_column='longitude'):
+    """
+    Expressão SQL equivalente a encode_geohash() (PostgreSQL e SQLite), para
+    calcular o geohash de linhas já gravadas sem trazê-las para o Python. A
+    migração 0008 usa uma cópia desta fórmula.
+    """
+    # No PostgreSQL o CAST arredonda; no SQLite trunca (valores aqui são >= 0)
+    floor = 'FLOOR' if vendor == 'postgresql' else ''
+
+    def quantize(column, low, span):
+        return (
+            f'(CASE WHEN {column} <= {low} THEN 0 WHEN {column} >= {low + span} THEN {_SCALE - 1} '
+            f'ELSE CAST({floor}(({column} - ({low})) / {span} * {_SCALE}) AS BIGINT) END)'
+        )
+
+    def spread(expression):
+        for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                            (2, 0x3333333333333333), (1, 0x5555555555555555)):
+            expression = f'(({expression} | ({expression} << {shift})) & {mask})'
+        return expression
+
+    x = quantize(longitude_column, -180.0, 360.0)
+    y = quantize(latitude_column, -90.0, 180.0)
+    return f'(({spread(y)} << 1) | {spread(x)})'
+
+
+def parse_bbox(value):
+    """Lê `min_lng,min_lat,max_lng,max_lat`. Levanta ValueError se inválido."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("Invalid bbox bounds")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def cover_bbox(bbox, max_cells=MAX_COVER_CELLS):
+    """
+    Intervalos [início, fim) de geohash que cobrem o retângulo: usa o nível
+    mais fino da grade em que bastam até `max_cells` células, e junta as
+    células com códigos contíguos.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = _cell(min_lat, min_lng)
+    x1, y1 = _cell(max_lat, max_lng)
+
+    level = GEOHASH_BITS
+    while level > 0:
+        shift = GEOHASH_BITS - level
+        if ((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1) <= max_cells:
+            break
+        level -= 1
+
+    shift = GEOHASH_BITS - level
+    codes = sorted(
+        (_spread(cell_y) << 1) | _spread(cell_x)
+        for cell_x in range(x0 >> shift, (x1 >> shift) + 1)
+        for cell_y in range(y0 >> shift, (y1 >> shift) + 1)
+    )
+
+    ranges = []
+    for code in codes:
+        start, end = code << (2 * shift), (code + 1) << (2 * shift)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return [tuple(cell_range) for cell_range in ranges]
+
+
+def filter_bbox(queryset, bbox):
+    """
+    Restringe o queryset (com latitude, longitude e geohash) ao retângulo:
+    os intervalos de geohash usam o índice, e a comparação exata das
+    coordenadas descarta o que sobra das células nas bordas.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    cells = Q()
+    for start, end in cover_bbox(bbox):
+        cells |= Q(geohash__gte=start, geohash__lt=end)
+    return queryset.filter(
+        cells,
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def rovers_in_bbox(queryset, bbox, archived=()):
+    """
+    Rovers com posições no retângulo: [{'rover', 'first_seen', 'last_seen', 'points'}].
+    `archived` são linhas AREA_COLUMNS dos dias já movidos para o arquivo
+    frio (ver api.history.archived_rows); sem geohash, elas são filtradas
+    aqui pelas coordenadas e somadas às do banco.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    seen = {}
+    for _, timestamp, rover_pk, latitude, longitude in archived:
+        if latitude is None or longitude is None:
+            continue
+        if not (min_lat <= latitude <= max_lat and min_lng <= longitude <= max_lng):
+            continue
+        current = seen.get(rover_pk)
+        if current is None:
+            seen[rover_pk] = [timestamp, timestamp, 1]
+        else:
+            current[0] = min(current[0], timestamp)
+            current[1] = max(current[1], timestamp)
+            current[2] += 1
+
+    identifiers = dict(Rover.objects.filter(pk__in=seen).values_list('pk', 'identifier')) if seen else {}
+    rows = filter_bbox(queryset, bbox).values('rover_id', 'rover__identifier').annotate(
+        first_seen=Min('timestamp'), last_seen=Max('timestamp'), points=Count('id')
+    )
+    for row in rows:
+        identifiers[row['rover_id']] = row['rover__identifier']
+        current = seen.get(row['rover_id'])
+        if current is None:
+            seen[row['rover_id']] = [row['first_seen'], row['last_seen'], row['points']]
+        else:
+            current[0] = min(current[0], row['first_seen'])
+            current[1] = max(current[1], row['last_seen'])
+            current[2] += row['points']
+
+    return sorted(
+        (
+            {
+                'rover': identifiers[rover_pk],
+                'first_seen': first_seen.isoformat(),
+                'last_seen': last_seen.isoformat(),
+                'points': points,
+            }
+            for rover_pk, (first_seen, last_seen, points) in seen.items()
+            if rover_pk in identifiers
+        ),
+        key=lambda entry: entry['rover'],
+    )
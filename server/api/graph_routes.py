@@ -1,9 +1,16 @@
+import gzip
+import hashlib
 import json
 import os
+import threading
+import brotli
 import pandas as pd
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework import status
 from pathlib import Path
 
@@ -12,9 +19,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 GRAPH_PATH = os.path.join(BASE_DIR, "../RoverModel/jsons/graph6.json")
 OBSTACLES_PATH = os.path.join(BASE_DIR, "../RoverModel/planilhas/obstaculos_processado6.xlsx")
 
-# Cache for the data to avoid reading files on every request
-graph_data_cache = None
-obstacles_cache = None
+# Rendered responses, keyed by endpoint: (source file version, RenderedJSON)
+_rendered = {}
+_render_lock = threading.Lock()
+
+# Content codings we precompress, in order of preference
+ENCODINGS = ('br', 'gzip')
+# Brotli 11 / gzip 9 take ~15x / ~5x longer on a multi-MB graph for a few percent less size
+BROTLI_QUALITY = 9
+GZIP_LEVEL = 6
 
 # Colors for different obstacle types
 OBSTACLE_COLORS = {
@@ -26,11 +39,6 @@ OBSTACLE_COLORS = {
 
 def load_graph_data():
     """Load graph data from JSON file"""
-    global graph_data_cache
-    
-    if graph_data_cache is not None:
-        return graph_data_cache
-    
     try:
         with open(GRAPH_PATH, 'r') as file:
             graph_data = json.load(file)
@@ -45,7 +53,6 @@ def load_graph_data():
                             edges.append([node, neighbor])
                 graph_data['edges'] = edges
                 
-            graph_data_cache = graph_data
             return graph_data
     except Exception as e:
         print(f"Error loading graph data: {e}")
@@ -54,11 +61,6 @@ def load_graph_data():
 
 def load_obstacles():
     """Load obstacles data from Excel file"""
-    global obstacles_cache
-    
-    if obstacles_cache is not None:
-        return obstacles_cache
-    
     try:
         # Check if file exists
         if not os.path.exists(OBSTACLES_PATH):
@@ -79,29 +81,118 @@ def load_obstacles():
                 "type": obstacle_type
             })
         
-        obstacles_cache = obstacles
         return obstacles
     except Exception as e:
         print(f"Error loading obstacles: {e}")
         return []
 
-@api_view(['GET'])
+class RenderedJSON:
+    """
+    A JSON document serialized once (as DRF's renderer would), with its gzip
+    and brotli encodings and a strong ETag for each representation.
+    """
+
+    def __init__(self, data):
+        body = json.dumps(
+            data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+        ).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {
+            'identity': body,
+            'br': brotli.compress(body, quality=BROTLI_QUALITY),
+            'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+        }
+        # Strong validators must differ between content codings of the same data
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+            for encoding in self.bodies
+        }
+
+    def matches(self, etags):
+        """Whether any of the client's ETags names this data, in any encoding."""
+        return '*' in etags or any(etag in self.etags.values() for etag in etags)
+
+
+def _source_version(path):
+    """Identify the current contents of a data file by mtime and size (None if missing)."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_rendered(name, path, loader):
+    """Rendered response for `name`, rebuilt only when the file at `path` changes."""
+    version = _source_version(path)
+    cached = _rendered.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _render_lock:
+        cached = _rendered.get(name)
+        if cached is None or cached[0] != version:
+            cached = _rendered[name] = (version, RenderedJSON(loader()))
+    return cached[1]
+
+
+def choose_encoding(accept_encoding):
+    """
+    Precompressed coding with the highest q the client accepts, or 'identity'.
+    Ties follow the server preference (br, gzip, then identity); identity is
+    only ranked when listed (or matched by '*'), otherwise it is the fallback.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = 'identity', 0.0
+    for encoding in (*ENCODINGS, 'identity'):
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def rendered_response(request, rendered):
+    """Serve a RenderedJSON: 304 for a matching If-None-Match, else the precompressed body."""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if_none_match = request.headers.get('If-None-Match')
+
+    if if_none_match and rendered.matches(parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(rendered.bodies[encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = rendered.etags[encoding]
+    response['Vary'] = 'Accept-Encoding'
+    # Clients may keep the map, but must revalidate it (a cheap 304) on every use
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@require_GET
 def get_graph_data(request):
     """API endpoint to get graph data"""
     try:
-        graph_data = load_graph_data()
-        return Response(graph_data)
+        return rendered_response(request, get_rendered('graph', GRAPH_PATH, load_graph_data))
     except Exception as e:
-        return Response({"error": f"Error fetching graph data: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": f"Error fetching graph data: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
+@require_GET
 def get_obstacles(request):
     """API endpoint to get obstacles data"""
     try:
-        obstacles = load_obstacles()
-        return Response(obstacles)
+        return rendered_response(request, get_rendered('obstacles', OBSTACLES_PATH, load_obstacles))
     except Exception as e:
-        return Response({"error": f"Error fetching obstacles: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": f"Error fetching obstacles: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Sample data for development/testing
 @api_view(['GET'])
@@ -0,0 +1,228 @@
+import csv
+import heapq
+import io
+import json
+import re
+from datetime import timedelta, timezone as dt_timezone
+from itertools import groupby, islice
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .models import RoverTelemetry, TelemetryArchive
+from .sensors import SENSORS, SENSOR_COLUMNS, core_sensor_names, sensor_queryset
+
+
+def telemetry_queryset(sensor_type=None):
+    """Telemetria completa (o filtro por sensor só se aplica às leituras de sensores)."""
+    return RoverTelemetry.objects.all()
+
+
+# Fontes do histórico: consulta base (por tipo de sensor) e colunas exportadas,
+# sempre começando por id e timestamp. Leituras de sensores vêm de
+# api.sensors.sensor_queryset (núcleo na tabela larga, extras em SensorReading).
+HISTORY_SOURCES = {
+    'telemetry': (telemetry_queryset, ['id', 'timestamp', 'battery_level', 'temperature', 'speed', 'latitude', 'longitude', 'status']),
+    'sensors': (sensor_queryset, SENSOR_COLUMNS),
+}
+
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+HISTORY_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# Fuso do cursor cujo '+' chegou como espaço (query string sem URL-encoding)
+_UNENCODED_OFFSET = re.compile(r' (\d{2}(?::?\d{2})?)$')
+
+
+def parse_cursor(value):
+    """
+    Lê o cursor de retomada `<timestamp ISO>,<id>` (o último registro já
+    recebido). Levanta ValueError se inválido.
+    """
+    timestamp, _, row_id = value.rpartition(',')
+    try:
+        # parse_datetime aceita o sufixo 'Z', recusado pelo fromisoformat do Python 3.10
+        parsed = parse_datetime(_UNENCODED_OFFSET.sub(r'+\1', timestamp))
+        row_id = int(row_id)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError("after must be <timestamp>,<id> of the last row received")
+    return parsed, row_id
+
+
+def format_cursor(row):
+    """Cursor de retomada de uma linha (que começa por id e timestamp)."""
+    return f'{row[1].isoformat()},{row[0]}'
+
+
+def _render_rows(rows, columns, output_format):
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [row[0], row[1].isoformat(), *row[2:]] for row in rows
+        )
+        return buffer.getvalue()
+    encode = _json_encoder.encode
+    return ''.join(
+        encode(dict(zip(columns, (row[0], row[1].isoformat(), *row[2:])))) + '\n'
+        for row in rows
+    )
+
+
+def fetch_keyset_page(queryset, columns, after, page_size):
+    """
+    Busca a próxima página de linhas (tuplas de `columns`, que começam por
+    id e timestamp) após o cursor `after` (timestamp, id).
+    Paginação por chave (keyset): nenhuma página usa OFFSET, e a memória
+    usada é limitada a uma página (`page_size` linhas).
+    Retorna (linhas, cursor da última linha ou None).
+    """
+    if after is not None:
+        timestamp, row_id = after
+        queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=row_id))
+
+    rows = list(queryset.order_by('timestamp', 'id').values_list(*columns)[:page_size])
+    if not rows:
+        return rows, None
+    return rows, (rows[-1][1], rows[-1][0])
+
+
+def _row_key(row):
+    return row[1], row[0]
+
+
+def _hot_rows(queryset, columns, after, page_size):
+    """Linhas do banco em ordem de (timestamp, id), lidas página a página."""
+    while True:
+        rows, after = fetch_keyset_page(queryset, columns, after, page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+
+
+def archive_table(source, sensor_type=None):
+    """Tabela arquivada (TelemetryArchive.table) de onde vêm as linhas de `source`."""
+    sensor = SENSORS.get(sensor_type)
+    if source == 'telemetry' or (sensor is not None and sensor.is_core):
+        return 'telemetry'
+    return 'sensors'
+
+
+def _read_archive_file(entry, columns, sensor_type):
+    """
+    Linhas (tuplas de `columns`) de um arquivo do arquivo frio, com o mesmo
+    recorte de sensor_queryset(): sensores do núcleo vêm da coluna da
+    telemetria arquivada; os extras, das leituras arquivadas.
+    """
+    table = pq.read_table(entry.file_path)
+    values = {}
+    if entry.table == 'telemetry' and 'sensor_type' in columns:
+        sensor = SENSORS[sensor_type]
+        table = table.filter(pc.is_valid(table[sensor.column]))
+        values = {
+            'sensor_type': pa.repeat(sensor.name, table.num_rows),
+            'value': table[sensor.column],
+            'unit': pa.repeat(sensor.unit, table.num_rows),
+        }
+    elif entry.table == 'sensors':
+        sensor_types = table['sensor_type'].cast(pa.string())
+        if sensor_type:
+            table = table.filter(pc.equal(sensor_types, sensor_type))
+        else:
+            table = table.filter(pc.invert(pc.is_in(sensor_types, pa.array(core_sensor_names(), pa.string()))))
+    values['rover_id'] = pa.repeat(entry.rover_id, table.num_rows)
+
+    arrays = [values[column] if column in values else table[column] for column in columns]
+    return list(zip(*(array.to_pylist() for array in arrays)))
+
+
+def _archived_rover_rows(entries, columns, sensor_type, start, end, after):
+    for _, day_entries in groupby(entries, key=lambda entry: entry.day):
+        rows = []
+        for entry in day_entries:
+            rows.extend(_read_archive_file(entry, columns, sensor_type))
+        rows.sort(key=_row_key)
+        for row in rows:
+            if start <= row[1] < end and (after is None or _row_key(row) > after):
+                yield row
+
+
+def archived_rows(source, columns, start, end, sensor_type=None, rover=None, substation=None, after=None):
+    """
+    Linhas de `source` em [start, end) guardadas no arquivo frio (api.archive),
+    de um rover ou de todos os rovers de uma subestação, em ordem de
+    (timestamp, id). Os arquivos são lidos um dia por vez, e o manifesto só
+    é consultado quando a primeira linha é pedida.
+    """
+    entries = TelemetryArchive.objects.filter(
+        table=archive_table(source, sensor_type),
+        day__gte=start.astimezone(dt_timezone.utc).date(),
+        day__lte=(end - timedelta(microseconds=1)).astimezone(dt_timezone.utc).date(),
+    )
+    if rover is not None:
+        entries = entries.filter(rover=rover)
+    if substation is not None:
+        entries = entries.filter(rover__substation=substation)
+
+    by_rover = {}
+    for entry in entries.order_by('day', 'part'):
+        by_rover.setdefault(entry.rover_id, []).append(entry)
+    yield from heapq.merge(
+        *(_archived_rover_rows(rover_entries, columns, sensor_type, start, end, after) for rover_entries in by_rover.values()),
+        key=_row_key
+    )
+
+
+def history_pages(queryset, columns, archived=(), after=None, page_size=None):
+    """
+    Páginas (listas de até `page_size` linhas) com as linhas do banco e do
+    arquivo frio intercaladas em ordem de (timestamp, id), após o cursor `after`.
+    """
+    page_size = page_size or settings.HISTORY_PAGE_SIZE
+    rows = heapq.merge(archived, _hot_rows(queryset, columns, after, page_size), key=_row_key)
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            return
+        yield page
+
+
+async def stream_history(rover, source, start, end, output_format, sensor_type=None, after=None):
+    """
+    Gerador assíncrono com o histórico do rover em [start, end), página a
+    página, no formato pedido. Dias já arquivados são lidos do arquivo frio.
+    A memória usada é a de uma página (HISTORY_PAGE_SIZE linhas) e de um dia
+    arquivado, qualquer que seja o tamanho do período. Em NDJSON, a última
+    linha é {"next_after": cursor} (ver format_cursor), se houver dados.
+    """
+    base_queryset, columns = HISTORY_SOURCES[source]
+    queryset = base_queryset(sensor_type).filter(rover=rover, timestamp__gte=start, timestamp__lt=end)
+    archived = archived_rows(source, columns, start, end, sensor_type, rover=rover, after=after)
+
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+
+    pages = history_pages(queryset, columns, archived, after)
+    next_page = sync_to_async(next)
+    last = None
+    while True:
+        rows = await next_page(pages, None)
+        if rows is None:
+            break
+        last = rows[-1]
+        yield _render_rows(rows, columns, output_format)
+
+    if output_format == 'ndjson' and last is not None:
+        # Linha final com o cursor da última linha, para continuar a exportação depois (?after=)
+        yield _json_encoder.encode({'next_after': format_cursor(last)}) + '\n'
@@ -0,0 +1,41 @@
+import binascii
+import json
+import struct
+
+# Quadro binário de imagem enviado aos clientes WebSocket:
+#   tamanho do cabeçalho (uint32 big-endian) + cabeçalho JSON (UTF-8) + bytes do JPEG
+FRAME_HEADER_SIZE = struct.Struct('>I')
+
+IMAGE_CONTENT_TYPE = 'image/jpeg'
+
+
+def decode_image_payload(data):
+    """
+    Extrai os bytes da imagem de uma mensagem MQTT: payload binário (tópico
+    image/jpeg) ou JSON com o base64 no campo 'imagem', com ou sem prefixo
+    data URI. Levanta ValueError se o base64 for inválido.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+
+    encoded = data.get('imagem') or ''
+    if encoded.startswith('data:'):
+        encoded = encoded.partition(',')[2]
+    try:
+        return binascii.a2b_base64(encoded)
+    except binascii.Error as e:
+        raise ValueError(f"Imagem em base64 inválida: {e}") from e
+
+
+def build_image_frame(header, image_bytes):
+    """Monta o quadro binário a partir do cabeçalho (dict) e dos bytes da imagem."""
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join((FRAME_HEADER_SIZE.pack(len(header_bytes)), header_bytes, image_bytes))
+
+
+def split_image_frame(frame):
+    """Separa um quadro binário em (cabeçalho, bytes da imagem)."""
+    (header_size,) = FRAME_HEADER_SIZE.unpack_from(frame)
+    start = FRAME_HEADER_SIZE.size
+    header = json.loads(frame[start:start + header_size])
+    return header, frame[start + header_size:]
@@ -0,0 +1,132 @@
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Imagem recebida do rover, sem redimensionar
+ORIGINAL = 'original'
+
+
+def rendition_names():
+    return (ORIGINAL,) + tuple(settings.IMAGE_RENDITIONS)
+
+
+def rendition_redis_key(substation_id, rover_id, rendition):
+    """Chave Redis de uma versão reduzida (a original usa image_redis_key)."""
+    return f'image:jpeg:{rendition}:sub{substation_id}:rover{rover_id}'
+
+
+def image_group_name(rover_id, rendition=ORIGINAL):
+    """Grupo do channel layer que recebe as imagens de um rover em uma resolução."""
+    return f'rover_{rover_id}_image_{rendition}'
+
+
+def render_renditions(image_bytes, renditions):
+    """
+    Gera as versões reduzidas de um JPEG: {nome: bytes}.
+
+    O JPEG é decodificado uma única vez, já em escala reduzida (draft), e as
+    versões são geradas da maior para a menor, cada uma a partir da anterior.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    largest = max(spec['max_size'] for spec in renditions.values())
+    image.draft('RGB', (largest, largest))
+    image = image.convert('RGB')
+
+    results = {}
+    for name, spec in sorted(renditions.items(), key=lambda item: -item[1]['max_size']):
+        image.thumbnail((spec['max_size'], spec['max_size']))
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=spec['quality'])
+        results[name] = output.getvalue()
+    return results
+
+
+class ImageRenditionPool:
+    """
+    Gera as versões reduzidas das imagens em um pool de threads (o Pillow
+    libera o GIL na decodificação e no redimensionamento).
+
+    Cada rover tem no máximo um quadro em processamento e um aguardando; um
+    quadro novo substitui o que aguarda, de modo que rovers com câmera mais
+    rápida que o pool não acumulam atraso. `on_rendered(substation_id,
+    rover_id, renditions)` é chamado na thread do pool com {nome: bytes}.
+    """
+
+    def __init__(self, on_rendered, workers=None, renditions=None):
+        self.on_rendered = on_rendered
+        self.workers = workers or settings.IMAGE_RENDITION_WORKERS
+        self.renditions = renditions or settings.IMAGE_RENDITIONS
+        self._executor = None
+        self._lock = threading.Lock()
+        self._busy = set()
+        self._waiting = {}
+
+        self._stats = {
+            'submitted': 0,
+            'rendered': 0,
+            'replaced': 0,
+            'errors': 0,
+            'total_render_ms': 0.0,
+            'max_render_ms': 0.0,
+        }
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-rendition')
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, substation_id, rover_id, image_bytes):
+        key = (substation_id, rover_id)
+        with self._lock:
+            self._stats['submitted'] += 1
+            if key in self._busy:
+                if key in self._waiting:
+                    self._stats['replaced'] += 1
+                self._waiting[key] = image_bytes
+                return
+            self._busy.add(key)
+        self._executor.submit(self._process, key, image_bytes)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_progress'] = len(self._busy)
+            stats['waiting'] = len(self._waiting)
+        total_ms = stats.pop('total_render_ms')
+        stats['avg_render_ms'] = round(total_ms / stats['rendered'], 3) if stats['rendered'] else 0.0
+        stats['max_render_ms'] = round(stats['max_render_ms'], 3)
+        stats['workers'] = self.workers
+        stats['renditions'] = {name: spec['max_size'] for name, spec in self.renditions.items()}
+        return stats
+
+    def _process(self, key, image_bytes):
+        while image_bytes is not None:
+            started = time.perf_counter()
+            try:
+                renditions = render_renditions(image_bytes, self.renditions)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.on_rendered(key[0], key[1], renditions)
+                with self._lock:
+                    self._stats['rendered'] += 1
+                    self._stats['total_render_ms'] += elapsed_ms
+                    self._stats['max_render_ms'] = max(self._stats['max_render_ms'], elapsed_ms)
+            except Exception as e:
+                logger.error(f"Erro ao gerar versões reduzidas da imagem do rover {key[1]}: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+
+            with self._lock:
+                image_bytes = self._waiting.pop(key, None)
+                if image_bytes is None:
+                    self._busy.discard(key)
@@ -0,0 +1,433 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+
+import aiomqtt
+import redis
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .codecs import decode_telemetry_struct, decode_telemetry_msgpack
+from .mqtt_handler import (
+    FLEET_SNAPSHOT_KEY,
+    FLEET_VERSION_KEY,
+    LATEST_VALUE_TTL,
+    telemetry_redis_key,
+    image_redis_key,
+    build_fleet_snapshot_entry,
+    build_image_event,
+    build_telemetry_ws_data,
+)
+from .image_frames import decode_image_payload
+from .image_renditions import ImageRenditionPool, image_group_name, rendition_redis_key
+from .redis_batcher import bump_version
+from .redis_pool import close_async_pools, get_async_redis, pool_stats
+from .rover_cache import rover_cache
+from .topic_router import TopicRouter, decode_binary
+from .telemetry_writer import AsyncTelemetryBatchWriter
+
+logger = logging.getLogger(__name__)
+
+# Grava o último valor apenas se a sequência for >= à última gravada para a chave.
+# Com vários workers consumindo via assinatura compartilhada, mensagens de um
+# mesmo rover podem ser processadas fora de ordem; isso impede que uma mensagem
+# antiga sobrescreva o estado mais recente. Um recuo maior que ARGV[4] não é
+# atraso, e sim um contador reiniciado (rover reiniciado, relógio acertado):
+# a mensagem é aceita e passa a ser a referência.
+LATEST_VALUE_SCRIPT = """
+local current = redis.call('GET', KEYS[2])
+if current then
+    local behind = tonumber(current) - tonumber(ARGV[2])
+    if behind > 0 and behind <= tonumber(ARGV[4]) then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# Recuo máximo tratado como mensagem atrasada, por tipo de contador; acima
+# disso o contador foi reiniciado. `seq` em mensagens, `ts` em milissegundos.
+SEQUENCE_RESET_GAP = {
+    'seq': 100,
+    'ts': 60 * 1000,
+}
+
+# Prefixo das chaves onde cada worker publica suas métricas
+WORKER_STATS_PREFIX = 'ingest:worker:'
+
+
+def default_worker_id():
+    return f'ingest-{socket.gethostname()}-{os.getpid()}'
+
+
+def message_sequence(data):
+    """
+    Contador de ordem de uma mensagem de telemetria, como (tipo, valor): o
+    campo `seq` enviado pelo rover ('seq') ou, na falta dele, o timestamp em
+    milissegundos ('ts'). Cada tipo tem sua própria chave no Redis, para que
+    um rover que passa a enviar (ou deixa de enviar) `seq` não compare
+    números de sequência com timestamps.
+    """
+    seq = data.get('seq')
+    if seq is not None:
+        try:
+            return 'seq', int(seq)
+        except (TypeError, ValueError):
+            pass
+    try:
+        # parse_datetime aceita o sufixo 'Z', recusado pelo fromisoformat do Python 3.10
+        timestamp = parse_datetime(str(data['timestamp']))
+    except (KeyError, ValueError):
+        return None
+    if timestamp is None:
+        return None
+    return 'ts', int(timestamp.timestamp() * 1000)
+
+
+def shared_topics(topics, group):
+    """Converte as assinaturas para $share/<grupo>/... (assinatura compartilhada)."""
+    if not group:
+        return topics
+    return [(f'$share/{group}/{topic}', qos) for topic, qos in topics]
+
+
+def collect_worker_stats(redis_client):
+    """
+    Lê as métricas publicadas pelos workers de ingestão e calcula a parcela
+    de mensagens de cada um.
+    """
+    workers = {}
+    for key in redis_client.scan_iter(match=f'{WORKER_STATS_PREFIX}*'):
+        raw = redis_client.get(key)
+        if not raw:
+            continue
+        stats = json.loads(raw)
+        workers[stats['worker_id']] = stats
+
+    total_rate = sum(stats.get('rate', 0) for stats in workers.values())
+    total_messages = sum(stats.get('messages', 0) for stats in workers.values())
+    for stats in workers.values():
+        stats['share'] = round(stats.get('rate', 0) / total_rate, 4) if total_rate else 0.0
+    return {
+        'workers': workers,
+        'total_rate': round(total_rate, 2),
+        'total_messages': total_messages,
+    }
+
+
+class AsyncIngestService:
+    """
+    Serviço de ingestão MQTT nativo em asyncio (ver `manage.py run_ingest`).
+
+    Mantém o mesmo contrato de tópicos e o mesmo comportamento do
+    MQTTHandler.on_message, mas aguarda o channel layer, o Redis e as
+    gravações em lote no banco diretamente no event loop.
+    """
+
+    def __init__(self, client_id=None, concurrency=None, shared_group=None):
+        self.client_id = client_id or default_worker_id()
+        self.concurrency = concurrency or settings.INGEST_CONCURRENCY
+        self.shared_group = shared_group if shared_group is not None else settings.INGEST_SHARED_GROUP
+
+        self.channel_layer = get_channel_layer()
+        # Clientes do pool asyncio compartilhado, criados em run() (o pool pertence ao event loop)
+        self.redis_client = None
+        self.latest_value_script = None
+        self.telemetry_writer = AsyncTelemetryBatchWriter()
+        self.rendition_pool = ImageRenditionPool(self._on_renditions)
+
+        # Mesmos tipos de mensagem do MQTTHandler, com handlers async
+        self.router = TopicRouter()
+        self.router.register('telemetry', self.handle_telemetry_message, sinks=('redis', 'database', 'websocket'))
+        self.router.register('telemetry/bin', self.handle_telemetry_message, decoder=decode_telemetry_struct,
+                             sinks=('redis', 'database', 'websocket'))
+        self.router.register('telemetry/msgpack', self.handle_telemetry_message, decoder=decode_telemetry_msgpack,
+                             sinks=('redis', 'database', 'websocket'))
+        self.router.register('image', self.handle_image_message, sinks=('redis', 'websocket'))
+        self.router.register('image/jpeg', self.handle_image_message, decoder=decode_binary, sinks=('redis', 'websocket'))
+        self.router.register('boxes', self.handle_boxes_message, sinks=('websocket',))
+        self.router.register('insta/config', self.handle_insta_config_message, sinks=('websocket',))
+
+        self._stop_event = None
+        self._loop = None
+        self._semaphore = None
+        self._tasks = set()
+        self._stats = {'messages': 0, 'errors': 0, 'stale': 0, 'started_at': None}
+
+    async def run(self):
+        self._stop_event = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._stats['started_at'] = time.time()
+
+        loop = self._loop = asyncio.get_running_loop()
+        self.redis_client = get_async_redis()
+        self.latest_value_script = self.redis_client.register_script(LATEST_VALUE_SCRIPT)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await sync_to_async(rover_cache.warm, thread_sensitive=False)()
+        self.telemetry_writer.start()
+        self.rendition_pool.start()
+
+        background = [
+            asyncio.create_task(self._consume_forever()),
+            asyncio.create_task(self._report_stats_forever()),
+        ]
+        try:
+            await self._stop_event.wait()
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            await self._shutdown()
+        logger.info(f"Serviço de ingestão encerrado: {self.get_stats()}")
+
+    async def _shutdown(self):
+        """
+        Grava a telemetria pendente e encerra o pool de renditions e os pools
+        do Redis. Uma etapa que falha não impede as seguintes.
+        """
+        steps = [
+            self.telemetry_writer.stop,
+            sync_to_async(self.rendition_pool.stop, thread_sensitive=False),
+            close_async_pools,
+        ]
+        for step in steps:
+            try:
+                await step()
+            except Exception as e:
+                logger.error(f"Erro ao encerrar o serviço de ingestão: {e}", exc_info=True)
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats['worker_id'] = self.client_id
+        stats['shared_group'] = self.shared_group
+        stats['in_flight'] = len(self._tasks)
+        stats['router'] = self.router.get_stats()
+        stats['telemetry_writer'] = self.telemetry_writer.get_stats()
+        stats['image_renditions'] = self.rendition_pool.get_stats()
+        stats['rover_cache'] = rover_cache.get_stats()
+        stats['redis_pools'] = pool_stats()
+        return stats
+
+    def subscription_topics(self):
+        return shared_topics(self.router.subscriptions(), self.shared_group)
+
+    async def _report_stats_forever(self):
+        """Publica periodicamente as métricas deste worker no Redis."""
+        interval = settings.INGEST_STATS_INTERVAL
+        last_messages = 0
+        last_time = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            stats = self.get_stats()
+            stats['rate'] = round((stats['messages'] - last_messages) / (now - last_time), 2)
+            stats['reported_at'] = timezone.now().isoformat()
+            last_messages, last_time = stats['messages'], now
+            try:
+                await self.redis_client.set(
+                    f'{WORKER_STATS_PREFIX}{self.client_id}',
+                    json.dumps(stats, default=str),
+                    ex=int(interval * 3)
+                )
+            except redis.RedisError as e:
+                logger.error(f"Erro ao publicar métricas do worker: {e}")
+
+    async def _consume_forever(self):
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    settings.MQTT_HOST,
+                    settings.MQTT_PORT,
+                    client_id=self.client_id,
+                    keepalive=settings.MQTT_KEEPALIVE,
+                    # Assinaturas compartilhadas ($share) fazem parte do MQTT v5
+                    protocol=aiomqtt.ProtocolVersion.V5 if self.shared_group else aiomqtt.ProtocolVersion.V311,
+                ) as client:
+                    logger.info(f"Conectado ao broker MQTT em {settings.MQTT_HOST}:{settings.MQTT_PORT}")
+                    async with client.messages() as messages:
+                        topics = self.subscription_topics()
+                        await client.subscribe(topics)
+                        logger.info(f"Inscrito nos tópicos: {topics}")
+                        async for message in messages:
+                            await self._dispatch(message.topic.value, message.payload)
+            except aiomqtt.MqttError as e:
+                logger.error(f"Conexão MQTT perdida: {e}. Reconectando em {settings.INGEST_RECONNECT_INTERVAL}s")
+                await asyncio.sleep(settings.INGEST_RECONNECT_INTERVAL)
+
+    async def _dispatch(self, topic, payload):
+        # Limita o número de mensagens em processamento simultâneo
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(topic, payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        self._semaphore.release()
+
+    async def _process(self, topic, payload):
+        self._stats['messages'] += 1
+        try:
+            await self.on_message(topic, payload)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"[MQTT] Erro no handler on_message: {e}", exc_info=True)
+
+    async def on_message(self, topic, payload):
+        logger.debug(f"[MQTT] Mensagem recebida no tópico: {topic}")
+        result = self.router.dispatch(topic, payload)
+        if result is not None:
+            await result
+
+    async def save_latest_value(self, key, value, sequence):
+        """
+        Grava o último valor da chave; com contador (ver message_sequence), só
+        grava se a mensagem não for mais antiga que a última gravada. Retorna
+        False se for.
+        """
+        if sequence is None:
+            await self.redis_client.setex(key, LATEST_VALUE_TTL, value)
+            return True
+        counter, position = sequence
+        result = await self.latest_value_script(
+            keys=[key, f'{counter}:{key}'],
+            args=[value, position, LATEST_VALUE_TTL, SEQUENCE_RESET_GAP[counter]],
+        )
+        return bool(result)
+
+    async def handle_image_message(self, substation_id, rover_id, data):
+        try:
+            image_bytes = decode_image_payload(data)
+            if not image_bytes:
+                return
+
+            try:
+                await self.redis_client.setex(image_redis_key(substation_id, rover_id), LATEST_VALUE_TTL, image_bytes)
+            except redis.RedisError as e:
+                logger.error(f"Erro ao salvar imagem no Redis: {e}")
+
+            await self.channel_layer.group_send(
+                image_group_name(rover_id),
+                build_image_event(substation_id, rover_id, image_bytes)
+            )
+
+            self.rendition_pool.submit(substation_id, rover_id, image_bytes)
+        except Exception as e:
+            logger.error(f"[handle_image_message] Erro ao tratar mensagem de imagem: {e}")
+
+    def _on_renditions(self, substation_id, rover_id, renditions):
+        # Chamado na thread do pool de imagens: publica no event loop e aguarda
+        future = asyncio.run_coroutine_threadsafe(
+            self.publish_renditions(substation_id, rover_id, renditions), self._loop
+        )
+        future.result()
+
+    async def publish_renditions(self, substation_id, rover_id, renditions):
+        for rendition, image_bytes in renditions.items():
+            try:
+                await self.redis_client.setex(
+                    rendition_redis_key(substation_id, rover_id, rendition), LATEST_VALUE_TTL, image_bytes
+                )
+            except redis.RedisError as e:
+                logger.error(f"Erro ao salvar imagem {rendition} no Redis: {e}")
+            await self.channel_layer.group_send(
+                image_group_name(rover_id, rendition),
+                build_image_event(substation_id, rover_id, image_bytes, rendition)
+            )
+
+    async def handle_boxes_message(self, substation_id, rover_id, boxes_data):
+        try:
+            await self.channel_layer.group_send(
+                f'rover_{rover_id}',
+                {
+                    'type': 'boxes_update',
+                    'data': {
+                        'objects': boxes_data,
+                        'timestamp': timezone.now().isoformat()
+                    }
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao tratar mensagem de boxes: {e}")
+
+    async def handle_insta_config_message(self, substation_id, rover_id, data):
+        try:
+            await self.channel_layer.group_send(
+                f'rover_{rover_id}',
+                {
+                    'type': 'insta_config',
+                    'data': {'status': data.get('status')}
+                }
+            )
+        except Exception as e:
+            logger.error(f"[MQTT] Erro ao tratar resposta insta/config: {e}", exc_info=True)
+
+    async def handle_telemetry_message(self, substation_id, rover_id, data):
+        if 'timestamp' not in data:
+            data['timestamp'] = timezone.now().isoformat()
+
+        # Rovers em cache são enfileirados sem nenhum await, preservando a ordem de chegada.
+        # O histórico é gravado com o horário de recebimento (received_at), não com o
+        # timestamp do rover, também para mensagens que chegam fora de ordem.
+        cached = await rover_cache.aget(rover_id)
+        if cached is not None:
+            self.telemetry_writer.submit(rover_id, data)
+
+        try:
+            is_latest = await self.save_latest_value(
+                telemetry_redis_key(substation_id, rover_id), json.dumps(data), message_sequence(data)
+            )
+        except redis.RedisError as e:
+            logger.error(f"Erro ao salvar no Redis: {e}")
+            is_latest = True
+
+        if cached is None:
+            logger.error(f"Rover não encontrado: {rover_id}")
+            return
+
+        if not is_latest:
+            # Mensagem atrasada: vai para o histórico, mas não volta o estado dos clientes
+            self._stats['stale'] += 1
+            logger.debug(f"Telemetria fora de ordem ignorada para o WebSocket do rover {rover_id}")
+            return
+
+        ws_data = build_telemetry_ws_data(data)
+        try:
+            # Snapshot da frota e sua versão em um único round trip
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(FLEET_SNAPSHOT_KEY, rover_id, build_fleet_snapshot_entry(ws_data))
+                bump_version(pipe, FLEET_VERSION_KEY)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Erro ao atualizar o snapshot da frota: {e}")
+
+        try:
+            await self.channel_layer.group_send(
+                f'rover_{rover_id}',
+                {
+                    'type': 'telemetry_update',
+                    'data': ws_data
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao enviar atualização via WebSocket: {e}")
@@ -0,0 +1,48 @@
+from django.db import connection
+
+# Colunas de RoverLatestState copiadas da telemetria mais recente de cada rover
+STATE_FIELDS = ['timestamp', 'battery_level', 'temperature', 'latitude', 'longitude', 'speed', 'status']
+
+STATE_COLUMNS = ', '.join(f'"{field}"' for field in STATE_FIELDS)
+
+# Cláusula de conflito do upsert: só substitui o estado gravado por um mais
+# recente (mensagens atrasadas ou importações de histórico não regridem o estado)
+ON_CONFLICT_SQL = 'ON CONFLICT (rover_id) DO UPDATE SET {updates} WHERE api_roverlateststate."timestamp" <= EXCLUDED."timestamp"'.format(
+    updates=', '.join(f'"{field}" = EXCLUDED."{field}"' for field in STATE_FIELDS)
+)
+
+_UPSERT_SQL = 'INSERT INTO api_roverlateststate (rover_id, ' + STATE_COLUMNS + ') VALUES {values} ' + ON_CONFLICT_SQL
+
+
+def latest_per_rover(telemetry_rows):
+    """{rover_pk: RoverTelemetry mais recente} entre as linhas de um lote."""
+    latest = {}
+    for row in telemetry_rows:
+        current = latest.get(row.rover_id)
+        if current is None or row.timestamp >= current.timestamp:
+            latest[row.rover_id] = row
+    return latest
+
+
+def upsert_latest_states(telemetry_rows):
+    """
+    Atualiza RoverLatestState com a telemetria mais recente de cada rover do
+    lote, em um único INSERT ... ON CONFLICT DO UPDATE. As linhas seguem a
+    ordem dos pks, evitando deadlock entre gravadores concorrentes.
+    Retorna o número de rovers do lote.
+    """
+    latest = latest_per_rover(telemetry_rows)
+    if not latest:
+        return 0
+
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    params = []
+    for rover_pk in sorted(latest):
+        row = latest[rover_pk]
+        params.extend([rover_pk, adapt_datetime(row.timestamp)])
+        params.extend(getattr(row, field) for field in STATE_FIELDS[1:])
+
+    placeholders = '(' + ', '.join(['%s'] * (len(STATE_FIELDS) + 1)) + ')'
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_SQL.format(values=', '.join([placeholders] * len(latest))), params)
+    return len(latest)
@@ -0,0 +1,183 @@
+# api/management/commands/_baseline_views.py
+
+# Views de leitura do painel como eram antes das views async (síncronas, com
+# o cliente Redis do módulo), copiadas sem alterações para servir de
+# referência ao `benchmark views`. O nome começa com '_' para o Django não
+# tratá-lo como comando.
+
+import base64
+import json
+import logging
+from django.http import JsonResponse, HttpResponse
+from django.views import View
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from api.fleet import list_fleet
+from api.image_frames import IMAGE_CONTENT_TYPE
+from api.image_renditions import ORIGINAL, rendition_names, rendition_redis_key
+from api.models import Rover, RoverLatestState
+from api.mqtt_handler import image_redis_key
+from api.redis_pool import get_redis
+
+logger = logging.getLogger(__name__)
+
+redis_client = get_redis()
+binary_redis_client = get_redis(binary=True)
+
+
+class GPSDataView(View):
+    def get(self, request, *args, **kwargs):
+        rover_id = request.GET.get('rover')
+        substation_id = request.GET.get('substation')
+
+        if not rover_id or not substation_id:
+            return JsonResponse({'error': 'Rover and substation IDs are required'}, status=400)
+
+        # Tentar pegar do Redis primeiro
+        redis_key = f'telemetry:sub{substation_id}:rover{rover_id}'
+        data = redis_client.get(redis_key)
+
+        if data:
+            telemetry = json.loads(data)
+            return JsonResponse({
+                'latitude': telemetry.get('location', {}).get('lat'),
+                'longitude': telemetry.get('location', {}).get('lng'),
+                'status': telemetry.get('status')
+            })
+
+        # Se não encontrar no Redis, buscar o último estado gravado no PostgreSQL
+        try:
+            last_state = RoverLatestState.objects.get(rover__identifier=rover_id)
+
+            return JsonResponse({
+                'latitude': last_state.latitude,
+                'longitude': last_state.longitude,
+                'status': last_state.status
+            })
+
+        except RoverLatestState.DoesNotExist:
+            return JsonResponse({'error': 'No data available'}, status=404)
+
+@api_view(['GET'])
+def get_sensor_data(request):
+    """
+    Endpoint para obter dados dos sensores do rover.
+    """
+    rover_id = request.GET.get('rover')
+    if not rover_id:
+        return Response({'error': 'Rover ID is required'}, status=400)
+
+    try:
+        # Primeiro, buscar o rover para obter a subestação
+        rover = Rover.objects.select_related('substation').get(identifier=rover_id)
+        substation_id = rover.substation.identifier
+
+        logger.info(f"Buscando dados para rover {rover_id} da substation {substation_id}")
+
+        # Tentar pegar do Redis primeiro
+        redis_key = f'telemetry:sub{substation_id}:rover{rover_id}'
+        logger.info(f"Buscando dados do Redis com chave: {redis_key}")
+
+        data = redis_client.get(redis_key)
+        if data:
+            try:
+                telemetry = json.loads(data)
+                response_data = {
+                    'battery': float(telemetry.get('battery', 0)),
+                    'temperature': float(telemetry.get('temperature', 0)),
+                    'speed': float(telemetry.get('speed', 0)),
+                    'substation': substation_id
+                }
+                return Response(response_data)
+            except json.JSONDecodeError as e:
+                logger.error(f"Erro ao decodificar dados do Redis: {e}")
+
+        # Se não encontrar no Redis, buscar o último estado gravado no banco
+        try:
+            last_state = RoverLatestState.objects.get(rover=rover)
+
+            response_data = {
+                'battery': float(last_state.battery_level),
+                'temperature': float(last_state.temperature),
+                'speed': float(last_state.speed or 0),
+                'substation': substation_id
+            }
+            return Response(response_data)
+
+        except RoverLatestState.DoesNotExist:
+            return Response({
+                'battery': 0,
+                'temperature': 0,
+                'speed': 0,
+                'substation': substation_id
+            })
+
+    except Rover.DoesNotExist:
+        return Response({'error': 'Rover not found'}, status=404)
+    except Exception as e:
+        logger.error(f"Erro ao buscar dados dos sensores: {str(e)}", exc_info=True)
+        return Response({
+            'battery': 0,
+            'temperature': 0,
+            'speed': 0
+        })
+
+@api_view(['GET'])
+def list_active_rovers(request):
+    """Lista todos os rovers ativos com seus últimos dados"""
+    substation_id = request.GET.get('substation')
+
+    if not substation_id:
+        return Response({'error': 'Substation ID is required'}, status=400)
+
+    # Uma consulta ao banco e um MGET no Redis, qualquer que seja o tamanho da frota
+    return Response(list_fleet(substation_id, redis_client))
+
+class ImageView(View):
+    """
+    Última imagem do rover. Por padrão responde JSON com a imagem em base64 e
+    as boxes; com ?format=jpeg responde os bytes do JPEG diretamente.
+    ?rendition=thumb|medium escolhe uma versão reduzida (com a original como
+    alternativa enquanto a versão reduzida ainda não foi gerada).
+    """
+
+    def get(self, request, *args, **kwargs):
+        rover_id = request.GET.get('rover')
+        substation_id = request.GET.get('substation')
+
+        if not rover_id or not substation_id:
+            return JsonResponse({'error': 'Rover and substation IDs are required'}, status=400)
+
+        try:
+            rendition = request.GET.get('rendition', ORIGINAL)
+            if rendition not in rendition_names():
+                return JsonResponse({'error': f'Unknown rendition: {rendition}'}, status=400)
+
+            # Versão pedida primeiro, original como alternativa, boxes por último: um único MGET
+            image_keys = [image_redis_key(substation_id, rover_id)]
+            if rendition != ORIGINAL:
+                image_keys.insert(0, rendition_redis_key(substation_id, rover_id, rendition))
+            boxes_key = f'boxes:sub{substation_id}:rover{rover_id}'
+
+            # A imagem é guardada como bytes do JPEG: cliente sem decode_responses
+            *images, boxes_data = binary_redis_client.mget(*image_keys, boxes_key)
+            image_bytes = next((image for image in images if image), None)
+
+            if request.GET.get('format') == 'jpeg':
+                if not image_bytes:
+                    return JsonResponse({'error': 'No recent image data available'}, status=404)
+                response = HttpResponse(image_bytes, content_type=IMAGE_CONTENT_TYPE)
+                response['Cache-Control'] = 'no-store'
+                return response
+
+            if image_bytes and boxes_data:
+                return JsonResponse({
+                    'image': base64.b64encode(image_bytes).decode('ascii'),
+                    'objects': json.loads(boxes_data)
+                })
+            else:
+                return JsonResponse({'error': 'No recent image data available'}, status=404)
+
+        except Exception as e:
+            return JsonResponse({'error': f"Error retrieving data: {str(e)}"}, status=500)
+
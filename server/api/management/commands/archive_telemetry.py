@@ -0,0 +1,98 @@
+# api/management/commands/archive_telemetry.py
+
+import time
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.archive import (
+    ARCHIVE_MODELS, ArchiveError, archive_day, archive_days, archive_dir, archived_between, day_bounds, write_manifest,
+)
+from api.models import Rover, SimplifiedTrack
+from api.rollups import refresh_rollups
+from api.tracks import compact_day
+
+class Command(BaseCommand):
+    help = "Move a telemetria e as leituras de sensores antigas para arquivos Parquet por rover e dia (arquivo frio)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.TELEMETRY_ARCHIVE_AFTER_DAYS,
+            help="Arquiva os dias encerrados há mais de N dias (padrão: TELEMETRY_ARCHIVE_AFTER_DAYS)"
+        )
+        parser.add_argument(
+            '--table',
+            choices=sorted(ARCHIVE_MODELS),
+            action='append',
+            help="Tabela a arquivar (pode repetir; padrão: todas)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Mostra os dias e rovers que seriam arquivados, sem mover nada"
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] <= 0:
+            raise CommandError("Arquivamento desativado: defina TELEMETRY_ARCHIVE_AFTER_DAYS ou --older-than-days")
+
+        before = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=options['older_than_days'])
+        rovers = {rover.pk: rover for rover in Rover.objects.all()}
+        self.stdout.write(f"Arquivando dias anteriores a {before.isoformat()} em {archive_dir()}")
+
+        started = time.perf_counter()
+        total_rows = total_bytes = parts = 0
+        rolled_up = set()
+        for table in options['table'] or sorted(ARCHIVE_MODELS):
+            for day, rover_pks in archive_days(table, before):
+                if options['dry_run']:
+                    identifiers = ', '.join(sorted(rovers[pk].identifier for pk in rover_pks))
+                    self.stdout.write(f"  {table} {day.isoformat()}: {identifiers}")
+                    continue
+
+                if day not in rolled_up:
+                    self.refresh_day_rollups(day)
+                    rolled_up.add(day)
+
+                for rover_pk in sorted(rover_pks):
+                    rover = rovers[rover_pk]
+                    if table == 'telemetry' and not SimplifiedTrack.objects.filter(rover=rover, day=day).exists():
+                        # O trajeto do dia continua disponível no /api/geo/track/ sem as linhas brutas
+                        track = compact_day(rover, day, settings.TRACK_SIMPLIFY_TOLERANCE)
+                        if track is not None:
+                            track.save()
+                    try:
+                        entry = archive_day(table, rover, day)
+                    except ArchiveError as e:
+                        self.stderr.write(f"  {e}; o dia fica no banco para a próxima execução")
+                        continue
+                    if entry is None:
+                        continue
+                    parts += 1
+                    total_rows += entry.rows
+                    total_bytes += entry.size_bytes
+                    self.stdout.write(f"  {entry.path}: {entry.rows} linhas, {entry.size_bytes / 1024:.0f} KiB")
+
+        if options['dry_run']:
+            return
+
+        entries = write_manifest()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{parts} arquivos gravados em {elapsed:.1f}s: {total_rows} linhas, {total_bytes / 1024 / 1024:.1f} MiB "
+            f"({entries} partes no manifesto)"
+        ))
+
+    def refresh_day_rollups(self, day):
+        """
+        Recalcula os agregados do dia antes de remover as linhas brutas: o
+        /api/sensor-series/ responde os dias arquivados só pelos agregados, e o
+        update_rollups pode não ter chegado ao dia (atraso, import_telemetry).
+        Um dia ainda inteiro no banco é recalculado do zero; num dia com partes
+        já arquivadas, só são regravados os intervalos com linhas no banco.
+        """
+        start, end = day_bounds(day)
+        written = refresh_rollups(start, end, rebuild=not archived_between(start, end))
+        self.stdout.write(f"  agregados de {day.isoformat()}: " + ', '.join(f"{name}: {count}" for name, count in written.items()))
@@ -0,0 +1,342 @@
+# api/management/commands/benchmark.py
+
+import asyncio
+import json
+import time
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api.codecs import (
+    decode_telemetry_struct, encode_telemetry_struct,
+    decode_telemetry_msgpack, encode_telemetry_msgpack,
+)
+from api.fleet import list_fleet
+from api.models import Rover, RoverLatestState, RoverTelemetry, Substation
+from api.mqtt_handler import image_redis_key, telemetry_redis_key
+from api.redis_batcher import RedisBatchWriter
+from api.redis_pool import close_async_pools, get_redis, pool_stats
+from api.rover_cache import rover_cache
+from api.topic_router import TopicRouter, decode_binary, decode_json
+from api.views import GPSDataView, ImageView, get_sensor_data, list_active_rovers
+from . import _baseline_views as baseline_views
+
+
+def asgi_sync_view(view):
+    """
+    View síncrona como o Django a executa sob ASGI: a view e, para respostas
+    do DRF, o render() rodam via sync_to_async na thread única das views síncronas.
+    """
+    view = sync_to_async(view, thread_sensitive=True)
+
+    async def run(request):
+        response = await view(request)
+        if callable(getattr(response, 'render', None)):
+            response = await sync_to_async(response.render, thread_sensitive=True)()
+        return response
+    return run
+
+class Command(BaseCommand):
+    help = "Microbenchmarks do pipeline de ingestão (ex.: python manage.py benchmark router)"
+
+    targets = ['router', 'redis', 'codec', 'fleet', 'pool', 'views']
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=self.targets, help="O que medir")
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200000,
+            help="Número de mensagens/iterações por medição"
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['target']}")(options['iterations'])
+
+    def report(self, label, elapsed, iterations):
+        self.stdout.write(
+            f"{label:<40} {iterations / elapsed:>14,.0f} msg/s {elapsed / iterations * 1e9:>10,.0f} ns/msg"
+        )
+
+    def bench_router(self, iterations):
+        """
+        Custo do despacho por tópico (sem decodificação de payload), comparado a
+        uma cadeia if/elif equivalente ao antigo MQTTHandler.on_message.
+        """
+        base_types = ['telemetry', 'image', 'boxes', 'insta/config']
+        topics = [
+            'substations/SUB001/rovers/Rover-Argo-N-0/telemetry',
+            'substations/SUB001/rovers/Rover-Argo-N-1/image',
+            'substations/SUB002/rovers/Rover-Argo-S-0/boxes',
+            'substations/SUB002/rovers/Rover-Argo-S-1/insta/config',
+        ]
+        payload = b'{}'
+
+        def noop(substation_id, rover_id, data):
+            pass
+
+        for extra_types in (0, 50):
+            # Tipos novos entram no começo da cadeia, como um elif acrescentado antes dos demais
+            message_types = [f'extra{i}' for i in range(extra_types)] + base_types
+
+            router = TopicRouter()
+            for message_type in message_types:
+                router.register(message_type, noop, decoder=decode_binary)
+
+            started = time.perf_counter()
+            for i in range(iterations):
+                router.dispatch(topics[i & 3], payload)
+            self.report(f"TopicRouter ({len(message_types)} tipos)", time.perf_counter() - started, iterations)
+
+            def chain_dispatch(topic, payload):
+                parts = topic.split('/')
+                if len(parts) < 5:
+                    return
+                message_type = '/'.join(parts[4:])
+                for candidate in message_types:
+                    if message_type == candidate:
+                        noop(parts[1], parts[3], decode_binary(payload))
+                        return
+
+            started = time.perf_counter()
+            for i in range(iterations):
+                chain_dispatch(topics[i & 3], payload)
+            self.report(f"if/elif ({len(message_types)} tipos)", time.perf_counter() - started, iterations)
+
+    def bench_redis(self, iterations):
+        """
+        Gravação dos últimos valores de telemetria no Redis: um SETEX por
+        mensagem (caminho antigo) contra o RedisBatchWriter (pipeline por tick).
+        Requer um Redis acessível em REDIS_HOST:REDIS_PORT; usa chaves bench:*.
+        """
+        client = get_redis(binary=True)
+        try:
+            client.ping()
+        except redis.RedisError as e:
+            raise CommandError(f"Redis indisponível em {settings.REDIS_HOST}:{settings.REDIS_PORT}: {e}")
+
+        rovers = 100
+        keys = [f'bench:telemetry:rover{i}' for i in range(rovers)]
+        payload = json.dumps({'battery': 87.5, 'temperature': 31.2, 'speed': 4.1,
+                              'location': {'lat': -22.9, 'lng': -43.2}, 'status': 'active'})
+
+        started = time.perf_counter()
+        for i in range(iterations):
+            client.setex(keys[i % rovers], 60, payload)
+        self.report("SETEX por mensagem", time.perf_counter() - started, iterations)
+
+        writer = RedisBatchWriter(client)
+        writer.start()
+        started = time.perf_counter()
+        for i in range(iterations):
+            writer.set(keys[i % rovers], payload, 60)
+        writer.stop()
+        self.report(f"RedisBatchWriter ({writer.interval * 1000:.0f} ms)", time.perf_counter() - started, iterations)
+
+        stats = writer.get_stats()
+        self.stdout.write(
+            f"  flushes={stats['flushes']} chaves gravadas={stats['keys_written']} "
+            f"agrupadas={stats['coalesced']} flush médio={stats['avg_flush_ms']} ms"
+        )
+        client.delete(*keys)
+
+    def bench_codec(self, iterations):
+        """
+        Decodificação e tamanho de uma mensagem de telemetria típica em JSON,
+        MessagePack e no layout binário fixo.
+        """
+        data = {
+            'battery': 87.5,
+            'temperature': 31.25,
+            'speed': 4.5,
+            'location': {'lat': -22.906847, 'lng': -43.172897},
+            'status': 'active',
+            'timestamp': '2024-09-12T14:03:27.512000+00:00',
+            'seq': 184467,
+        }
+        payloads = [
+            ('JSON', json.dumps(data).encode('utf-8'), decode_json),
+            ('MessagePack', encode_telemetry_msgpack(data), decode_telemetry_msgpack),
+            ('binário v1', encode_telemetry_struct(data), decode_telemetry_struct),
+        ]
+
+        json_size = len(payloads[0][1])
+        for label, payload, decoder in payloads:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                decoder(payload)
+            self.report(f"{label} ({len(payload)} bytes)", time.perf_counter() - started, iterations)
+
+        for label, payload, _ in payloads[1:]:
+            self.stdout.write(f"  {label}: {len(payload) / json_size:.0%} do tamanho do JSON")
+
+    def bench_fleet(self, iterations):
+        """
+        Listagem de rovers ativos (/api/active-rovers/) por tamanho da frota: um
+        GET no Redis e um latest() no banco por rover (caminho antigo) contra
+        list_fleet (um MGET e uma consulta). Metade dos rovers tem dados no
+        Redis. Usa uma subestação temporária (desfeita ao final) e faz
+        iterations / 10000 listagens por medição.
+        """
+        client = get_redis(binary=True)
+        try:
+            client.ping()
+        except redis.RedisError as e:
+            raise CommandError(f"Redis indisponível em {settings.REDIS_HOST}:{settings.REDIS_PORT}: {e}")
+
+        repeats = max(1, iterations // 10000)
+        substation_id = 'BENCH-FLEET'
+        payload = json.dumps({'battery': 87.5, 'temperature': 31.2, 'status': 'active'})
+
+        def per_rover_listing():
+            rovers_data = []
+            for rover in Rover.objects.filter(substation__identifier=substation_id, is_active=True):
+                data = client.get(telemetry_redis_key(substation_id, rover.identifier))
+                if data:
+                    rovers_data.append(json.loads(data))
+                    continue
+                try:
+                    rovers_data.append(RoverTelemetry.objects.filter(rover=rover).latest('timestamp'))
+                except RoverTelemetry.DoesNotExist:
+                    continue
+            return rovers_data
+
+        for fleet_size in (10, 50, 200):
+            keys = []
+            with transaction.atomic():
+                substation = Substation.objects.create(name='Benchmark', identifier=substation_id)
+                now = timezone.now()
+                for i in range(fleet_size):
+                    rover = Rover.objects.create(name=f'Bench {i}', identifier=f'bench-{i}', substation=substation)
+                    RoverTelemetry.objects.create(rover=rover, timestamp=now, battery_level=80, temperature=30, status='active')
+                    RoverLatestState.objects.create(rover=rover, timestamp=now, battery_level=80, temperature=30, status='active')
+                    if i % 2 == 0:
+                        keys.append(telemetry_redis_key(substation_id, rover.identifier))
+                        client.setex(keys[-1], 60, payload)
+
+                for label, listing in (('GET + latest() por rover', per_rover_listing),
+                                       ('list_fleet (MGET + 1 consulta)', lambda: list_fleet(substation_id, client))):
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        listed = len(listing())
+                    started = time.perf_counter()
+                    for _ in range(repeats):
+                        listing()
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{fleet_size:>4} rovers  {label:<32} {elapsed / repeats * 1000:>8.2f} ms/listagem "
+                        f"{len(queries):>4} consultas  ({listed} rovers listados)"
+                    )
+                transaction.set_rollback(True)
+            client.delete(*keys)
+
+    def bench_pool(self, iterations):
+        """
+        Leitura de um último valor como nas views: um cliente Redis novo (uma
+        conexão TCP) por requisição, como get_sensor_data e ImageView faziam,
+        contra o cliente do pool compartilhado (api.redis_pool). Faz
+        iterations / 100 leituras por medição.
+        """
+        client = get_redis()
+        try:
+            client.set('bench:pool', json.dumps({'battery': 87.5, 'temperature': 31.2}), ex=60)
+        except redis.RedisError as e:
+            raise CommandError(f"Redis indisponível em {settings.REDIS_HOST}:{settings.REDIS_PORT}: {e}")
+
+        requests = max(1, iterations // 100)
+        started = time.perf_counter()
+        for _ in range(requests):
+            per_request = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+            per_request.get('bench:pool')
+            per_request.close()
+        self.report("cliente novo por requisição", time.perf_counter() - started, requests)
+
+        started = time.perf_counter()
+        for _ in range(requests):
+            get_redis().get('bench:pool')
+        self.report("pool compartilhado", time.perf_counter() - started, requests)
+
+        client.delete('bench:pool')
+        self.stdout.write(f"pool: {pool_stats()['sync']}")
+
+    def bench_views(self, iterations):
+        """
+        Carga concorrente nas views de leitura do painel (gps-data, sensor-data,
+        imagem e active-rovers): as versões síncronas anteriores (cópia em
+        _baseline_views.py), executadas como o Django as executa sob ASGI,
+        contra as views async. Todos os rovers têm dados no Redis.
+        Usa uma subestação temporária (removida ao final) e faz
+        iterations / 100 requisições por medição.
+        """
+        client = get_redis()
+        binary_client = get_redis(binary=True)
+        try:
+            client.ping()
+        except redis.RedisError as e:
+            raise CommandError(f"Redis indisponível em {settings.REDIS_HOST}:{settings.REDIS_PORT}: {e}")
+
+        requests = max(1, iterations // 100)
+        substation_id = 'BENCH-VIEWS'
+        rover_ids = [f'bench-views-{i}' for i in range(20)]
+        payload = json.dumps({'battery': 87.5, 'temperature': 31.2, 'speed': 4.1,
+                              'location': {'lat': -22.9, 'lng': -43.2}, 'status': 'active'})
+
+        endpoints = [
+            ('gps-data', {}, baseline_views.GPSDataView.as_view(), GPSDataView.as_view()),
+            ('sensor-data', {}, baseline_views.get_sensor_data, get_sensor_data),
+            ('imagem', {'format': 'jpeg'}, baseline_views.ImageView.as_view(), ImageView.as_view()),
+            ('active-rovers', {}, baseline_views.list_active_rovers, list_active_rovers),
+        ]
+        factory = AsyncRequestFactory()
+
+        async def load(name, params, view, concurrency):
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+
+            async def one(i):
+                request = factory.get('/', {'rover': rover_ids[i % len(rover_ids)], 'substation': substation_id, **params})
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await view(request)
+                    latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{name}: resposta {response.status_code}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - started
+            # Cada asyncio.run tem seu event loop e, com ele, seu pool asyncio
+            await close_async_pools()
+            return elapsed, sorted(latencies)
+
+        keys = []
+        substation = Substation.objects.create(name='Benchmark', identifier=substation_id)
+        try:
+            now = timezone.now()
+            for rover_id in rover_ids:
+                rover = Rover.objects.create(name=rover_id, identifier=rover_id, substation=substation)
+                RoverLatestState.objects.create(rover=rover, timestamp=now, battery_level=80, temperature=30, status='active')
+                keys += [telemetry_redis_key(substation_id, rover_id), image_redis_key(substation_id, rover_id),
+                         f'boxes:sub{substation_id}:rover{rover_id}']
+                client.setex(keys[-3], 300, payload)
+                binary_client.setex(keys[-2], 300, b'\xff\xd8' + bytes(30000))
+                client.setex(keys[-1], 300, '[]')
+            rover_cache.warm()
+
+            for name, params, sync_view, async_view in endpoints:
+                for concurrency in (1, 50, 500):
+                    for label, view in (('sync', asgi_sync_view(sync_view)), ('async', async_view)):
+                        elapsed, latencies = asyncio.run(load(name, params, view, concurrency))
+                        p50 = latencies[len(latencies) // 2] * 1000
+                        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                        self.stdout.write(
+                            f"{name:<14} {label:<6} {concurrency:>4} simultâneas {requests / elapsed:>9,.0f} req/s "
+                            f"p50 {p50:>8.2f} ms  p99 {p99:>8.2f} ms"
+                        )
+        finally:
+            client.delete(*keys)
+            substation.delete()
@@ -0,0 +1,99 @@
+# api/management/commands/compact_tracks.py
+
+import time
+from datetime import date, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from api.models import Rover, RoverTelemetry, SimplifiedTrack
+from api.tracks import compact_day, day_bounds
+
+class Command(BaseCommand):
+    help = "Grava trajetos simplificados (Douglas-Peucker) por rover e dia para os dias antigos da telemetria"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.TRACK_COMPACT_AFTER_DAYS,
+            help="Compacta apenas dias encerrados há mais de N dias (padrão: TRACK_COMPACT_AFTER_DAYS)"
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=settings.TRACK_SIMPLIFY_TOLERANCE,
+            help="Distância máxima, em metros, entre o trajeto simplificado e as posições removidas (padrão: TRACK_SIMPLIFY_TOLERANCE)"
+        )
+        parser.add_argument(
+            '--start',
+            help="Primeiro dia a compactar (AAAA-MM-DD); padrão: dia seguinte ao último já compactado"
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Recalcula também os dias já compactados a partir de --start"
+        )
+
+    def handle(self, *args, **options):
+        if options['tolerance'] < 0:
+            raise CommandError("--tolerance não pode ser negativa")
+        if options['rebuild'] and not options['start']:
+            raise CommandError("--rebuild requer --start")
+
+        end = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=options['older_than_days'])
+        if options['start']:
+            try:
+                start = date.fromisoformat(options['start'])
+            except ValueError:
+                raise CommandError(f"Data inválida em --start: {options['start']}")
+        else:
+            last_day = SimplifiedTrack.objects.aggregate(last=Max('day'))['last']
+            oldest = RoverTelemetry.objects.filter(latitude__isnull=False).aggregate(oldest=Min('timestamp'))['oldest']
+            if last_day is not None:
+                start = last_day + timedelta(days=1)
+            elif oldest is not None:
+                start = oldest.astimezone(dt_timezone.utc).date()
+            else:
+                self.stdout.write("Nenhuma posição gravada para compactar")
+                return
+
+        if start >= end:
+            self.stdout.write(f"Nada a compactar: dias anteriores a {end.isoformat()} já compactados")
+            return
+
+        rovers = list(Rover.objects.all())
+        started = time.perf_counter()
+        days = raw_points = kept_points = 0
+        day = start
+        while day < end:
+            day_start, day_end = day_bounds(day)
+            pending = set(RoverTelemetry.objects.filter(
+                timestamp__gte=day_start, timestamp__lt=day_end, latitude__isnull=False
+            ).values_list('rover_id', flat=True).distinct())
+            if not options['rebuild']:
+                pending -= set(SimplifiedTrack.objects.filter(day=day).values_list('rover_id', flat=True))
+            tracks = [
+                track for track in (compact_day(rover, day, options['tolerance']) for rover in rovers if rover.pk in pending)
+                if track is not None
+            ]
+            SimplifiedTrack.objects.bulk_create(
+                tracks,
+                update_conflicts=True,
+                unique_fields=['rover', 'day'],
+                update_fields=['tolerance', 'raw_points', 'point_count', 'points'],
+            )
+            if tracks:
+                days += 1
+                day_raw = sum(track.raw_points for track in tracks)
+                day_kept = sum(track.point_count for track in tracks)
+                raw_points += day_raw
+                kept_points += day_kept
+                self.stdout.write(f"{day.isoformat()}: {len(tracks)} rovers, {day_raw} -> {day_kept} pontos")
+            day += timedelta(days=1)
+
+        elapsed = time.perf_counter() - started
+        ratio = raw_points / kept_points if kept_points else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} dias compactados em {elapsed:.1f}s: {raw_points} -> {kept_points} pontos ({ratio:.1f}x)"
+        ))
@@ -0,0 +1,69 @@
+# api/management/commands/export_parquet.py
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse, timezone
+from api.models import Rover, Substation
+from api.parquet_export import PARQUET_SOURCES, export_archived, export_queryset, export_parquet
+
+class Command(BaseCommand):
+    help = "Exporta telemetria ou leituras de sensores de um rover ou subestação para Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Arquivo Parquet de saída")
+        parser.add_argument(
+            '--source',
+            choices=sorted(PARQUET_SOURCES),
+            default='telemetry',
+            help="telemetry (RoverTelemetry) ou sensors (leituras de sensores; os do núcleo exigem --sensor)"
+        )
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument('--rover', help="Identificador do rover")
+        scope.add_argument('--substation', help="Identificador da subestação (todos os seus rovers)")
+        parser.add_argument('--sensor', help="Tipo de sensor (apenas --source sensors); sem ele, exporta os sensores extras")
+        parser.add_argument('--start', help="Início do período (ISO 8601, padrão: 24 h antes do fim)")
+        parser.add_argument('--end', help="Fim do período (ISO 8601, padrão: agora)")
+        parser.add_argument(
+            '--row-group-size',
+            type=int,
+            default=settings.PARQUET_ROW_GROUP_SIZE,
+            help="Linhas por row group (padrão: PARQUET_ROW_GROUP_SIZE)"
+        )
+
+    def parse_datetime(self, value, name):
+        try:
+            parsed = dateparse.parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Data inválida em --{name}: {value}")
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    def handle(self, *args, **options):
+        end = self.parse_datetime(options['end'], 'end') if options['end'] else timezone.now()
+        start = self.parse_datetime(options['start'], 'start') if options['start'] else end - timedelta(hours=24)
+        if start >= end:
+            raise CommandError("--start deve ser anterior a --end")
+        if options['row_group_size'] <= 0:
+            raise CommandError("--row-group-size deve ser positivo")
+
+        rover = substation = None
+        try:
+            if options['rover']:
+                rover = Rover.objects.get(identifier=options['rover'])
+            else:
+                substation = Substation.objects.get(identifier=options['substation'])
+        except (Rover.DoesNotExist, Substation.DoesNotExist):
+            raise CommandError(f"Rover ou subestação não encontrado: {options['rover'] or options['substation']}")
+
+        queryset = export_queryset(options['source'], start, end, rover, substation, options['sensor'])
+        archived = export_archived(options['source'], start, end, rover, substation, options['sensor'])
+        started = time.perf_counter()
+        rows = export_parquet(options['source'], queryset, options['output'], options['row_group_size'], archived)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} linhas exportadas para {options['output']} em {elapsed:.1f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} linhas/s)"
+        ))
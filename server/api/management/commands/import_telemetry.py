@@ -0,0 +1,73 @@
+# api/management/commands/import_telemetry.py
+
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.fleet import bump_fleet_version
+from api.telemetry_import import TelemetryImporter, open_recording
+
+class Command(BaseCommand):
+    help = "Importa telemetria gravada (JSONL de tópico + payload) via COPY, ignorando mensagens já existentes (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='+',
+            help="Arquivos de gravação (.jsonl ou .jsonl.gz); '-' lê da entrada padrão"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help="Mensagens por bloco de COPY/transação (padrão: 50000)"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("A importação por COPY requer PostgreSQL")
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size deve ser positivo")
+
+        importer = TelemetryImporter(chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+
+        for path in options['files']:
+            file_started = time.perf_counter()
+            inserted_before = importer.stats['telemetry_rows']
+            try:
+                recording = open_recording(path)
+            except OSError as e:
+                raise CommandError(f"Não foi possível abrir {path}: {e}")
+            with recording:
+                importer.import_lines(recording)
+            elapsed = time.perf_counter() - file_started
+            inserted = importer.stats['telemetry_rows'] - inserted_before
+            self.stdout.write(f"{path}: {inserted} mensagens inseridas em {elapsed:.1f}s")
+
+        # O último estado dos rovers (RoverLatestState) pode ter mudado
+        if importer.stats['telemetry_rows']:
+            bump_fleet_version()
+
+        elapsed = time.perf_counter() - started
+        stats = importer.stats
+        rows = stats['telemetry_rows'] + stats['sensor_rows']
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída em {elapsed:.1f}s: {stats['telemetry_rows']} telemetrias e "
+            f"{stats['sensor_rows']} leituras de sensores ({rows / elapsed if elapsed else 0:.0f} linhas/s)"
+        ))
+        self.stdout.write(
+            f"  linhas lidas: {stats['lines']}, mensagens: {stats['messages']}, "
+            f"duplicadas: {stats['duplicates']}, rovers desconhecidos: {stats['unknown_rovers']}, "
+            f"inválidas: {stats['invalid']}, outros tópicos: {stats['skipped_topics']}"
+        )
+        if stats['invalid'] and not stats['messages']:
+            raise CommandError("Nenhuma linha válida na gravação (formato ou timestamps inválidos)")
+
+        if importer.first_timestamp and stats['telemetry_rows']:
+            # O fim do período é exclusivo: inclui o minuto da última mensagem
+            end = importer.last_timestamp + timedelta(minutes=1)
+            self.stdout.write(
+                "Para atualizar os agregados do período importado: python manage.py update_rollups --rebuild "
+                f"--start {importer.first_timestamp.isoformat()} --end {end.isoformat()}"
+            )
@@ -0,0 +1,76 @@
+# api/management/commands/manage_partitions.py
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.partitions import (
+    PARTITIONED_TABLES,
+    INTERVALS,
+    is_supported,
+    is_partitioned,
+    list_partitions,
+    ensure_partitions,
+    drop_partitions_before,
+)
+
+class Command(BaseCommand):
+    help = "Cria as partições futuras de telemetria e remove as que passaram da retenção (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.TELEMETRY_PARTITIONS_AHEAD,
+            help="Quantos intervalos à frente devem ter partição criada (padrão: TELEMETRY_PARTITIONS_AHEAD)"
+        )
+        parser.add_argument(
+            '--interval',
+            choices=sorted(INTERVALS),
+            default=settings.TELEMETRY_PARTITION_INTERVAL,
+            help="Tamanho das novas partições (padrão: TELEMETRY_PARTITION_INTERVAL)"
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.TELEMETRY_RETENTION_DAYS,
+            help="Remove partições inteiramente mais antigas que N dias; 0 desativa (padrão: TELEMETRY_RETENTION_DAYS)"
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help="Apenas lista as partições existentes"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Mostra as partições que seriam removidas, sem remover"
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            raise CommandError("Particionamento de telemetria requer PostgreSQL")
+
+        now = datetime.now(tz=dt_timezone.utc)
+        with connection.cursor() as cursor:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(cursor, table):
+                    raise CommandError(f"A tabela {table} não é particionada; aplique as migrações (python manage.py migrate)")
+
+                if options['list']:
+                    self.stdout.write(f"{table}:")
+                    for name, start, end in list_partitions(cursor, table):
+                        self.stdout.write(f"  {name:<40} {start:%Y-%m-%d} -> {end:%Y-%m-%d}")
+                    continue
+
+                if not options['dry_run']:
+                    created = ensure_partitions(cursor, table, options['interval'], options['ahead'], now=now)
+                    for name in created:
+                        self.stdout.write(self.style.SUCCESS(f"Partição criada: {name}"))
+
+                if options['retention_days'] > 0:
+                    cutoff = now - timedelta(days=options['retention_days'])
+                    dropped = drop_partitions_before(cursor, table, cutoff, dry_run=options['dry_run'])
+                    verb = "seria removida" if options['dry_run'] else "removida"
+                    for name in dropped:
+                        self.stdout.write(self.style.WARNING(f"Partição {verb}: {name}"))
@@ -0,0 +1,45 @@
+# api/management/commands/run_ingest.py
+
+import asyncio
+from django.core.management.base import BaseCommand
+from api.ingest import AsyncIngestService
+
+class Command(BaseCommand):
+    help = "Executa o serviço de ingestão MQTT assíncrono (asyncio)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--client-id',
+            default=None,
+            help="Client ID MQTT, também usado como ID do worker (padrão: ingest-<host>-<pid>)"
+        )
+        parser.add_argument(
+            '--shared-group',
+            default=None,
+            help="Grupo de assinatura compartilhada MQTT v5 ($share/<grupo>/...) "
+                 "para dividir a carga entre vários workers (padrão: INGEST_SHARED_GROUP)"
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help="Máximo de mensagens processadas simultaneamente (padrão: INGEST_CONCURRENCY)"
+        )
+
+    def handle(self, *args, **options):
+        service = AsyncIngestService(
+            client_id=options['client_id'],
+            concurrency=options['concurrency'],
+            shared_group=options['shared_group']
+        )
+        if service.shared_group:
+            self.stdout.write(self.style.SUCCESS(
+                f"Iniciando worker de ingestão {service.client_id} no grupo compartilhado '{service.shared_group}'..."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Iniciando serviço de ingestão MQTT..."))
+        try:
+            asyncio.run(service.run())
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Serviço de ingestão encerrado"))
@@ -0,0 +1,59 @@
+# api/management/commands/update_rollups.py
+
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import dateparse, timezone
+from api.archive import archived_between
+from api.rollups import refresh_rollups, update_rollups
+
+class Command(BaseCommand):
+    help = "Atualiza os agregados de sensores (1 minuto e 1 hora) a partir das leituras brutas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Executa continuamente, a cada ROLLUP_UPDATE_INTERVAL segundos"
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Recalcula do zero os agregados do período --start/--end"
+        )
+        parser.add_argument('--start', help="Início do período a recalcular (ISO 8601)")
+        parser.add_argument('--end', help="Fim do período a recalcular (ISO 8601, padrão: agora)")
+
+    def parse_datetime(self, value, name):
+        try:
+            parsed = dateparse.parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Data inválida em --{name}: {value}")
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            if not options['start']:
+                raise CommandError("--rebuild requer --start")
+            start = self.parse_datetime(options['start'], 'start')
+            end = self.parse_datetime(options['end'], 'end') if options['end'] else timezone.now()
+            if archived_between(start, end):
+                raise CommandError(
+                    "O período inclui dias já movidos para o arquivo frio (archive_telemetry); "
+                    "os agregados desses dias não podem ser recalculados a partir do banco"
+                )
+            written = refresh_rollups(start, end, rebuild=True)
+            self.stdout.write(self.style.SUCCESS(f"Agregados recalculados de {start} a {end}: {written}"))
+            return
+
+        while True:
+            started = time.monotonic()
+            written = update_rollups()
+            self.stdout.write(f"Agregados atualizados em {time.monotonic() - started:.2f}s: {written}")
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(settings.ROLLUP_UPDATE_INTERVAL)
@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 03:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_rovertelemetry_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rovertelemetry',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations
+
+# Cópia congelada de api.partitions na data desta migração: alterações
+# posteriores no módulo ou nas configurações não mudam o que ela faz.
+# As partições seguintes são criadas pelo manage_partitions, com a
+# configuração em vigor (TELEMETRY_PARTITION_INTERVAL / _AHEAD).
+PARTITIONED_TABLES = ('api_rovertelemetry', 'api_sensorreading')
+PARTITION_KEY = 'timestamp'
+INTERVAL = timedelta(weeks=1)
+PARTITIONS_AHEAD = 4
+
+
+def partition_start(value):
+    """Segunda-feira (UTC, 00:00) da semana que contém `value`."""
+    value = value.astimezone(dt_timezone.utc)
+    start = datetime(value.year, value.month, value.day, tzinfo=dt_timezone.utc)
+    return start - timedelta(days=start.weekday())
+
+
+def partition_table(cursor, table):
+    """
+    Converte a tabela em particionada por faixa de timestamp, mantendo nome,
+    colunas, índices e chaves estrangeiras. A chave primária passa a ser
+    (id, timestamp), exigência do PostgreSQL para tabelas particionadas.
+    """
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+        [table]
+    )
+    if cursor.fetchone() is not None:
+        return
+
+    legacy = f'{table}_legacy'
+    sequence = f'{table}_id_seq'
+
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f'{table}_pkey']
+    )
+    index_definitions = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(f'SELECT MIN("{PARTITION_KEY}") FROM "{table}"')
+    oldest = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{table}_pkey" TO "{legacy}_pkey"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("{PARTITION_KEY}")'
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id, "{PARTITION_KEY}")')
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    # Uma partição por semana, da linha mais antiga até PARTITIONS_AHEAD semanas à frente
+    now = datetime.now(tz=dt_timezone.utc)
+    start = partition_start(oldest or now)
+    last = partition_start(now) + INTERVAL * PARTITIONS_AHEAD
+    while start <= last:
+        end = start + INTERVAL
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}_p{start:%Y%m%d}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    # Remove a tabela antiga junto com seus índices e a sequência de identidade
+    cursor.execute(f'DROP TABLE "{legacy}"')
+
+    for definition in index_definitions:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+    cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}".id')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(\'"{sequence}"\')')
+    cursor.execute(f'SELECT setval(\'"{sequence}"\', COALESCE(MAX(id), 0) + 1, false) FROM "{table}"')
+
+
+def partition_tables(apps, schema_editor):
+    # Particionamento declarativo só existe no PostgreSQL; em outros bancos
+    # (ex.: SQLite em desenvolvimento) as tabelas continuam comuns
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            partition_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_telemetry_timestamp_default'),
+    ]
+
+    operations = [
+        # A tabela particionada mantém nome e colunas, então o estado dos
+        # modelos não muda e a reversão não precisa desfazer o particionamento
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
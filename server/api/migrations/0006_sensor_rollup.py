@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 04:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_partition_telemetry_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_type', models.CharField(max_length=50)),
+                ('resolution', models.CharField(choices=[('1m', '1 minuto'), ('1h', '1 hora')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('sum_value', models.FloatField()),
+                ('count', models.IntegerField()),
+                ('last_value', models.FloatField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('rover', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.rover')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='api_sensorr_resolut_b9adb8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rover', 'sensor_type', 'resolution', 'bucket'), name='unique_sensor_rollup_bucket')],
+            },
+        ),
+    ]
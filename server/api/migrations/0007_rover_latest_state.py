@@ -0,0 +1,45 @@
+# Generated by Django 5.1 on 2026-10-18 04:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+STATE_FIELDS = ['timestamp', 'battery_level', 'temperature', 'latitude', 'longitude', 'speed', 'status']
+
+
+def backfill_latest_state(apps, schema_editor):
+    # Uma consulta por rover, cada uma resolvida pelo índice (rover, timestamp)
+    Rover = apps.get_model('api', 'Rover')
+    RoverTelemetry = apps.get_model('api', 'RoverTelemetry')
+    RoverLatestState = apps.get_model('api', 'RoverLatestState')
+
+    states = []
+    for rover_pk in Rover.objects.values_list('pk', flat=True):
+        latest = RoverTelemetry.objects.filter(rover_id=rover_pk).order_by('-timestamp').values(*STATE_FIELDS).first()
+        if latest is not None:
+            states.append(RoverLatestState(rover_id=rover_pk, **latest))
+    RoverLatestState.objects.bulk_create(states, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_sensor_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoverLatestState',
+            fields=[
+                ('rover', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_state', serialize=False, to='api.rover')),
+                ('timestamp', models.DateTimeField()),
+                ('battery_level', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('speed', models.FloatField(null=True)),
+                ('status', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.RunPython(backfill_latest_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1 on 2026-10-18 04:33
+
+from datetime import timedelta
+
+from django.db import migrations, models, transaction
+from django.utils.dateparse import parse_datetime
+
+# Cópia congelada da fórmula de api.geo (encode_geohash / geohash_sql) na data
+# desta migração: 26 bits por eixo, intercalados (curva Z)
+GEOHASH_BITS = 26
+SCALE = 1 << GEOHASH_BITS
+SPREAD_STEPS = (
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+)
+
+
+def geohash_sql(vendor):
+    # No PostgreSQL o CAST arredonda; no SQLite trunca (valores aqui são >= 0)
+    floor = 'FLOOR' if vendor == 'postgresql' else ''
+
+    def quantize(column, low, span):
+        return (
+            f'(CASE WHEN {column} <= {low} THEN 0 WHEN {column} >= {low + span} THEN {SCALE - 1} '
+            f'ELSE CAST({floor}(({column} - ({low})) / {span} * {SCALE}) AS BIGINT) END)'
+        )
+
+    def spread(expression):
+        for shift, mask in SPREAD_STEPS:
+            expression = f'(({expression} | ({expression} << {shift})) & {mask})'
+        return expression
+
+    x = quantize('longitude', -180.0, 360.0)
+    y = quantize('latitude', -90.0, 180.0)
+    return f'(({spread(y)} << 1) | {spread(x)})'
+
+
+def fill_geohash(apps, schema_editor):
+    # Calculado no próprio banco, um UPDATE por dia de dados (transações curtas em tabelas grandes)
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT MIN("timestamp"), MAX("timestamp") FROM api_rovertelemetry '
+            'WHERE geohash IS NULL AND latitude IS NOT NULL'
+        )
+        oldest, newest = cursor.fetchone()
+    if oldest is None:
+        return
+
+    if isinstance(oldest, str):
+        # SQLite devolve texto em consultas cruas
+        oldest, newest = parse_datetime(oldest), parse_datetime(newest)
+
+    step = timedelta(days=1)
+    adapt = connection.ops.adapt_datetimefield_value
+    sql = (
+        f'UPDATE api_rovertelemetry SET geohash = {geohash_sql(connection.vendor)} '
+        f'WHERE geohash IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL '
+        f'AND "timestamp" >= %s AND "timestamp" < %s'
+    )
+    start = oldest
+    while start <= newest:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(sql, [adapt(start), adapt(start + step)])
+        start += step
+
+
+class Migration(migrations.Migration):
+    # O preenchimento faz uma transação por dia de dados em vez de uma única
+    # transação longa sobre toda a tabela
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_rover_latest_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rovertelemetry',
+            name='geohash',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='rovertelemetry',
+            index=models.Index(fields=['geohash', 'timestamp'], name='api_roverte_geohash_d854d6_idx'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_telemetry_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimplifiedTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tolerance', models.FloatField()),
+                ('raw_points', models.IntegerField()),
+                ('point_count', models.IntegerField()),
+                ('points', models.BinaryField()),
+                ('rover', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.rover')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('rover', 'day'), name='unique_simplified_track_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 04:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_simplified_track'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelemetryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(choices=[('telemetry', 'RoverTelemetry'), ('sensors', 'SensorReading')], max_length=20)),
+                ('day', models.DateField()),
+                ('part', models.IntegerField(default=0)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('rows', models.IntegerField()),
+                ('size_bytes', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('rover', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.rover')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('table', 'rover', 'day', 'part'), name='unique_telemetry_archive_part')],
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+from pathlib import Path
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class Substation(models.Model):
     name = models.CharField(max_length=200)
@@ -28,7 +32,7 @@ class Rover(models.Model):
 
 class SensorReading(models.Model):
     rover = models.ForeignKey(Rover, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     sensor_type = models.CharField(max_length=50)
     value = models.FloatField()
     unit = models.CharField(max_length=20)
@@ -41,16 +45,121 @@ class SensorReading(models.Model):
 
 class RoverTelemetry(models.Model):
     rover = models.ForeignKey(Rover, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     battery_level = models.FloatField()
     temperature = models.FloatField()
     latitude = models.FloatField(null=True)
     longitude = models.FloatField(null=True)
     speed = models.FloatField(null=True)
     status = models.CharField(max_length=50)
+    # Geohash inteiro da posição (api.geo), para buscas espaciais por intervalo no índice
+    geohash = models.BigIntegerField(null=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=['rover', 'timestamp'])
+            models.Index(fields=['rover', 'timestamp']),
+            models.Index(fields=['geohash', 'timestamp'])
         ]
         get_latest_by = 'timestamp'
+
+class SensorRollup(models.Model):
+    """
+    Agregado das leituras de um sensor por rover em intervalos fixos
+    (mantido por api.rollups a partir das leituras brutas, que continuam sendo a fonte).
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minuto'),
+        ('1h', '1 hora'),
+    ]
+
+    rover = models.ForeignKey(Rover, on_delete=models.CASCADE)
+    sensor_type = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    sum_value = models.FloatField()
+    count = models.IntegerField()
+    last_value = models.FloatField()
+    last_timestamp = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['rover', 'sensor_type', 'resolution', 'bucket'],
+                name='unique_sensor_rollup_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket'])
+        ]
+
+    @property
+    def avg_value(self):
+        return self.sum_value / self.count if self.count else None
+
+class RoverLatestState(models.Model):
+    """
+    Último estado conhecido de cada rover (uma linha por rover), atualizado
+    pela gravação da telemetria (api.latest_state) para que listagens não
+    precisem consultar o histórico de RoverTelemetry.
+    """
+    rover = models.OneToOneField(Rover, on_delete=models.CASCADE, primary_key=True, related_name='latest_state')
+    timestamp = models.DateTimeField()
+    battery_level = models.FloatField()
+    temperature = models.FloatField()
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    speed = models.FloatField(null=True)
+    status = models.CharField(max_length=50)
+
+class SimplifiedTrack(models.Model):
+    """
+    Trajeto GPS de um rover em um dia (UTC), simplificado com Douglas-Peucker
+    (api.tracks) pelo compact_tracks. Serve o histórico frio, inclusive depois
+    que as partições brutas do dia são removidas pela retenção.
+    """
+    rover = models.ForeignKey(Rover, on_delete=models.CASCADE)
+    day = models.DateField()
+    tolerance = models.FloatField()  # metros
+    raw_points = models.IntegerField()
+    point_count = models.IntegerField()
+    # Pontos (epoch, latitude, longitude) em float64, ver api.tracks.pack_points
+    points = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rover', 'day'], name='unique_simplified_track_day')
+        ]
+
+class TelemetryArchive(models.Model):
+    """
+    Manifesto do arquivo frio: um arquivo Parquet com as linhas de uma tabela
+    (telemetria ou leituras de sensores) de um rover em um dia (UTC), gravado
+    pelo archive_telemetry (api.archive) ao remover essas linhas do banco.
+    Linhas que chegam depois para um dia já arquivado geram partes extras.
+    """
+    TABLE_CHOICES = [
+        ('telemetry', 'RoverTelemetry'),
+        ('sensors', 'SensorReading'),
+    ]
+
+    table = models.CharField(max_length=20, choices=TABLE_CHOICES)
+    rover = models.ForeignKey(Rover, on_delete=models.CASCADE)
+    day = models.DateField()
+    part = models.IntegerField(default=0)
+    # Caminho relativo a settings.TELEMETRY_ARCHIVE_DIR
+    path = models.CharField(max_length=255, unique=True)
+    rows = models.IntegerField()
+    size_bytes = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'rover', 'day', 'part'], name='unique_telemetry_archive_part')
+        ]
+
+    @property
+    def file_path(self):
+        return Path(settings.TELEMETRY_ARCHIVE_DIR) / self.path
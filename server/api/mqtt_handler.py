@@ -2,15 +2,85 @@ import paho.mqtt.client as mqtt
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import json
-import redis
 from django.conf import settings
 import logging
 from django.utils import timezone
-from django.db import transaction, DatabaseError
-from .models import Rover, RoverTelemetry, SensorReading
+from .codecs import decode_telemetry_struct, decode_telemetry_msgpack
+from .image_frames import IMAGE_CONTENT_TYPE, build_image_frame, decode_image_payload
+from .image_renditions import ORIGINAL, ImageRenditionPool, image_group_name, rendition_redis_key
+from .redis_batcher import RedisBatchWriter
+from .redis_pool import get_redis
+from .rover_cache import rover_cache
+from .topic_router import TopicRouter, decode_binary
+from .telemetry_writer import TelemetryBatchWriter
+from .work_queues import POLICY_BLOCK, BoundedWorkQueue
 
 logger = logging.getLogger(__name__)
 
+# Tempo de vida (segundos) dos últimos valores guardados no Redis
+LATEST_VALUE_TTL = 300
+
+
+# Hash identifier -> último estado de cada rover, lido pelo /api/fleet-snapshot/ (ver fleet.py)
+FLEET_SNAPSHOT_KEY = 'fleet:snapshot'
+# Versão do snapshot da frota (ETag), incrementada a cada alteração
+FLEET_VERSION_KEY = 'fleet:version'
+
+
+def telemetry_redis_key(substation_id, rover_id):
+    return f'telemetry:sub{substation_id}:rover{rover_id}'
+
+
+def image_redis_key(substation_id, rover_id):
+    # Guarda os bytes do JPEG (não mais o base64): leia com um cliente sem decode_responses
+    return f'image:jpeg:sub{substation_id}:rover{rover_id}'
+
+
+def build_telemetry_ws_data(data):
+    """
+    Monta o evento de telemetria enviado aos clientes WebSocket
+    """
+    return {
+        'battery': float(data.get('battery', 0)),
+        'temperature': float(data.get('temperature', 0)),
+        'speed': float(data.get('speed', 0)),
+        'latitude': float(data.get('location', {}).get('lat', 0)),
+        'longitude': float(data.get('location', {}).get('lng', 0)),
+        'status': data.get('status', 'unknown'),
+        'timestamp': data.get('timestamp')
+    }
+
+
+def build_fleet_snapshot_entry(ws_data):
+    """
+    Entrada do rover no hash do snapshot da frota: o evento de telemetria mais
+    o horário de recebimento no servidor ('received_at'), comparado com o
+    RoverLatestState (ver fleet._snapshot_rover). O 'timestamp' vem do relógio
+    do rover e não serve para essa comparação.
+    """
+    return json.dumps(dict(ws_data, received_at=timezone.now().isoformat()))
+
+
+def build_image_event(substation_id, rover_id, image_bytes, rendition=ORIGINAL):
+    """
+    Monta o evento de imagem do channel layer. O quadro binário (cabeçalho +
+    JPEG) é montado uma única vez aqui e repassado sem cópias aos clientes
+    WebSocket em modo binário (ver RoverConsumer.image_update).
+    """
+    header = {
+        'type': 'image_update',
+        'substation_id': substation_id,
+        'rover_id': rover_id,
+        'rendition': rendition,
+        'content_type': IMAGE_CONTENT_TYPE,
+        'size': len(image_bytes),
+        'timestamp': timezone.now().isoformat(),
+    }
+    return {
+        'type': 'image_update',
+        'frame': build_image_frame(header, image_bytes),
+    }
+
 class MQTTHandler:
     def __init__(self):
         # Configuração do cliente MQTT
@@ -18,28 +88,62 @@ class MQTTHandler:
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
 
-        # Configuração do Redis para Telemetria
-        try:
-            self.redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=1,
-                decode_responses=True
-            )
-            logger.info("Conectado ao Redis para salvamento de telemetria")
-        except redis.RedisError as e:
-            logger.error(f"Erro ao conectar ao Redis: {e}")
-            self.redis_client = None  # Continua sem Redis se houver erro
+        # Redis para telemetria, do pool compartilhado do processo (api.redis_pool)
+        self.redis_client = get_redis()
+
+        # Últimos valores (telemetria e imagem) gravados em pipeline a cada tick
+        self.redis_writer = RedisBatchWriter(self.redis_client)
 
         # Configuração do Channel Layer para WebSockets
         self.channel_layer = get_channel_layer()
 
+        # Gravação da telemetria no PostgreSQL em lotes
+        self.telemetry_writer = TelemetryBatchWriter()
+
+        # Roteamento dos tópicos por tipo de mensagem (QoS 1 para garantir entrega)
+        self.router = TopicRouter()
+        self.router.register('telemetry', self.handle_telemetry_message, sinks=('redis', 'database', 'websocket'))
+        # Telemetria compacta: layout binário fixo e MessagePack (ver codecs.py)
+        self.router.register('telemetry/bin', self.handle_telemetry_message, decoder=decode_telemetry_struct,
+                             sinks=('redis', 'database', 'websocket'), queue='telemetry')
+        self.router.register('telemetry/msgpack', self.handle_telemetry_message, decoder=decode_telemetry_msgpack,
+                             sinks=('redis', 'database', 'websocket'), queue='telemetry')
+        self.router.register('image', self.handle_image_message, sinks=('redis', 'websocket'))
+        # Imagem publicada diretamente como bytes do JPEG, sem JSON nem base64
+        self.router.register('image/jpeg', self.handle_image_message, decoder=decode_binary,
+                             sinks=('redis', 'websocket'), queue='image')
+        self.router.register('boxes', self.handle_boxes_message, sinks=('websocket',))
+        self.router.register('insta/config', self.handle_insta_config_message, sinks=('websocket',))
+
+        # Versões reduzidas das imagens (miniatura, média) geradas fora das filas de ingestão
+        self.rendition_pool = ImageRenditionPool(self.publish_renditions)
+
+        # Filas limitadas por tipo de mensagem: o callback do paho só enfileira
+        self.work_queues = {
+            message_type: BoundedWorkQueue(message_type, **config)
+            for message_type, config in settings.MQTT_WORK_QUEUES.items()
+        }
+        for work_queue in self.work_queues.values():
+            if work_queue.policy == POLICY_BLOCK and work_queue.block_timeout >= settings.MQTT_KEEPALIVE:
+                # A espera acontece na thread de rede do paho: passar do keepalive derruba a conexão
+                raise ValueError(
+                    f"Fila '{work_queue.name}': block_timeout ({work_queue.block_timeout}s) "
+                    f"precisa ser menor que MQTT_KEEPALIVE ({settings.MQTT_KEEPALIVE}s)"
+                )
+
         logger.info("MQTT Handler inicializado")
 
     def connect(self):
         try:
-            self.client.connect(settings.MQTT_HOST, settings.MQTT_PORT, 60)
+            self.client.connect(settings.MQTT_HOST, settings.MQTT_PORT, settings.MQTT_KEEPALIVE)
             logger.info(f"Conectado ao broker MQTT em {settings.MQTT_HOST}:{settings.MQTT_PORT}")
+            rover_cache.warm()
+            self.telemetry_writer.start()
+            if self.redis_writer:
+                self.redis_writer.start()
+            self.rendition_pool.start()
+            for work_queue in self.work_queues.values():
+                work_queue.start(self.process_queued_message)
             self.client.loop_start()
         except Exception as e:
             logger.error(f"Erro ao conectar ao MQTT: {e}")
@@ -48,12 +152,7 @@ class MQTTHandler:
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logger.info("Conectado ao broker MQTT com sucesso")
-            topics = [
-                ("substations/+/rovers/+/telemetry", 1),  # QoS 1 para garantir entrega
-                ("substations/+/rovers/+/image", 1),
-                ("substations/+/rovers/+/boxes", 1),
-                ("substations/+/rovers/+/insta/config", 1),  # ouvir respostas Insta360
-            ]
+            topics = self.router.subscriptions()
             client.subscribe(topics)
             logger.info(f"Inscrito nos tópicos: {topics}")
         else:
@@ -61,102 +160,74 @@ class MQTTHandler:
 
     def on_message(self, client, userdata, msg):
         try:
-            logger.info(f"[MQTT] Mensagem recebida no tópico: {msg.topic}")
-            logger.info(f"[MQTT] Payload: {msg.payload}")
-            parts = msg.topic.split('/')
-            if len(parts) < 5:
-                logger.error(f"[MQTT] Formato de tópico inválido: {msg.topic}")
+            logger.debug(f"[MQTT] Mensagem recebida no tópico: {msg.topic}")
+            matched = self.router.resolve(msg.topic)
+            if matched is None:
                 return
+            route, substation_id, rover_id = matched
 
-            substation_id = parts[1]
-            rover_id = parts[3]
-            message_type = parts[4]
-
-            logger.info(f"[MQTT] Processando mensagem tipo {message_type} para rover {rover_id}")
-
-            # Processar comando de captura de imagem
-            if message_type == 'commands':
-                try:
-                    command_data = json.loads(msg.payload.decode())
-                    logger.info(f"[MQTT] Comando recebido: {command_data}")
-
-                    if command_data.get('command') == 'capture_image':
-                        logger.info(f"[MQTT] Iniciando captura de imagem para rover {rover_id}")
-                except json.JSONDecodeError:
-                    logger.error(f"[MQTT] Falha ao decodificar comando JSON")
-            elif message_type == 'image':
-                self.handle_image_message(substation_id, rover_id, msg.payload)
-            elif message_type == 'boxes':
-                self.handle_boxes_message(rover_id, msg.payload)
-            elif message_type == 'insta' and len(parts) > 5 and parts[5] == 'config':
-                # config response do dispositivo
-                try:
-                    data = json.loads(msg.payload.decode())
-                    logger.info(f"[MQTT] Resposta insta/config recebida: {data}")
-                    status_value = data.get('status')
-                    logger.info(f"[MQTT] Status da resposta insta/config: {status_value}, tipo: {type(status_value)}")
-                    
-                    # Enviar via WebSocket
-                    channel_message = {
-                        'type': 'insta_config',
-                        'data': {'status': status_value}
-                    }
-                    logger.info(f"[MQTT] Enviando para WebSocket: {channel_message}")
-                    
-                    async_to_sync(self.channel_layer.group_send)(
-                        f'rover_{rover_id}',
-                        channel_message
-                    )
-                    logger.info(f"[MQTT] Mensagem enviada para o grupo WebSocket: rover_{rover_id}")
-                except Exception as e:
-                    logger.error(f"[MQTT] Erro ao tratar resposta insta/config: {e}", exc_info=True)
-            elif message_type == 'telemetry':
-                self.handle_telemetry_message(substation_id, rover_id, msg.payload)
-            else:
-                logger.warning(f"Tipo de mensagem desconhecido: {message_type}")
-
+            work_queue = self.work_queues.get(route.queue)
+            if work_queue is None:
+                # Tipo sem fila configurada: processa na própria thread do paho
+                self.router.handle(route, substation_id, rover_id, msg.payload)
+                return
+            work_queue.put(rover_id, (route, substation_id, rover_id, msg.payload))
         except Exception as e:
             logger.error(f"[MQTT] Erro no handler on_message: {e}", exc_info=True)
 
-    def handle_image_message(self, substation_id, rover_id, payload):
+    def process_queued_message(self, item):
+        """
+        Executado pelas threads das filas: decodifica e chama o handler
+        """
+        route, substation_id, rover_id, payload = item
+        self.router.handle(route, substation_id, rover_id, payload)
+
+    def handle_image_message(self, substation_id, rover_id, data):
         """
-        Processa mensagens de imagem e envia via WebSocket
+        Processa mensagens de imagem e envia via WebSocket.
+        O base64 é decodificado uma única vez aqui; Redis e WebSocket recebem os bytes do JPEG.
         """
         try:
-            # Decodificar o JSON recebido do MQTT
-            data = json.loads(payload)
-            image_data = data.get('imagem', '')  # Pega o base64 do campo 'imagem'
+            image_bytes = decode_image_payload(data)
+            if not image_bytes:
+                logger.warning(f"[handle_image_message] Mensagem de imagem vazia de {rover_id}")
+                return
 
-            logger.info(f"[handle_image_message] Recebida imagem de {rover_id}")
+            logger.info(f"[handle_image_message] Recebida imagem de {rover_id} ({len(image_bytes)} bytes)")
 
-            # Salvar no Redis
-            if self.redis_client:
-                image_key = f'image:sub{substation_id}:rover{rover_id}'
-                self.redis_client.setex(image_key, 300, image_data)
+            # Salvar no Redis (gravação agrupada; só a imagem mais recente é gravada)
+            if self.redis_writer:
+                self.redis_writer.set(image_redis_key(substation_id, rover_id), image_bytes, LATEST_VALUE_TTL)
 
-            # Enviar via WebSocket
+            # Enviar via WebSocket a quem assina a resolução original
             async_to_sync(self.channel_layer.group_send)(
-                f'rover_{rover_id}',
-                {
-                    'type': 'image_update',
-                    'data': {
-                        'image': image_data,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                }
+                image_group_name(rover_id),
+                build_image_event(substation_id, rover_id, image_bytes)
             )
             logger.info(f"[handle_image_message] Imagem enviada ao WebSocket do rover {rover_id}")
+
+            self.rendition_pool.submit(substation_id, rover_id, image_bytes)
         except Exception as e:
             logger.error(f"[handle_image_message] Erro ao tratar mensagem de imagem: {e}")
 
-    def handle_boxes_message(self, rover_id, payload):
+    def publish_renditions(self, substation_id, rover_id, renditions):
+        """
+        Executado pelo pool de imagens: grava cada versão reduzida no Redis e
+        envia ao grupo WebSocket da respectiva resolução.
+        """
+        for rendition, image_bytes in renditions.items():
+            if self.redis_writer:
+                self.redis_writer.set(rendition_redis_key(substation_id, rover_id, rendition), image_bytes, LATEST_VALUE_TTL)
+            async_to_sync(self.channel_layer.group_send)(
+                image_group_name(rover_id, rendition),
+                build_image_event(substation_id, rover_id, image_bytes, rendition)
+            )
+
+    def handle_boxes_message(self, substation_id, rover_id, boxes_data):
         """
         Processa mensagens de boxes e envia via WebSocket
         """
         try:
-            # Decodificar JSON das boxes
-            boxes_data = json.loads(payload)
-
             # Enviar via WebSocket com timestamp
             async_to_sync(self.channel_layer.group_send)(
                 f'rover_{rover_id}',
@@ -169,58 +240,61 @@ class MQTTHandler:
                 }
             )
             logger.info(f"Dados de boxes enviados para WebSocket do rover {rover_id}")
-        except json.JSONDecodeError as e:
-            logger.error(f"Erro ao decodificar JSON das boxes: {e}")
         except Exception as e:
             logger.error(f"Erro ao tratar mensagem de boxes: {e}")
 
-    def handle_telemetry_message(self, substation_id, rover_id, payload):
+    def handle_insta_config_message(self, substation_id, rover_id, data):
+        """
+        Processa respostas de configuração da Insta360 e envia via WebSocket
+        """
+        try:
+            status_value = data.get('status')
+            logger.info(f"[MQTT] Resposta insta/config recebida: {data}")
+
+            async_to_sync(self.channel_layer.group_send)(
+                f'rover_{rover_id}',
+                {
+                    'type': 'insta_config',
+                    'data': {'status': status_value}
+                }
+            )
+            logger.info(f"[MQTT] Mensagem enviada para o grupo WebSocket: rover_{rover_id}")
+        except Exception as e:
+            logger.error(f"[MQTT] Erro ao tratar resposta insta/config: {e}", exc_info=True)
+
+    def handle_telemetry_message(self, substation_id, rover_id, data):
         """
         Processa mensagens de telemetria, salva no Redis e PostgreSQL,
         e envia via WebSocket
         """
         try:
-            # Decodificar e parsear JSON
-            try:
-                payload_str = payload.decode('utf-8')
-                data = json.loads(payload_str)
-                logger.debug(f"Payload de telemetria decodificado: {data}")
-            except json.JSONDecodeError as e:
-                logger.error(f"Payload de telemetria JSON inválido: {e}")
-                return
-            except UnicodeDecodeError as e:
-                logger.error(f"Erro ao decodificar payload de telemetria: {e}")
-                return
-
             # Adicionar timestamp se não existir
             if 'timestamp' not in data:
                 data['timestamp'] = timezone.now().isoformat()
 
-            # Salvar no Redis
-            if self.redis_client:
-                redis_key = f'telemetry:sub{substation_id}:rover{rover_id}'
-                try:
-                    self.redis_client.setex(redis_key, 300, json.dumps(data))
-                    logger.info(f"Dados de telemetria salvos no Redis com a chave: {redis_key}")
-                except redis.RedisError as e:
-                    logger.error(f"Erro ao salvar no Redis: {e}")
+            # Salvar no Redis (gravação agrupada em pipeline pelo RedisBatchWriter)
+            if self.redis_writer:
+                self.redis_writer.set(telemetry_redis_key(substation_id, rover_id), json.dumps(data), LATEST_VALUE_TTL)
 
-            # Salvar no PostgreSQL
+            # Rovers desconhecidos são descartados sem consultar o banco (cache negativo)
+            if rover_cache.get(rover_id) is None:
+                logger.error(f"Rover não encontrado: {rover_id}")
+                return
+
+            # Enfileirar para gravação em lote no PostgreSQL
             db_save_success = self.save_telemetry_to_database(rover_id, data)
             if not db_save_success:
-                logger.error(f"Falha ao salvar telemetria no banco de dados para o rover {rover_id}")
+                logger.error(f"Falha ao enfileirar telemetria para o banco de dados do rover {rover_id}")
                 return
 
             # Preparar dados para WebSocket
-            ws_data = {
-                'battery': float(data.get('battery', 0)),
-                'temperature': float(data.get('temperature', 0)),
-                'speed': float(data.get('speed', 0)),
-                'latitude': float(data.get('location', {}).get('lat', 0)),
-                'longitude': float(data.get('location', {}).get('lng', 0)),
-                'status': data.get('status', 'unknown'),
-                'timestamp': data.get('timestamp')
-            }
+            ws_data = build_telemetry_ws_data(data)
+
+            # Atualizar o snapshot da frota (mesmo lote do RedisBatchWriter, uma versão por lote)
+            if self.redis_writer:
+                self.redis_writer.hset(
+                    FLEET_SNAPSHOT_KEY, rover_id, build_fleet_snapshot_entry(ws_data), version_key=FLEET_VERSION_KEY
+                )
 
             # Enviar via WebSocket
             try:
@@ -240,64 +314,28 @@ class MQTTHandler:
 
     def save_telemetry_to_database(self, rover_id, data):
         """
-        Salva dados de telemetria no PostgreSQL com melhor tratamento de erros
-        e logging detalhado
+        Enfileira a telemetria para gravação em lote no PostgreSQL.
+        A gravação em si é feita pelo TelemetryBatchWriter (ver telemetry_writer.py).
         """
         try:
-            with transaction.atomic():
-                # Buscar o rover com bloqueio para atualização
-                try:
-                    rover = Rover.objects.select_for_update().get(identifier=rover_id)
-                except Rover.DoesNotExist:
-                    logger.error(f"Rover não encontrado: {rover_id}")
-                    return False
-
-                # Criar registro de telemetria com valores padrão para campos nulos
-                telemetry = RoverTelemetry.objects.create(
-                    rover=rover,
-                    battery_level=float(data.get('battery', 0)),
-                    temperature=float(data.get('temperature', 0)),
-                    speed=float(data.get('speed', 0)),
-                    latitude=float(data.get('location', {}).get('lat', 0)),
-                    longitude=float(data.get('location', {}).get('lng', 0)),
-                    status=data.get('status', 'unknown')
-                )
-
-                # Criar registros individuais para cada sensor com validação
-                sensors_data = [
-                    ('battery', data.get('battery', 0), '%'),
-                    ('temperature', data.get('temperature', 0), '°C'),
-                    ('speed', data.get('speed', 0), 'km/h')
-                ]
-
-                sensor_readings = []
-                for sensor_type, value, unit in sensors_data:
-                    try:
-                        value = float(value)
-                        sensor_readings.append(
-                            SensorReading(
-                                rover=rover,
-                                sensor_type=sensor_type,
-                                value=value,
-                                unit=unit
-                            )
-                        )
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Valor de sensor inválido para {sensor_type}: {value}. Erro: {e}")
-
-                if sensor_readings:
-                    SensorReading.objects.bulk_create(sensor_readings)
-
-                logger.info(f"Telemetria salva com sucesso para o rover {rover_id}. ID da Telemetria: {telemetry.id}")
-                return True
-
-        except DatabaseError as e:
-            logger.error(f"Erro no banco de dados ao salvar telemetria para o rover {rover_id}: {e}")
-            return False
+            return self.telemetry_writer.submit(rover_id, data)
         except Exception as e:
-            logger.error(f"Erro inesperado ao salvar telemetria para o rover {rover_id}: {e}")
+            logger.error(f"Erro ao enfileirar telemetria para o rover {rover_id}: {e}")
             return False
 
+    def get_stats(self):
+        """
+        Métricas do pipeline de ingestão
+        """
+        return {
+            'router': self.router.get_stats(),
+            'queues': {name: work_queue.get_stats() for name, work_queue in self.work_queues.items()},
+            'telemetry_writer': self.telemetry_writer.get_stats(),
+            'redis_writer': self.redis_writer.get_stats() if self.redis_writer else None,
+            'image_renditions': self.rendition_pool.get_stats(),
+            'rover_cache': rover_cache.get_stats(),
+        }
+
     def notify_websocket_clients(self, rover_id, event_type, data):
         """
         Método genérico para notificar clientes WebSocket
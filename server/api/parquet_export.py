@@ -0,0 +1,158 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .history import archived_rows, history_pages, telemetry_queryset
+from .models import Rover
+from .sensors import SENSOR_COLUMNS, sensor_queryset
+
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+
+_TIMESTAMP = pa.timestamp('us', tz='UTC')
+_LABEL = pa.dictionary(pa.int32(), pa.string())
+
+# Fontes exportadas: consulta base (como em api.history), colunas lidas
+# (começando por id, timestamp e rover_id, para a paginação e o
+# identificador do rover) e tipos no arquivo
+PARQUET_SOURCES = {
+    'telemetry': (
+        telemetry_queryset,
+        ['id', 'timestamp', 'rover_id', 'battery_level', 'temperature', 'speed', 'latitude', 'longitude', 'status'],
+        pa.schema([
+            ('id', pa.int64()),
+            ('timestamp', _TIMESTAMP),
+            ('rover', _LABEL),
+            ('battery_level', pa.float64()),
+            ('temperature', pa.float64()),
+            ('speed', pa.float64()),
+            ('latitude', pa.float64()),
+            ('longitude', pa.float64()),
+            ('status', _LABEL),
+        ]),
+    ),
+    'sensors': (
+        sensor_queryset,
+        ['id', 'timestamp', 'rover_id', *SENSOR_COLUMNS[2:]],
+        pa.schema([
+            ('id', pa.int64()),
+            ('timestamp', _TIMESTAMP),
+            ('rover', _LABEL),
+            ('sensor_type', _LABEL),
+            ('value', pa.float64()),
+            ('unit', _LABEL),
+        ]),
+    ),
+}
+
+
+def export_queryset(source, start, end, rover=None, substation=None, sensor_type=None):
+    """Linhas de `source` no período [start, end) de um rover ou de todos os rovers de uma subestação."""
+    base_queryset = PARQUET_SOURCES[source][0]
+    queryset = base_queryset(sensor_type).filter(timestamp__gte=start, timestamp__lt=end)
+    if rover is not None:
+        queryset = queryset.filter(rover=rover)
+    if substation is not None:
+        queryset = queryset.filter(rover__substation=substation)
+    return queryset
+
+
+def export_archived(source, start, end, rover=None, substation=None, sensor_type=None):
+    """Linhas de `source` no período já movidas para o arquivo frio (colunas de PARQUET_SOURCES)."""
+    return archived_rows(source, PARQUET_SOURCES[source][1], start, end, sensor_type, rover=rover, substation=substation)
+
+
+class _ChunkSink:
+    """Destino em memória que entrega o que já foi escrito a cada row group (streaming)."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ParquetExport:
+    """
+    Escreve um queryset de PARQUET_SOURCES em Parquet (com as linhas de
+    `archived`, do arquivo frio, intercaladas em ordem), um row group por
+    página de `row_group_size` linhas. A memória usada é a de uma página,
+    qualquer que seja o tamanho do período.
+    """
+
+    def __init__(self, source, queryset, sink, row_group_size=None, archived=()):
+        self.source = source
+        self.queryset = queryset
+        self.row_group_size = row_group_size or settings.PARQUET_ROW_GROUP_SIZE
+        _, self.columns, self.schema = PARQUET_SOURCES[source]
+        self.writer = pq.ParquetWriter(sink, self.schema, compression=settings.PARQUET_COMPRESSION)
+        self.rows = 0
+        self._pages = history_pages(queryset, self.columns, archived, page_size=self.row_group_size)
+        self._rover_identifiers = {}
+
+    def _rover_column(self, rover_pks):
+        missing = set(rover_pks) - self._rover_identifiers.keys()
+        if missing:
+            self._rover_identifiers.update(Rover.objects.filter(pk__in=missing).values_list('pk', 'identifier'))
+        identifiers = self._rover_identifiers
+        return [identifiers[pk] for pk in rover_pks]
+
+    def write_next(self):
+        """Escreve o próximo row group; retorna quantas linhas foram escritas (0 ao terminar)."""
+        rows = next(self._pages, None)
+        if not rows:
+            return 0
+
+        columns = list(zip(*rows))
+        columns[2] = self._rover_column(columns[2])
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        self.rows += len(rows)
+        return len(rows)
+
+    def close(self):
+        self.writer.close()
+
+
+def export_parquet(source, queryset, path, row_group_size=None, archived=()):
+    """Exporta o queryset (e `archived`) para o arquivo Parquet `path`; retorna o número de linhas."""
+    export = ParquetExport(source, queryset, path, row_group_size, archived)
+    try:
+        while export.write_next():
+            pass
+    finally:
+        export.close()
+    return export.rows
+
+
+async def stream_parquet(source, queryset, row_group_size=None, archived=()):
+    """
+    Gerador assíncrono com o arquivo Parquet em partes: cada row group é
+    entregue assim que escrito, e o rodapé (metadados) ao final.
+    """
+    sink = _ChunkSink()
+    export = await sync_to_async(ParquetExport)(source, queryset, sink, row_group_size, archived)
+    write_next = sync_to_async(export.write_next)
+    while await write_next():
+        yield sink.take()
+    export.close()
+    yield sink.take()
@@ -0,0 +1,201 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Tabelas de séries temporais particionadas por faixa de "timestamp" (PostgreSQL)
+PARTITIONED_TABLES = ('api_rovertelemetry', 'api_sensorreading')
+PARTITION_KEY = 'timestamp'
+
+INTERVALS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+# Limites de uma partição de faixa no texto de pg_get_expr, ex.:
+# FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-01-08 00:00:00+00')
+BOUND_PATTERN = r"FROM \('([^']+)'\) TO \('([^']+)'\)"
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def partition_start(value, interval):
+    """Início (UTC, 00:00) da partição que contém `value`; semanas começam na segunda."""
+    value = value.astimezone(dt_timezone.utc)
+    start = datetime(value.year, value.month, value.day, tzinfo=dt_timezone.utc)
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y%m%d}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """
+    Partições de faixa da tabela, ordenadas: [(nome, início, fim)].
+    A partição padrão (DEFAULT) não entra na lista.
+    """
+    # Os limites são convertidos para timestamptz pelo próprio PostgreSQL
+    # (o texto usa o formato do banco, como '+00', e não ISO 8601)
+    cursor.execute(
+        """
+        SELECT relname, bounds[1]::timestamptz, bounds[2]::timestamptz
+        FROM (
+            SELECT c.relname, regexp_match(pg_get_expr(c.relpartbound, c.oid), %s) AS bounds
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+        ) AS partitions
+        WHERE bounds IS NOT NULL
+        ORDER BY 2
+        """,
+        [BOUND_PATTERN, table]
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def _bounds_sql(start, end):
+    return f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def create_partition(cursor, table, start, interval):
+    """
+    Cria a partição [start, start + intervalo). Linhas da mesma faixa que já
+    tenham caído na partição padrão são movidas para a nova partição.
+    Retorna o nome da partição.
+    """
+    end = start + INTERVALS[interval]
+    name = partition_name(table, start)
+    default = default_partition_name(table)
+
+    cursor.execute(
+        f'SELECT 1 FROM "{default}" WHERE "{PARTITION_KEY}" >= %s AND "{PARTITION_KEY}" < %s LIMIT 1',
+        [start, end]
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES {_bounds_sql(start, end)}')
+        return name
+
+    # A faixa já tem linhas na partição padrão: cria a tabela solta, move as
+    # linhas e só então a anexa (ATTACH cria os índices do pai na partição)
+    with transaction.atomic(using=cursor.db.alias):
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE "{PARTITION_KEY}" >= %s AND "{PARTITION_KEY}" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES {_bounds_sql(start, end)}')
+    logger.info(f"Partição {name} criada com linhas movidas de {default}")
+    return name
+
+
+def ensure_partitions(cursor, table, interval, ahead, now=None, since=None):
+    """
+    Garante partições do período de `since` (padrão: agora) até `ahead`
+    intervalos à frente. Períodos que se sobrepõem a partições existentes
+    (por exemplo, depois de trocar de semana para dia) são ignorados.
+    Retorna os nomes das partições criadas.
+    """
+    now = now or datetime.now(tz=dt_timezone.utc)
+    step = INTERVALS[interval]
+    existing = list_partitions(cursor, table)
+
+    created = []
+    start = partition_start(since or now, interval)
+    last = partition_start(now, interval) + step * ahead
+    while start <= last:
+        end = start + step
+        if not any(start < existing_end and existing_start < end for _, existing_start, existing_end in existing):
+            created.append(create_partition(cursor, table, start, interval))
+        start = end
+    return created
+
+
+def drop_partitions_before(cursor, table, cutoff, dry_run=False):
+    """
+    Remove as partições cujo fim é anterior ou igual a `cutoff` (retenção).
+    Um DROP TABLE por partição substitui DELETEs linha a linha.
+    """
+    dropped = []
+    for name, _, end in list_partitions(cursor, table):
+        if end <= cutoff:
+            if not dry_run:
+                cursor.execute(f'DROP TABLE "{name}"')
+            dropped.append(name)
+
+    # Linhas antigas que tenham caído na partição padrão (normalmente poucas)
+    if not dry_run:
+        cursor.execute(f'DELETE FROM "{default_partition_name(table)}" WHERE "{PARTITION_KEY}" < %s', [cutoff])
+    return dropped
+
+
+def partition_table(cursor, table, interval, ahead):
+    """
+    Converte uma tabela comum em tabela particionada por faixa de timestamp,
+    mantendo nome, colunas, índices e chaves estrangeiras, para que o ORM
+    continue funcionando sem alterações.
+
+    A chave primária passa a ser (id, timestamp), exigência do PostgreSQL
+    para tabelas particionadas; o id continua vindo de uma sequência.
+    """
+    if is_partitioned(cursor, table):
+        return
+
+    legacy = f'{table}_legacy'
+    sequence = f'{table}_id_seq'
+
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f'{table}_pkey']
+    )
+    index_definitions = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(f'SELECT MIN("{PARTITION_KEY}") FROM "{table}"')
+    oldest = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{table}_pkey" TO "{legacy}_pkey"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("{PARTITION_KEY}")'
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id, "{PARTITION_KEY}")')
+    cursor.execute(f'CREATE TABLE "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT')
+    ensure_partitions(cursor, table, interval, ahead, since=oldest)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    # Remove a tabela antiga junto com seus índices e a sequência de identidade
+    cursor.execute(f'DROP TABLE "{legacy}"')
+
+    for definition in index_definitions:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+    cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}".id')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(\'"{sequence}"\')')
+    cursor.execute(f'SELECT setval(\'"{sequence}"\', COALESCE(MAX(id), 0) + 1, false) FROM "{table}"')
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def bump_version(pipe, key):
+    """
+    Enfileira no pipeline o incremento do contador de versão `key`. Se o Redis
+    perdeu a chave, ela recomeça de um valor baseado no relógio, e não de 1,
+    para que versões (ETags) já entregues aos clientes não se repitam.
+    """
+    pipe.set(key, time.time_ns() // 1000, nx=True)
+    pipe.incr(key)
+
+
+class RedisBatchWriter:
+    """
+    Agrupa as gravações de "último valor" no Redis.
+
+    Cada set() apenas substitui o valor pendente da chave em memória (o mais
+    recente vence); a cada `interval_ms` uma thread grava todas as chaves
+    pendentes com um único pipeline de `SET ... EX`, em vez de um round trip
+    por mensagem. hset() faz o mesmo com campos de hashes e, opcionalmente,
+    incrementa uma vez por lote um contador de versão do hash.
+    """
+
+    def __init__(self, redis_client, interval_ms=None, max_pending=None):
+        self.redis_client = redis_client
+        self.interval = (interval_ms or settings.REDIS_BATCH_INTERVAL_MS) / 1000.0
+        self.max_pending = max_pending or settings.REDIS_BATCH_MAX_PENDING
+
+        self._pending = {}
+        self._pending_fields = {}
+        self._pending_versions = set()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        self._stats = {
+            'sets': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'keys_written': 0,
+            'errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='redis-batch-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def set(self, key, value, ttl):
+        """Agenda a gravação de `key`; substitui qualquer valor ainda não gravado."""
+        with self._cond:
+            if key in self._pending:
+                self._stats['coalesced'] += 1
+            self._pending[key] = (value, ttl)
+            self._stats['sets'] += 1
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def hset(self, key, field, value, version_key=None):
+        """
+        Agenda a gravação do campo `field` do hash `key` (o valor mais recente
+        vence). Se `version_key` for dado, ele é incrementado no mesmo lote.
+        """
+        with self._cond:
+            if (key, field) in self._pending_fields:
+                self._stats['coalesced'] += 1
+            self._pending_fields[(key, field)] = value
+            if version_key:
+                self._pending_versions.add(version_key)
+            self._stats['sets'] += 1
+            if len(self._pending) + len(self._pending_fields) >= self.max_pending:
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            pending, fields, versions = self._pending, self._pending_fields, self._pending_versions
+            self._pending, self._pending_fields, self._pending_versions = {}, {}, set()
+        if pending or fields:
+            self._write(pending, fields, versions)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending) + len(self._pending_fields)
+        total_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total_ms / stats['flushes'], 3) if stats['flushes'] else 0.0
+        stats['interval_ms'] = int(self.interval * 1000)
+        return stats
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: not self._running or len(self._pending) + len(self._pending_fields) >= self.max_pending,
+                    self.interval
+                )
+                if not self._running:
+                    return
+            self.flush()
+
+    def _write(self, pending, fields=None, versions=()):
+        fields = fields or {}
+        written = len(pending) + len(fields)
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, (value, ttl) in pending.items():
+                    pipe.set(key, value, ex=ttl)
+                for (key, field), value in fields.items():
+                    pipe.hset(key, field, value)
+                # A versão só avança depois dos campos do lote, no mesmo pipeline
+                for version_key in versions:
+                    bump_version(pipe, version_key)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.error(f"Erro ao gravar lote de {written} chaves no Redis: {e}")
+                with self._cond:
+                    self._stats['errors'] += 1
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self._stats['flushes'] += 1
+            self._stats['keys_written'] += written
+            self._stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], round(elapsed_ms, 3))
+            self._stats['total_flush_ms'] += elapsed_ms
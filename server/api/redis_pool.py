@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+class PoolMetrics:
+    """Contadores de uso de um pool de conexões (ver pool_stats)."""
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'checkouts': 0, 'peak_in_use': 0, 'errors': 0}
+        # O próprio redis-py devolve ao pool conexões que falharam ao conectar, sem entregá-las
+        self._in_use = set()
+
+    def created(self):
+        with self._lock:
+            self._stats['created'] += 1
+
+    def acquired(self, connection):
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._in_use.add(id(connection))
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], len(self._in_use))
+
+    def released(self, connection):
+        with self._lock:
+            self._in_use.discard(id(connection))
+
+    def failed(self):
+        with self._lock:
+            self._stats['errors'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_use'] = len(self._in_use)
+        stats['max_connections'] = self.max_connections
+        return stats
+
+
+class MeteredConnectionPool(redis.BlockingConnectionPool):
+    """
+    Pool com no máximo `max_connections` conexões: quando todas estão em uso,
+    a requisição espera até `timeout` segundos por uma conexão livre, em vez
+    de abrir conexões sem limite. Esperas esgotadas e falhas ao conectar
+    contam em 'errors'.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = PoolMetrics(self.max_connections)
+
+    def make_connection(self):
+        self.metrics.created()
+        return super().make_connection()
+
+    def get_connection(self, *args, **kwargs):
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.metrics.failed()
+            raise
+        self.metrics.acquired(connection)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        self.metrics.released(connection)
+
+
+class MeteredAsyncConnectionPool(aioredis.BlockingConnectionPool):
+    """Versão asyncio do MeteredConnectionPool."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = PoolMetrics(self.max_connections)
+
+    def make_connection(self):
+        self.metrics.created()
+        return super().make_connection()
+
+    async def get_connection(self, *args, **kwargs):
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.metrics.failed()
+            raise
+        self.metrics.acquired(connection)
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        self.metrics.released(connection)
+
+
+def _pool_options(binary):
+    return {
+        'host': settings.REDIS_HOST,
+        'port': settings.REDIS_PORT,
+        'db': settings.REDIS_DB,
+        'max_connections': settings.REDIS_POOL_MAX_CONNECTIONS,
+        'timeout': settings.REDIS_POOL_TIMEOUT,
+        'socket_connect_timeout': settings.REDIS_CONNECT_TIMEOUT,
+        # Texto (JSON) por padrão; bytes para imagens e demais valores binários
+        'decode_responses': not binary,
+    }
+
+
+_lock = threading.Lock()
+# Um cliente por pool: criar um redis.Redis custa tanto quanto um GET, e os
+# clientes podem ser compartilhados entre threads (sync) ou tarefas (asyncio)
+_clients = {}
+# Conexões asyncio pertencem ao event loop em que foram abertas: um pool por loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis(binary=False):
+    """
+    Cliente Redis (db REDIS_DB) do pool compartilhado do processo. Com
+    binary=True, devolve bytes em vez de str (JPEGs e afins).
+    """
+    with _lock:
+        if binary not in _clients:
+            _clients[binary] = redis.Redis(connection_pool=MeteredConnectionPool(**_pool_options(binary)))
+        return _clients[binary]
+
+
+def get_async_redis(binary=False):
+    """Cliente redis.asyncio do pool compartilhado do event loop em execução."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if binary not in clients:
+            clients[binary] = aioredis.Redis(connection_pool=MeteredAsyncConnectionPool(**_pool_options(binary)))
+        return clients[binary]
+
+
+async def close_async_pools():
+    """Fecha as conexões dos pools asyncio do event loop em execução (fim do serviço)."""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.connection_pool.disconnect()
+
+
+def pool_stats():
+    """Uso dos pools deste processo: {'sync', 'sync_binary', 'async', 'async_binary'}."""
+    with _lock:
+        clients = [(('sync_binary' if binary else 'sync'), client) for binary, client in _clients.items()]
+        for loop_clients in _async_clients.values():
+            clients.extend((('async_binary' if binary else 'async'), client) for binary, client in loop_clients.items())
+
+    stats = {}
+    for name, client in clients:
+        current = client.connection_pool.metrics.get_stats()
+        if name in stats:
+            # Pools asyncio de vários event loops são somados
+            current = {key: stats[name][key] + value for key, value in current.items()}
+        stats[name] = current
+    return stats
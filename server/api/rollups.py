@@ -0,0 +1,332 @@
+import logging
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from .archive import archived_between
+from .history import archive_table
+from .models import RoverTelemetry, SensorReading, SensorRollup
+from .sensors import CORE_SENSORS, core_sensor_names, sensor_queryset
+
+logger = logging.getLogger(__name__)
+
+# Resoluções da mais fina para a mais grossa: (nome, duração do intervalo, unidade do date_trunc).
+# Cada nível é calculado a partir do anterior; o primeiro, das leituras brutas.
+RESOLUTIONS = [
+    ('1m', timedelta(minutes=1), 'minute'),
+    ('1h', timedelta(hours=1), 'hour'),
+]
+RESOLUTION_STEPS = {name: step for name, step, _ in RESOLUTIONS}
+RAW = 'raw'
+
+# Tamanho de cada transação ao recalcular períodos longos
+CHUNK = timedelta(days=1)
+
+ROLLUP_FIELDS = ['min_value', 'max_value', 'sum_value', 'count', 'last_value', 'last_timestamp']
+
+_UPSERT_SQL = """
+    INSERT INTO api_sensorrollup
+        (rover_id, sensor_type, resolution, bucket, min_value, max_value, sum_value, count, last_value, last_timestamp)
+    {select}
+    ON CONFLICT (rover_id, sensor_type, resolution, bucket) DO UPDATE SET
+        min_value = EXCLUDED.min_value,
+        max_value = EXCLUDED.max_value,
+        sum_value = EXCLUDED.sum_value,
+        count = EXCLUDED.count,
+        last_value = EXCLUDED.last_value,
+        last_timestamp = EXCLUDED.last_timestamp
+"""
+
+_FROM_RAW_SQL = """
+    SELECT rover_id, sensor_type, %(resolution)s, date_trunc(%(unit)s, "timestamp") AS bucket,
+           MIN(value), MAX(value), SUM(value), COUNT(*),
+           (array_agg(value ORDER BY "timestamp" DESC))[1], MAX("timestamp")
+    FROM ({readings}) AS readings
+    GROUP BY rover_id, sensor_type, bucket
+"""
+
+# Leituras brutas: sensores do núcleo desdobrados das colunas de RoverTelemetry
+# (uma linha por sensor) e sensores extras de SensorReading
+_CORE_READINGS_SQL = """
+    SELECT t.rover_id, s.sensor_type, t."timestamp", s.value
+    FROM api_rovertelemetry t
+    CROSS JOIN LATERAL (VALUES {values}) AS s(sensor_type, value)
+    WHERE t."timestamp" >= %(start)s AND t."timestamp" < %(end)s AND s.value IS NOT NULL
+"""
+
+_EXTRA_READINGS_SQL = """
+    SELECT rover_id, sensor_type, "timestamp", value
+    FROM api_sensorreading
+    WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s AND NOT (sensor_type = ANY(%(core)s))
+"""
+
+
+def _raw_readings_sql():
+    """SQL das leituras brutas e os nomes dos sensores do núcleo como parâmetros (%(sensor_N)s)."""
+    if not CORE_SENSORS:
+        return _EXTRA_READINGS_SQL, {}
+    # Só as colunas (validadas contra RoverTelemetry) entram no texto; os nomes vão como parâmetros
+    values = ', '.join(f"(%(sensor_{i})s, t.\"{sensor.column}\")" for i, sensor in enumerate(CORE_SENSORS))
+    params = {f'sensor_{i}': sensor.name for i, sensor in enumerate(CORE_SENSORS)}
+    return _CORE_READINGS_SQL.format(values=values) + ' UNION ALL ' + _EXTRA_READINGS_SQL, params
+
+_FROM_ROLLUP_SQL = """
+    SELECT rover_id, sensor_type, %s, date_trunc(%s, bucket) AS coarse_bucket,
+           MIN(min_value), MAX(max_value), SUM(sum_value), SUM(count),
+           (array_agg(last_value ORDER BY last_timestamp DESC))[1], MAX(last_timestamp)
+    FROM api_sensorrollup
+    WHERE resolution = %s AND bucket >= %s AND bucket < %s
+    GROUP BY rover_id, sensor_type, coarse_bucket
+"""
+
+
+def truncate(value, step):
+    """Início do intervalo de tamanho `step` que contém `value` (em UTC)."""
+    epoch = value.timestamp()
+    seconds = step.total_seconds()
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def ceil(value, step):
+    """Fim do intervalo de tamanho `step` que contém `value` (o próprio value se já alinhado)."""
+    start = truncate(value, step)
+    return start if start == value else start + step
+
+
+def _refresh_level_postgres(cursor, index, start, end):
+    name, _, unit = RESOLUTIONS[index]
+    if index == 0:
+        readings, params = _raw_readings_sql()
+        select = _FROM_RAW_SQL.format(readings=readings)
+        params.update({'resolution': name, 'unit': unit, 'start': start, 'end': end, 'core': core_sensor_names()})
+    else:
+        select, params = _FROM_ROLLUP_SQL, [name, unit, RESOLUTIONS[index - 1][0], start, end]
+    cursor.execute(_UPSERT_SQL.format(select=select), params)
+    return cursor.rowcount
+
+
+def _raw_readings(start, end):
+    """(rover_id, sensor_type, timestamp, valor) das leituras brutas em [start, end), como em _raw_readings_sql()."""
+    columns = [sensor.column for sensor in CORE_SENSORS]
+    telemetry = RoverTelemetry.objects.filter(timestamp__gte=start, timestamp__lt=end).values_list(
+        'rover_id', 'timestamp', *columns
+    )
+    for rover, ts, *values in telemetry.iterator():
+        for sensor, value in zip(CORE_SENSORS, values):
+            if value is not None:
+                yield rover, sensor.name, ts, value
+    yield from SensorReading.objects.filter(timestamp__gte=start, timestamp__lt=end).exclude(
+        sensor_type__in=core_sensor_names()
+    ).values_list('rover_id', 'sensor_type', 'timestamp', 'value').iterator()
+
+
+def _refresh_level_python(index, start, end):
+    # Caminho portátil (ex.: SQLite em desenvolvimento): agrega em Python
+    name, step, _ = RESOLUTIONS[index]
+    if index == 0:
+        rows = ((rover, sensor, ts, value, value, value, 1, value, ts) for rover, sensor, ts, value in _raw_readings(start, end))
+    else:
+        rows = SensorRollup.objects.filter(
+            resolution=RESOLUTIONS[index - 1][0], bucket__gte=start, bucket__lt=end
+        ).order_by('rover_id', 'sensor_type', 'bucket').values_list(
+            'rover_id', 'sensor_type', 'bucket', 'min_value', 'max_value', 'sum_value', 'count', 'last_value', 'last_timestamp'
+        )
+
+    aggregates = {}
+    for rover, sensor, ts, low, high, total, count, last, last_ts in rows:
+        key = (rover, sensor, truncate(ts, step))
+        current = aggregates.get(key)
+        if current is None:
+            aggregates[key] = [low, high, total, count, last, last_ts]
+            continue
+        current[0] = min(current[0], low)
+        current[1] = max(current[1], high)
+        current[2] += total
+        current[3] += count
+        if last_ts >= current[5]:
+            current[4], current[5] = last, last_ts
+
+    SensorRollup.objects.bulk_create(
+        [
+            SensorRollup(rover_id=rover, sensor_type=sensor, resolution=name, bucket=bucket,
+                         **dict(zip(ROLLUP_FIELDS, values)))
+            for (rover, sensor, bucket), values in aggregates.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['rover', 'sensor_type', 'resolution', 'bucket'],
+        update_fields=ROLLUP_FIELDS,
+    )
+    return len(aggregates)
+
+
+def refresh_rollups(start, end, rebuild=False):
+    """
+    Recalcula os agregados de [start, end), em transações de até um dia.
+    Cada nível recalcula por inteiro os seus intervalos que tocam o período:
+    o de 1 minuto a partir das leituras brutas e os demais a partir do nível
+    anterior, de modo que uma atualização incremental não relê uma hora
+    inteira de dados brutos. Com `rebuild`, os agregados existentes são
+    apagados antes (ex.: após correção ou remoção de dados brutos).
+    Retorna {resolução: intervalos gravados}.
+    """
+    start = truncate(start, RESOLUTIONS[0][1])
+    end = ceil(end, RESOLUTIONS[0][1])
+    use_sql = connection.vendor == 'postgresql'
+
+    written = {name: 0 for name, _, _ in RESOLUTIONS}
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + CHUNK, end)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for index, (name, step, _) in enumerate(RESOLUTIONS):
+                level_start, level_end = truncate(chunk_start, step), ceil(chunk_end, step)
+                if rebuild:
+                    SensorRollup.objects.filter(
+                        resolution=name, bucket__gte=level_start, bucket__lt=level_end
+                    ).delete()
+                if use_sql:
+                    written[name] += _refresh_level_postgres(cursor, index, level_start, level_end)
+                else:
+                    written[name] += _refresh_level_python(index, level_start, level_end)
+        chunk_start = chunk_end
+    return written
+
+
+def update_rollups(now=None):
+    """
+    Atualização incremental: recalcula do último intervalo de 1 minuto já
+    agregado (menos uma margem para dados atrasados) até agora. Na primeira
+    execução, parte da telemetria ou leitura bruta mais antiga.
+    """
+    now = now or timezone.now()
+    latest = SensorRollup.objects.filter(resolution=RESOLUTIONS[0][0]).aggregate(Max('bucket'))['bucket__max']
+    if latest is None:
+        oldest = [
+            model.objects.aggregate(Min('timestamp'))['timestamp__min'] for model in (RoverTelemetry, SensorReading)
+        ]
+        oldest = [value for value in oldest if value is not None]
+        if not oldest:
+            return {}
+        start = min(oldest)
+    else:
+        start = latest - timedelta(seconds=settings.ROLLUP_LATE_DATA_SECONDS)
+    return refresh_rollups(start, now)
+
+
+def bucket_count(start, end, step):
+    """Número de intervalos de tamanho `step` (alinhados em UTC) que tocam [start, end)."""
+    return round((ceil(end, step) - truncate(start, step)) / step)
+
+
+def resolution_step(resolution):
+    """Tamanho do intervalo de uma resolução: um nível de RESOLUTIONS ou 'Nh' (N horas, ver choose_resolution)."""
+    if resolution in RESOLUTION_STEPS:
+        return RESOLUTION_STEPS[resolution]
+    return timedelta(hours=int(resolution[:-1]))
+
+
+def choose_resolution(start, end, max_points, raw_points=None):
+    """
+    Escolhe a resolução mais fina cujo número de pontos no período cabe em
+    `max_points`, ou seja, a mais grossa necessária para o orçamento. As
+    leituras brutas só são usadas se `raw_points` (quantidade no período)
+    couber no orçamento. Se nem 1 hora couber, devolve 'Nh': os agregados de
+    1 hora reagrupados em intervalos de N horas (ver query_series).
+    """
+    if raw_points is not None and raw_points <= max_points:
+        return RAW
+    for name, step, _ in RESOLUTIONS:
+        if bucket_count(start, end, step) <= max_points:
+            return name
+    hour = RESOLUTIONS[-1][1]
+    hours = max(2, math.ceil((end - start) / hour / max_points))
+    # O alinhamento dos intervalos pode somar um ponto ao período
+    while bucket_count(start, end, hour * hours) > max_points:
+        hours += 1
+    return f'{hours}h'
+
+
+def _merge_rollups(rollups, step):
+    """Reagrupa agregados (em ordem de bucket) em intervalos de tamanho `step`."""
+    merged = []
+    for rollup in rollups:
+        bucket = truncate(rollup.bucket, step)
+        if merged and merged[-1]['bucket'] == bucket:
+            current = merged[-1]
+            current['min'] = min(current['min'], rollup.min_value)
+            current['max'] = max(current['max'], rollup.max_value)
+            current['sum'] += rollup.sum_value
+            current['count'] += rollup.count
+            if rollup.last_timestamp >= current['last_timestamp']:
+                current['last'], current['last_timestamp'] = rollup.last_value, rollup.last_timestamp
+            continue
+        merged.append({
+            'bucket': bucket,
+            'min': rollup.min_value,
+            'max': rollup.max_value,
+            'sum': rollup.sum_value,
+            'count': rollup.count,
+            'last': rollup.last_value,
+            'last_timestamp': rollup.last_timestamp,
+        })
+    return [
+        {
+            'timestamp': point['bucket'].isoformat(),
+            'min': point['min'],
+            'max': point['max'],
+            'avg': point['sum'] / point['count'] if point['count'] else None,
+            'count': point['count'],
+            'last': point['last'],
+        }
+        for point in merged
+    ]
+
+
+def query_series(rover, sensor_type, start, end, max_points):
+    """
+    Série de um sensor no período, na resolução escolhida por choose_resolution().
+    Retorna (resolução, [{'timestamp', 'min', 'max', 'avg', 'count', 'last'}]).
+    """
+    raw = sensor_queryset(sensor_type).filter(rover=rover, timestamp__gte=start, timestamp__lt=end)
+
+    raw_points = None
+    if (end - start) / RESOLUTIONS[0][1] <= max_points and not archived_between(
+        start, end, rover, archive_table('sensors', sensor_type)
+    ):
+        # Período curto: vale contar as leituras brutas (contagem limitada ao orçamento).
+        # Dias no arquivo frio não têm leituras no banco e usam os agregados.
+        raw_points = raw.order_by()[:max_points + 1].count()
+
+    resolution = choose_resolution(start, end, max_points, raw_points)
+    if resolution == RAW:
+        points = [
+            {'timestamp': ts.isoformat(), 'min': value, 'max': value, 'avg': value, 'count': 1, 'last': value}
+            for ts, value in raw.order_by('timestamp').values_list('timestamp', 'value')
+        ]
+        return resolution, points
+
+    step = resolution_step(resolution)
+    # Resoluções de N horas são lidas dos agregados de 1 hora
+    level = resolution if resolution in RESOLUTION_STEPS else RESOLUTIONS[-1][0]
+    rollups = SensorRollup.objects.filter(
+        rover=rover, sensor_type=sensor_type, resolution=level,
+        bucket__gte=truncate(start, step), bucket__lt=end
+    ).order_by('bucket')
+    if level != resolution:
+        return resolution, _merge_rollups(rollups.iterator(), step)
+    points = [
+        {
+            'timestamp': rollup.bucket.isoformat(),
+            'min': rollup.min_value,
+            'max': rollup.max_value,
+            'avg': rollup.avg_value,
+            'count': rollup.count,
+            'last': rollup.last_value,
+        }
+        for rollup in rollups
+    ]
+    return resolution, points
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from .models import Rover
+
+logger = logging.getLogger(__name__)
+
+CachedRover = namedtuple('CachedRover', ['pk', 'substation_pk', 'is_active', 'substation_identifier'])
+
+# Sentinela para "não está em memória, é preciso consultar o banco"
+UNKNOWN = object()
+
+
+class RoverCache:
+    """
+    Cache em memória identifier -> (pk, substation pk, is_active, identifier
+    da subestação) dos rovers.
+
+    Aquecido na inicialização e invalidado pelos sinais post_save/post_delete
+    de Rover e Substation (ver signals.py), de forma que o caminho de ingestão
+    não faça nenhuma consulta ao banco para resolver rovers conhecidos.
+    Identificadores desconhecidos ficam em cache negativo por
+    ROVER_CACHE_NEGATIVE_TTL segundos. O cache inteiro é recarregado a cada
+    ROVER_CACHE_REFRESH_INTERVAL segundos para captar alterações feitas
+    em outros processos.
+    """
+
+    def __init__(self, negative_ttl=None, refresh_interval=None):
+        self.negative_ttl = settings.ROVER_CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self.refresh_interval = settings.ROVER_CACHE_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+
+        self._lock = threading.Lock()
+        self._rovers = {}
+        self._missing = {}
+        self._warmed_at = None
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'lookups': 0, 'warmups': 0}
+
+    def warm(self):
+        """Carrega todos os rovers do banco em uma única consulta."""
+        try:
+            rows = Rover.objects.values_list('identifier', 'pk', 'substation_id', 'is_active', 'substation__identifier')
+            rovers = {
+                identifier: CachedRover(pk, substation_pk, is_active, substation_identifier)
+                for identifier, pk, substation_pk, is_active, substation_identifier in rows
+            }
+        except DatabaseError as e:
+            logger.error(f"Erro ao carregar cache de rovers: {e}")
+            # Mantém o conteúdo anterior e só tenta de novo no próximo intervalo
+            with self._lock:
+                self._warmed_at = time.monotonic()
+            return False
+
+        with self._lock:
+            self._rovers = rovers
+            self._missing = {}
+            self._warmed_at = time.monotonic()
+            self._stats['warmups'] += 1
+        logger.info(f"Cache de rovers carregado com {len(rovers)} rovers")
+        return True
+
+    def get(self, identifier):
+        """
+        Retorna o CachedRover do identificador ou None se o rover não existir.
+        """
+        if self._needs_refresh():
+            self.warm()
+
+        cached = self.get_cached(identifier)
+        if cached is not UNKNOWN:
+            return cached
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return self._lookup(identifier)
+
+    async def aget(self, identifier):
+        """
+        Versão para o event loop: só vai ao banco quando necessário. A consulta
+        roda na thread do ORM assíncrono (thread_sensitive), cuja conexão o
+        Django fecha ao fim da requisição; threads avulsas deixariam conexões
+        abertas.
+        """
+        cached = self.get_cached(identifier)
+        if cached is not UNKNOWN:
+            return cached
+        return await sync_to_async(self.get, thread_sensitive=True)(identifier)
+
+    def get_cached(self, identifier):
+        """
+        Consulta apenas a memória: retorna o CachedRover, None (cache negativo)
+        ou UNKNOWN quando é preciso consultar o banco.
+        """
+        if self._needs_refresh():
+            return UNKNOWN
+
+        with self._lock:
+            cached = self._rovers.get(identifier)
+            if cached is not None:
+                self._stats['hits'] += 1
+                return cached
+            expires_at = self._missing.get(identifier)
+            if expires_at is not None and expires_at > time.monotonic():
+                self._stats['negative_hits'] += 1
+                return None
+        return UNKNOWN
+
+    def get_many(self, identifiers):
+        """Resolve vários identificadores; os desconhecidos ficam fora do dicionário."""
+        resolved = {}
+        for identifier in identifiers:
+            cached = self.get(identifier)
+            if cached is not None:
+                resolved[identifier] = cached
+        return resolved
+
+    def invalidate_rover(self, identifier=None, pk=None):
+        """Remove um rover do cache (pelo identificador e/ou pk)."""
+        with self._lock:
+            if identifier is not None:
+                self._rovers.pop(identifier, None)
+                self._missing.pop(identifier, None)
+            if pk is not None:
+                for key in [key for key, cached in self._rovers.items() if cached.pk == pk]:
+                    del self._rovers[key]
+
+    def invalidate_substation(self, substation_pk):
+        """Remove do cache todos os rovers de uma subestação."""
+        with self._lock:
+            for key in [key for key, cached in self._rovers.items() if cached.substation_pk == substation_pk]:
+                del self._rovers[key]
+
+    def clear(self):
+        with self._lock:
+            self._rovers = {}
+            self._missing = {}
+            self._warmed_at = None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._rovers)
+            stats['negative_size'] = len(self._missing)
+        return stats
+
+    def _needs_refresh(self):
+        if self._warmed_at is None:
+            return True
+        return bool(self.refresh_interval) and time.monotonic() - self._warmed_at > self.refresh_interval
+
+    def _lookup(self, identifier):
+        """Consulta um único rover no banco (apenas para identificadores fora do cache)."""
+        with self._lock:
+            self._stats['lookups'] += 1
+        try:
+            row = Rover.objects.filter(identifier=identifier).values_list(
+                'pk', 'substation_id', 'is_active', 'substation__identifier'
+            ).first()
+        except DatabaseError as e:
+            logger.error(f"Erro ao buscar rover {identifier} no banco: {e}")
+            return None
+
+        with self._lock:
+            if row is None:
+                self._missing[identifier] = time.monotonic() + self.negative_ttl
+                return None
+            cached = CachedRover(*row)
+            self._rovers[identifier] = cached
+            return cached
+
+
+rover_cache = RoverCache()
@@ -0,0 +1,117 @@
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.db.models import F, CharField, Value
+from .models import RoverTelemetry, SensorReading
+
+logger = logging.getLogger(__name__)
+
+# Colunas das leituras de sensores, qualquer que seja a tabela de origem
+SENSOR_COLUMNS = ['id', 'timestamp', 'sensor_type', 'value', 'unit']
+
+
+class Sensor:
+    """
+    Entrada do registro de sensores (settings.TELEMETRY_SENSORS).
+
+    Sensores com `column` são do núcleo: gravados só nessa coluna de
+    RoverTelemetry. Os demais são gravados em SensorReading, no máximo uma
+    leitura a cada `sample_seconds` por rover (0 grava todas).
+    """
+    __slots__ = ('name', 'unit', 'column', 'sample_seconds')
+
+    def __init__(self, name, unit='', column=None, sample_seconds=0):
+        self.name = name
+        self.unit = unit
+        self.column = column
+        self.sample_seconds = sample_seconds
+
+    @property
+    def is_core(self):
+        return self.column is not None
+
+
+# Nomes de sensores: campo do payload e sensor_type gravado no banco
+SENSOR_NAME_RE = re.compile(r'^[a-z0-9_]+$')
+
+
+def load_registry(config):
+    registry = {}
+    for name, options in config.items():
+        if not SENSOR_NAME_RE.fullmatch(name):
+            raise ValueError(f"Nome de sensor inválido (use letras minúsculas, dígitos e _): {name!r}")
+        column = options.get('column')
+        if column is not None and column not in {field.name for field in RoverTelemetry._meta.fields}:
+            raise ValueError(f"Coluna inexistente em RoverTelemetry para o sensor {name}: {column}")
+        registry[name] = Sensor(name, options.get('unit', ''), column, float(options.get('sample_seconds', 0)))
+    return registry
+
+
+SENSORS = load_registry(settings.TELEMETRY_SENSORS)
+CORE_SENSORS = [sensor for sensor in SENSORS.values() if sensor.is_core]
+EXTRA_SENSORS = [sensor for sensor in SENSORS.values() if not sensor.is_core]
+
+
+def core_sensor_names():
+    return [sensor.name for sensor in CORE_SENSORS]
+
+
+class SensorSampler:
+    """
+    Decide quais leituras dos sensores extras são gravadas, respeitando o
+    `sample_seconds` de cada um por rover. O estado é do processo: com vários
+    workers de ingestão, cada um amostra as mensagens que recebe.
+    """
+
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def extra_readings(self, rover_pk, data, timestamp):
+        """[(sensor_type, valor, unidade)] dos sensores extras presentes em `data` a gravar agora."""
+        readings = []
+        for sensor in EXTRA_SENSORS:
+            value = data.get(sensor.name)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Valor de sensor inválido para {sensor.name}: {value}. Erro: {e}")
+                continue
+            if sensor.sample_seconds and not self._due(rover_pk, sensor, timestamp):
+                continue
+            readings.append((sensor.name, value, sensor.unit))
+        return readings
+
+    def _due(self, rover_pk, sensor, timestamp):
+        key = (rover_pk, sensor.name)
+        with self._lock:
+            last = self._last.get(key)
+            # Leituras fora de ordem (mais antigas que a última gravada) são mantidas
+            if last is not None and last <= timestamp and (timestamp - last).total_seconds() < sensor.sample_seconds:
+                return False
+            if last is None or timestamp > last:
+                self._last[key] = timestamp
+            return True
+
+
+def sensor_queryset(sensor_type=None):
+    """
+    Leituras de um sensor com as colunas SENSOR_COLUMNS (mais rover_id):
+    sensores do núcleo vêm da coluna de RoverTelemetry; os extras, de
+    SensorReading. Sem `sensor_type`, todas as leituras de sensores extras.
+    Leituras antigas de sensores do núcleo em SensorReading são ignoradas.
+    """
+    sensor = SENSORS.get(sensor_type)
+    if sensor is not None and sensor.is_core:
+        return RoverTelemetry.objects.filter(**{f'{sensor.column}__isnull': False}).annotate(
+            sensor_type=Value(sensor.name, output_field=CharField()),
+            value=F(sensor.column),
+            unit=Value(sensor.unit, output_field=CharField()),
+        )
+    if sensor_type:
+        return SensorReading.objects.filter(sensor_type=sensor_type)
+    return SensorReading.objects.exclude(sensor_type__in=core_sensor_names())
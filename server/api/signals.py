@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .fleet import bump_fleet_version
+from .models import Rover, Substation
+from .rover_cache import rover_cache
+
+
+@receiver(post_save, sender=Rover)
+@receiver(post_delete, sender=Rover)
+def invalidate_rover_cache(sender, instance, **kwargs):
+    # Invalidar também pelo pk, caso o identifier tenha sido alterado
+    rover_cache.invalidate_rover(identifier=instance.identifier, pk=instance.pk)
+
+
+@receiver(post_save, sender=Substation)
+@receiver(post_delete, sender=Substation)
+def invalidate_substation_rovers(sender, instance, **kwargs):
+    rover_cache.invalidate_substation(instance.pk)
+
+
+@receiver(post_save, sender=Rover)
+@receiver(post_delete, sender=Rover)
+@receiver(post_save, sender=Substation)
+@receiver(post_delete, sender=Substation)
+def invalidate_fleet_snapshot(sender, instance, **kwargs):
+    # Nome, subestação ou is_active alterados mudam o snapshot da frota
+    bump_fleet_version()
@@ -0,0 +1,246 @@
+import base64
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from .codecs import decode_telemetry_struct, decode_telemetry_msgpack
+from .latest_state import ON_CONFLICT_SQL, STATE_COLUMNS
+from .models import Rover
+from .sensors import SensorSampler
+from .telemetry_writer import TELEMETRY_FIELDS, telemetry_values
+from .topic_router import TopicRouter
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_COLUMNS = ['rover_id', 'timestamp', *TELEMETRY_FIELDS]
+SENSOR_COLUMNS = ['rover_id', 'timestamp', 'sensor_type', 'value', 'unit']
+
+# Tabelas temporárias da sessão, só com as colunas carregadas (sem o id,
+# para não consumir a sequência); esvaziadas a cada commit (um por bloco)
+_STAGE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_telemetry_stage ON COMMIT DELETE ROWS
+        AS SELECT {telemetry_columns} FROM api_rovertelemetry WITH NO DATA;
+    CREATE TEMP TABLE IF NOT EXISTS import_sensor_stage ON COMMIT DELETE ROWS
+        AS SELECT {sensor_columns} FROM api_sensorreading WITH NO DATA;
+"""
+
+# Insere só as mensagens cujo (rover, timestamp) ainda não existe e, junto,
+# as leituras de sensores dessas mensagens e o último estado de cada rover
+_MERGE_SQL = """
+    WITH inserted AS (
+        INSERT INTO api_rovertelemetry ({telemetry_columns})
+        SELECT DISTINCT ON (s.rover_id, s."timestamp") {staged_telemetry_columns}
+        FROM import_telemetry_stage s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM api_rovertelemetry t
+            WHERE t.rover_id = s.rover_id AND t."timestamp" = s."timestamp"
+        )
+        ORDER BY s.rover_id, s."timestamp"
+        RETURNING rover_id, {state_columns}
+    ), latest AS (
+        INSERT INTO api_roverlateststate (rover_id, {state_columns})
+        SELECT DISTINCT ON (rover_id) rover_id, {state_columns}
+        FROM inserted
+        ORDER BY rover_id, "timestamp" DESC
+        {on_conflict}
+    ), sensors AS (
+        INSERT INTO api_sensorreading ({sensor_columns})
+        SELECT DISTINCT ON (r.rover_id, r."timestamp", r.sensor_type) {staged_sensor_columns}
+        FROM import_sensor_stage r
+        JOIN inserted i ON i.rover_id = r.rover_id AND i."timestamp" = r."timestamp"
+        ORDER BY r.rover_id, r."timestamp", r.sensor_type
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM inserted), (SELECT COUNT(*) FROM sensors)
+"""
+
+
+def _quoted(columns, alias=None):
+    prefix = f'{alias}.' if alias else ''
+    return ', '.join(f'{prefix}"{column}"' for column in columns)
+
+
+STAGE_SQL = _STAGE_SQL.format(
+    telemetry_columns=_quoted(TELEMETRY_COLUMNS),
+    sensor_columns=_quoted(SENSOR_COLUMNS),
+)
+
+MERGE_SQL = _MERGE_SQL.format(
+    telemetry_columns=_quoted(TELEMETRY_COLUMNS),
+    staged_telemetry_columns=_quoted(TELEMETRY_COLUMNS, 's'),
+    sensor_columns=_quoted(SENSOR_COLUMNS),
+    staged_sensor_columns=_quoted(SENSOR_COLUMNS, 'r'),
+    state_columns=STATE_COLUMNS,
+    on_conflict=ON_CONFLICT_SQL,
+)
+
+
+def open_recording(path):
+    """Abre um arquivo de gravação (JSONL, opcionalmente .gz); '-' lê da entrada padrão."""
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def parse_recorded_time(value):
+    """Timestamp gravado: ISO 8601 ou segundos desde a época (UTC se sem fuso)."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    # parse_datetime aceita 'Z' e '+00', que o fromisoformat do Python 3.10 recusa
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"Timestamp inválido: {value!r}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt_timezone.utc)
+
+
+def _copy(cursor, table, columns, buffer):
+    sql = f'COPY {table} ({_quoted(columns)}) FROM STDIN WITH (FORMAT csv)'
+    buffer.seek(0)
+    if hasattr(cursor, 'copy_expert'):
+        # psycopg2
+        cursor.copy_expert(sql, buffer)
+    else:
+        # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.read())
+
+
+class TelemetryImporter:
+    """
+    Carga em massa de telemetria gravada (JSONL com tópico e payload por linha).
+
+    As mensagens são decodificadas pelo mesmo TopicRouter/codecs da ingestão
+    e convertidas por telemetry_values; os sensores extras passam pela mesma
+    amostragem da ingestão (SensorSampler). A cada `chunk_size` mensagens,
+    as linhas vão por COPY para tabelas temporárias e são mescladas nas
+    tabelas definitivas descartando (rover, timestamp) já existentes, em
+    uma transação por bloco.
+    """
+
+    def __init__(self, chunk_size=50000):
+        self.chunk_size = chunk_size
+        self.router = TopicRouter()
+        self.router.register('telemetry', self._collect)
+        self.router.register('telemetry/bin', self._collect, decoder=decode_telemetry_struct)
+        self.router.register('telemetry/msgpack', self._collect, decoder=decode_telemetry_msgpack)
+
+        self.sampler = SensorSampler()
+        self._rover_pks = {}
+        self._pending = []
+        self._recorded_at = None
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.stats = {
+            'lines': 0,
+            'messages': 0,
+            'skipped_topics': 0,
+            'invalid': 0,
+            'unknown_rovers': 0,
+            'duplicates': 0,
+            'telemetry_rows': 0,
+            'sensor_rows': 0,
+        }
+
+    def import_lines(self, lines):
+        with connection.cursor() as cursor:
+            cursor.execute(STAGE_SQL)
+        for line in lines:
+            self.stats['lines'] += 1
+            if line.strip():
+                self._read_line(line)
+            if len(self._pending) >= self.chunk_size:
+                self.flush()
+        self.flush()
+
+    def _read_line(self, line):
+        try:
+            record = json.loads(line)
+            matched = self.router.match(record['topic'])
+            if matched is None:
+                self.stats['skipped_topics'] += 1
+                return
+            route, substation_id, rover_id = matched
+
+            self._recorded_at = record.get('received_at') or record.get('timestamp')
+            if 'payload_b64' in record:
+                payload = base64.b64decode(record['payload_b64'])
+            else:
+                payload = record['payload']
+            if isinstance(payload, dict):
+                self._collect(substation_id, rover_id, payload)
+            else:
+                payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+                route.handler(substation_id, rover_id, route.decoder(payload))
+        except (KeyError, TypeError, ValueError) as e:
+            self.stats['invalid'] += 1
+            logger.warning(f"Linha {self.stats['lines']} inválida na gravação: {e}")
+
+    def _collect(self, substation_id, rover_id, data):
+        recorded_at = self._recorded_at or data.get('timestamp')
+        if recorded_at is None:
+            raise ValueError("mensagem sem timestamp")
+        self._pending.append((rover_id, data, parse_recorded_time(recorded_at)))
+        self.stats['messages'] += 1
+
+    def _resolve_rovers(self, identifiers):
+        # Uma única consulta por bloco para os identificadores ainda não vistos
+        missing = [identifier for identifier in identifiers if identifier not in self._rover_pks]
+        if missing:
+            found = dict(Rover.objects.filter(identifier__in=missing).values_list('identifier', 'pk'))
+            for identifier in missing:
+                self._rover_pks[identifier] = found.get(identifier)
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        self._resolve_rovers({rover_id for rover_id, _, _ in pending})
+
+        telemetry_buffer = io.StringIO()
+        sensor_buffer = io.StringIO()
+        telemetry_writer = csv.writer(telemetry_buffer)
+        sensor_writer = csv.writer(sensor_buffer)
+        staged = 0
+        for rover_id, data, recorded_at in pending:
+            rover_pk = self._rover_pks.get(rover_id)
+            if rover_pk is None:
+                self.stats['unknown_rovers'] += 1
+                continue
+            try:
+                fields = telemetry_values(data)
+            except (ValueError, TypeError):
+                self.stats['invalid'] += 1
+                continue
+            # Mesmas conversões de build_telemetry_rows, sem instanciar modelos
+            timestamp = recorded_at.isoformat()
+            telemetry_writer.writerow([rover_pk, timestamp, *(fields[name] for name in TELEMETRY_FIELDS)])
+            sensor_writer.writerows(
+                (rover_pk, timestamp, *reading) for reading in self.sampler.extra_readings(rover_pk, data, recorded_at)
+            )
+            staged += 1
+            if self.first_timestamp is None or recorded_at < self.first_timestamp:
+                self.first_timestamp = recorded_at
+            if self.last_timestamp is None or recorded_at > self.last_timestamp:
+                self.last_timestamp = recorded_at
+
+        if not staged:
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            _copy(cursor, 'import_telemetry_stage', TELEMETRY_COLUMNS, telemetry_buffer)
+            _copy(cursor, 'import_sensor_stage', SENSOR_COLUMNS, sensor_buffer)
+            cursor.execute(MERGE_SQL)
+            telemetry_rows, sensor_rows = cursor.fetchone()
+
+        self.stats['telemetry_rows'] += telemetry_rows
+        self.stats['sensor_rows'] += sensor_rows
+        self.stats['duplicates'] += staged - telemetry_rows
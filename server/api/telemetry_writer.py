@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction, DatabaseError, InterfaceError, OperationalError, close_old_connections, connection
+from django.utils import timezone
+from .models import Rover, RoverTelemetry, SensorReading
+from .geo import encode_geohash
+from .latest_state import upsert_latest_states
+from .rover_cache import rover_cache
+from .sensors import CORE_SENSORS, SensorSampler
+
+logger = logging.getLogger(__name__)
+
+# Colunas de RoverTelemetry preenchidas a partir do payload (além de rover e timestamp)
+TELEMETRY_FIELDS = [sensor.column for sensor in CORE_SENSORS] + ['latitude', 'longitude', 'status', 'geohash']
+
+# Amostragem dos sensores extras gravados pela ingestão
+sensor_sampler = SensorSampler()
+
+
+def telemetry_values(data):
+    """
+    Converte uma mensagem de telemetria nos campos de RoverTelemetry, sem
+    criar instâncias de modelo. Os sensores do núcleo (settings.TELEMETRY_SENSORS
+    com 'column') vão só para a tabela larga.
+    Levanta ValueError/TypeError se os campos principais forem inválidos.
+    """
+    location = data.get('location') or {}
+    fields = {sensor.column: float(data.get(sensor.name, 0)) for sensor in CORE_SENSORS}
+    fields['latitude'] = float(location.get('lat', 0))
+    fields['longitude'] = float(location.get('lng', 0))
+    fields['status'] = data.get('status', 'unknown')
+    fields['geohash'] = encode_geohash(fields['latitude'], fields['longitude'])
+    return fields
+
+
+def build_telemetry_rows(rover_pk, data, received_at, sampler=sensor_sampler):
+    """
+    Monta (sem salvar) o registro de RoverTelemetry e os SensorReading dos
+    sensores extras presentes na mensagem (respeitando a amostragem).
+    Levanta ValueError/TypeError se os campos principais forem inválidos.
+    """
+    telemetry = RoverTelemetry(rover_id=rover_pk, timestamp=received_at, **telemetry_values(data))
+    sensor_readings = [
+        SensorReading(rover_id=rover_pk, timestamp=received_at, sensor_type=sensor_type, value=value, unit=unit)
+        for sensor_type, value, unit in sampler.extra_readings(rover_pk, data, received_at)
+    ]
+    return telemetry, sensor_readings
+
+
+def persist_telemetry_batch(entries, lock_rovers=False):
+    """
+    Grava um lote de mensagens de telemetria com inserts multi-linha e
+    atualiza o último estado de cada rover do lote (RoverLatestState).
+
+    entries: lista de tuplas (rover_identifier, data, received_at).
+    Retorna (linhas de telemetria, linhas de sensores) gravadas.
+    Mensagens de rovers desconhecidos ou com campos inválidos são descartadas.
+    """
+    # Resolução identifier -> pk pelo cache em memória, sem consultas ao banco
+    rovers = rover_cache.get_many({rover_identifier for rover_identifier, _, _ in entries})
+
+    with transaction.atomic():
+        if lock_rovers:
+            # Ordenar por pk evita deadlock entre escritores concorrentes
+            rover_pks = sorted({cached.pk for cached in rovers.values()})
+            locked = Rover.objects.select_for_update().filter(pk__in=rover_pks).order_by('pk')
+            list(locked.values_list('pk', flat=True))
+
+        telemetry_rows = []
+        sensor_rows = []
+        for rover_identifier, data, received_at in entries:
+            cached = rovers.get(rover_identifier)
+            if cached is None:
+                logger.error(f"Rover não encontrado: {rover_identifier}")
+                continue
+            rover_pk = cached.pk
+            try:
+                telemetry, sensor_readings = build_telemetry_rows(rover_pk, data, received_at)
+            except (ValueError, TypeError) as e:
+                logger.error(f"Telemetria inválida descartada para o rover {rover_identifier}: {e}")
+                continue
+            telemetry_rows.append(telemetry)
+            sensor_rows.extend(sensor_readings)
+
+        if telemetry_rows:
+            RoverTelemetry.objects.bulk_create(telemetry_rows)
+            upsert_latest_states(telemetry_rows)
+        if sensor_rows:
+            SensorReading.objects.bulk_create(sensor_rows)
+
+    return len(telemetry_rows), len(sensor_rows)
+
+
+class TelemetryBatchWriter:
+    """
+    Estágio de gravação em lote da telemetria.
+
+    As mensagens de todos os rovers são acumuladas em memória e gravadas no
+    PostgreSQL por uma thread própria a cada `batch_size` mensagens ou a cada
+    `flush_interval_ms` milissegundos, o que ocorrer primeiro.
+    """
+
+    def __init__(self, batch_size=None, flush_interval_ms=None, lock_rovers=None, max_pending=None):
+        self.batch_size = batch_size or settings.TELEMETRY_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.TELEMETRY_FLUSH_INTERVAL_MS) / 1000.0
+        self.lock_rovers = settings.TELEMETRY_LOCK_ROVERS if lock_rovers is None else lock_rovers
+        self.max_pending = max_pending or settings.TELEMETRY_MAX_PENDING
+
+        self._buffer = deque()
+        self._buffer_started_at = None
+        # Depois de uma falha de conexão com o banco, o lote devolvido ao buffer
+        # só é regravado a partir deste instante (time.monotonic())
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        self._stats = {
+            'messages': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'dropped': 0,
+            'telemetry_rows': 0,
+            'sensor_rows': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'last_flush_at': None,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"TelemetryBatchWriter iniciado (lote={self.batch_size}, "
+            f"intervalo={self.flush_interval * 1000:.0f}ms, lock_rovers={self.lock_rovers})"
+        )
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # Gravar o que ainda estiver pendente
+        self.flush()
+
+    def submit(self, rover_identifier, data):
+        """Enfileira uma mensagem de telemetria para a próxima gravação em lote."""
+        received_at = timezone.now()
+        with self._cond:
+            if len(self._buffer) >= self.max_pending:
+                # Banco indisponível ou lento: descartar a mensagem mais antiga
+                self._buffer.popleft()
+                self._stats['dropped'] += 1
+            first_in_batch = not self._buffer
+            if first_in_batch:
+                self._buffer_started_at = time.monotonic()
+            self._buffer.append((rover_identifier, data, received_at))
+            self._stats['messages'] += 1
+            # Acordar a thread para armar o prazo do lote ou gravar um lote cheio
+            if first_in_batch or len(self._buffer) >= self.batch_size:
+                self._wake()
+        return True
+
+    def flush(self):
+        """Grava imediatamente tudo o que estiver no buffer."""
+        with self._cond:
+            batch = self._take_batch()
+        if batch:
+            self._write(batch)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._buffer)
+        total_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total_ms / stats['flushes'], 3) if stats['flushes'] else 0.0
+        stats['batch_size'] = self.batch_size
+        stats['flush_interval_ms'] = int(self.flush_interval * 1000)
+        stats['lock_rovers'] = self.lock_rovers
+        return stats
+
+    def _wake(self):
+        self._cond.notify()
+
+    def _take_batch(self):
+        batch = self._buffer
+        self._buffer = deque()
+        self._buffer_started_at = None
+        return batch
+
+    def _flush_delay(self):
+        """
+        Segundos até o próximo lote (0 = gravar já) ou None se não houver nada
+        pendente. Chamar com self._cond.
+        """
+        if not self._buffer:
+            return None
+        now = time.monotonic()
+        if now < self._retry_at:
+            return self._retry_at - now
+        if len(self._buffer) >= self.batch_size:
+            return 0
+        return max(0.0, self._buffer_started_at + self.flush_interval - now)
+
+    def _requeue(self, batch):
+        """
+        Devolve ao início do buffer um lote que não pôde ser gravado (banco
+        fora do ar, failover), para a próxima tentativa após flush_interval.
+        O limite max_pending vale também aqui: as mensagens mais antigas que
+        não couberem são descartadas e contadas em 'dropped'.
+        """
+        with self._cond:
+            batch = list(batch)
+            overflow = len(batch) + len(self._buffer) - self.max_pending
+            if overflow > 0:
+                del batch[:overflow]
+                self._stats['dropped'] += overflow
+            if not batch:
+                return
+            self._buffer.extendleft(reversed(batch))
+            self._buffer_started_at = time.monotonic()
+            self._retry_at = self._buffer_started_at + self.flush_interval
+            self._wake()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while self._running:
+                        delay = self._flush_delay()
+                        if delay == 0:
+                            break
+                        self._cond.wait(delay)
+                    if not self._running:
+                        return
+                    batch = self._take_batch()
+                self._write(batch)
+        finally:
+            connection.close()
+
+    def _write(self, batch):
+        with self._flush_lock:
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                telemetry_count, sensor_count = persist_telemetry_batch(batch, self.lock_rovers)
+            except (OperationalError, InterfaceError) as e:
+                # Falha de conexão (queda ou failover do banco): o lote volta para o buffer
+                logger.error(f"Banco indisponível ao gravar lote de {len(batch)} telemetrias; nova tentativa: {e}")
+                with self._cond:
+                    self._stats['flush_errors'] += 1
+                self._requeue(batch)
+                return
+            except DatabaseError as e:
+                # Erro nos dados do lote: repetir não adiantaria
+                logger.error(f"Erro no banco de dados ao gravar lote de {len(batch)} telemetrias: {e}")
+                with self._cond:
+                    self._stats['flush_errors'] += 1
+                    self._stats['dropped'] += len(batch)
+                return
+            except Exception as e:
+                logger.error(f"Erro inesperado ao gravar lote de telemetria: {e}", exc_info=True)
+                with self._cond:
+                    self._stats['flush_errors'] += 1
+                    self._stats['dropped'] += len(batch)
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self._stats['flushes'] += 1
+            self._stats['telemetry_rows'] += telemetry_count
+            self._stats['sensor_rows'] += sensor_count
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], round(elapsed_ms, 3))
+            self._stats['total_flush_ms'] += elapsed_ms
+            self._stats['last_flush_at'] = timezone.now().isoformat()
+
+        logger.debug(f"Lote de telemetria gravado: {telemetry_count} telemetrias, {sensor_count} leituras em {elapsed_ms:.1f}ms")
+
+
+class AsyncTelemetryBatchWriter(TelemetryBatchWriter):
+    """
+    Variante do TelemetryBatchWriter para o serviço de ingestão asyncio.
+
+    O agendamento dos lotes roda como tarefa no event loop e cada gravação é
+    feita via sync_to_async no pool de threads, sem bloquear o loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._event = None
+        self._task = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._event = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"AsyncTelemetryBatchWriter iniciado (lote={self.batch_size}, "
+            f"intervalo={self.flush_interval * 1000:.0f}ms, lock_rovers={self.lock_rovers})"
+        )
+
+    async def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+        if self._task:
+            self._event.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                # wait_for já cancelou a tarefa; um lote em gravação na thread termina sozinho
+                logger.warning(f"AsyncTelemetryBatchWriter não terminou em {timeout}s; gravando o pendente")
+            self._task = None
+        # Gravar o que ainda estiver pendente
+        await self.aflush()
+
+    async def aflush(self):
+        with self._cond:
+            batch = self._take_batch()
+        if batch:
+            await sync_to_async(self._write, thread_sensitive=False)(batch)
+
+    def _wake(self):
+        if self._event is not None:
+            self._event.set()
+
+    async def _run(self):
+        while self._running:
+            # Limpar o evento antes de inspecionar o buffer para não perder um submit
+            self._event.clear()
+            with self._cond:
+                delay = self._flush_delay()
+
+            if delay == 0:
+                await self.aflush()
+                continue
+
+            try:
+                await asyncio.wait_for(self._event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
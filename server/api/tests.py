@@ -1,3 +1,774 @@
-from django.test import TestCase
+import json
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+import numpy as np
+from django.db import DataError, OperationalError, connection
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase
+
+from .codecs import (
+    decode_telemetry_msgpack, decode_telemetry_struct, encode_telemetry_msgpack, encode_telemetry_struct,
+)
+from .fleet import FleetSnapshot, _cached_state, _snapshot_rover, bump_fleet_version
+from .geo import GEOHASH_BITS, MAX_COVER_CELLS, cover_bbox, encode_geohash, geohash_sql, rovers_in_bbox
+from .graph_routes import RenderedJSON, choose_encoding, rendered_response
+from .history import format_cursor, parse_cursor
+from .models import Rover, RoverLatestState, RoverTelemetry, SensorReading, SensorRollup, Substation
+from .partitions import BOUND_PATTERN, ensure_partitions, list_partitions
+from .rollups import RAW, choose_resolution, query_series, refresh_rollups, resolution_step
+from .telemetry_import import parse_recorded_time
+from .telemetry_writer import TelemetryBatchWriter
+from .topic_router import TopicRouter, decode_binary
+from .tracks import _project, _segment_distances, simplify_mask
+from .work_queues import POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST, BoundedWorkQueue
+
+
+def douglas_peucker_mask(latitudes, longitudes, tolerance):
+    """Douglas-Peucker recursivo clássico, referência para simplify_mask()."""
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    count = len(latitudes)
+    keep = np.zeros(count, dtype=bool)
+    if count <= 2 or tolerance <= 0:
+        keep[:] = True
+        return keep
+    x, y = _project(latitudes, longitudes)
+
+    def simplify(first, last):
+        keep[first] = keep[last] = True
+        if last - first < 2:
+            return
+        points = np.arange(first + 1, last)
+        distances = _segment_distances(
+            x, y, points, np.full(points.size, first), np.full(points.size, last)
+        )
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            simplify(first, points[farthest])
+            simplify(points[farthest], last)
+
+    simplify(0, count - 1)
+    return keep
+
+
+def random_track(rng, count):
+    """Passeio aleatório de `count` posições (passos de até ~10 m, com trechos retos e paradas)."""
+    latitudes = [-22.9 + rng.uniform(-0.01, 0.01)]
+    longitudes = [-43.2 + rng.uniform(-0.01, 0.01)]
+    heading = rng.uniform(0, 2 * np.pi)
+    for _ in range(count - 1):
+        if rng.random() < 0.2:
+            heading += rng.uniform(-1.5, 1.5)
+        step = 0.0 if rng.random() < 0.1 else rng.uniform(0, 1e-4)
+        latitudes.append(latitudes[-1] + step * np.sin(heading))
+        longitudes.append(longitudes[-1] + step * np.cos(heading))
+    return latitudes, longitudes
+
+
+class SimplifyMaskTests(SimpleTestCase):
+    def test_matches_recursive_douglas_peucker(self):
+        rng = random.Random(19)
+        for _ in range(300):
+            latitudes, longitudes = random_track(rng, rng.randint(3, 400))
+            tolerance = rng.choice([0.5, 2.0, 5.0, 20.0])
+            np.testing.assert_array_equal(
+                simplify_mask(latitudes, longitudes, tolerance),
+                douglas_peucker_mask(latitudes, longitudes, tolerance),
+            )
+
+    def test_short_tracks_and_zero_tolerance_keep_every_point(self):
+        self.assertTrue(simplify_mask([1.0, 1.1], [2.0, 2.1], 5).all())
+        latitudes, longitudes = random_track(random.Random(1), 50)
+        self.assertTrue(simplify_mask(latitudes, longitudes, 0).all())
+
+    def test_removed_points_stay_within_tolerance(self):
+        latitudes, longitudes = random_track(random.Random(2), 1000)
+        keep = simplify_mask(latitudes, longitudes, 2.0)
+        x, y = _project(np.asarray(latitudes), np.asarray(longitudes))
+        anchors = np.flatnonzero(keep)
+        removed = np.flatnonzero(~keep)
+        segment = np.searchsorted(anchors, removed) - 1
+        distances = _segment_distances(x, y, removed, anchors[segment], anchors[segment + 1])
+        self.assertLessEqual(distances.max(), 2.0)
+
+
+class GeohashSqlTests(TestCase):
+    def sql_geohash(self, latitude, longitude):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {geohash_sql(connection.vendor)} FROM '
+                '(SELECT CAST(%s AS DOUBLE PRECISION) AS latitude, CAST(%s AS DOUBLE PRECISION) AS longitude) AS p',
+                [latitude, longitude],
+            )
+            return cursor.fetchone()[0]
+
+    def test_sql_matches_python(self):
+        rng = random.Random(18)
+        positions = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(300)]
+        positions += [(rng.uniform(-23, -22.8), rng.uniform(-43.3, -43.1)) for _ in range(300)]
+        # Bordas da grade e posições fora dela (limitadas à primeira/última célula)
+        positions += [(-90, -180), (90, 180), (0, 0), (-95, 185), (89.9999999, -179.9999999)]
+        for latitude, longitude in positions:
+            self.assertEqual(
+                self.sql_geohash(latitude, longitude), encode_geohash(latitude, longitude), (latitude, longitude)
+            )
+
+
+class CoverBboxTests(SimpleTestCase):
+    def test_cover_contains_every_point_in_bbox(self):
+        rng = random.Random(20)
+        for _ in range(200):
+            size = rng.choice([1e-5, 1e-3, 0.1, 5.0, 90.0])
+            min_lng, min_lat = rng.uniform(-180, 180 - size), rng.uniform(-90, 90 - size / 2)
+            bbox = (min_lng, min_lat, min_lng + rng.uniform(0, size), min_lat + rng.uniform(0, size / 2))
+            ranges = cover_bbox(bbox)
+            self.assertLessEqual(len(ranges), MAX_COVER_CELLS)
+
+            corners = [(bbox[1], bbox[0]), (bbox[3], bbox[2]), (bbox[1], bbox[2]), (bbox[3], bbox[0])]
+            inside = [(rng.uniform(bbox[1], bbox[3]), rng.uniform(bbox[0], bbox[2])) for _ in range(50)]
+            for latitude, longitude in corners + inside:
+                code = encode_geohash(latitude, longitude)
+                self.assertTrue(any(start <= code < end for start, end in ranges), (bbox, latitude, longitude))
+
+    def test_ranges_are_sorted_and_disjoint(self):
+        ranges = cover_bbox((-43.3, -23.0, -43.1, -22.8))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertLess(end, start)
+        self.assertLessEqual(ranges[-1][1], 1 << (2 * GEOHASH_BITS))
+
+    def test_whole_world(self):
+        self.assertEqual(cover_bbox((-180, -90, 180, 90)), [(0, 1 << (2 * GEOHASH_BITS))])
+
+
+class RoversInBboxTests(TestCase):
+    def test_merges_archived_rows(self):
+        substation = Substation.objects.create(name='SUB', identifier='SUB-T')
+        hot, cold = (
+            Rover.objects.create(substation=substation, identifier=identifier, name=identifier, model='X')
+            for identifier in ['Rover-A', 'Rover-B']
+        )
+        day = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        RoverTelemetry.objects.create(
+            rover=hot, timestamp=day + timedelta(days=1), battery_level=90, temperature=20, status='active',
+            latitude=-22.9, longitude=-43.2, geohash=encode_geohash(-22.9, -43.2),
+        )
+        archived = [
+            (1, day, hot.pk, -22.91, -43.21),
+            (2, day + timedelta(minutes=1), cold.pk, -22.9, -43.2),
+            # Fora do retângulo ou sem posição
+            (3, day + timedelta(minutes=2), cold.pk, -10.0, -43.2),
+            (4, day + timedelta(minutes=3), cold.pk, None, None),
+        ]
+        rovers = rovers_in_bbox(RoverTelemetry.objects.all(), (-43.3, -23.0, -43.1, -22.8), archived)
+        self.assertEqual(rovers, [
+            {'rover': 'Rover-A', 'first_seen': day.isoformat(),
+             'last_seen': (day + timedelta(days=1)).isoformat(), 'points': 2},
+            {'rover': 'Rover-B', 'first_seen': (day + timedelta(minutes=1)).isoformat(),
+             'last_seen': (day + timedelta(minutes=1)).isoformat(), 'points': 1},
+        ])
+
+
+@skipUnless(connection.vendor == 'postgresql', "particionamento só existe no PostgreSQL")
+class PartitionBoundsTests(TestCase):
+    def test_literal_postgres_bound(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT bounds[1]::timestamptz, bounds[2]::timestamptz FROM (SELECT regexp_match(%s, %s) AS bounds) AS b',
+                ["FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-01-08 00:00:00+00')", BOUND_PATTERN],
+            )
+            start, end = cursor.fetchone()
+        self.assertEqual(start, datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2024, 1, 8, tzinfo=dt_timezone.utc))
+
+    def test_ensure_partitions_is_idempotent(self):
+        now = datetime(2024, 1, 3, 12, tzinfo=dt_timezone.utc)
+        with connection.cursor() as cursor:
+            ensure_partitions(cursor, 'api_rovertelemetry', 'week', 2, now=now)
+            partitions = list_partitions(cursor, 'api_rovertelemetry')
+            self.assertEqual(ensure_partitions(cursor, 'api_rovertelemetry', 'week', 2, now=now), [])
+        names = [name for name, _, _ in partitions]
+        self.assertIn('api_rovertelemetry_p20240101', names)
+        for _, start, end in partitions:
+            self.assertIsNotNone(start.tzinfo)
+            self.assertLess(start, end)
+
+
+class ParseRecordedTimeTests(SimpleTestCase):
+    def test_accepts_z_offsets_and_epoch(self):
+        expected = datetime(2026, 10, 10, 12, 30, tzinfo=dt_timezone.utc)
+        for value in ['2026-10-10T12:30:00Z', '2026-10-10 12:30:00+00', '2026-10-10T12:30:00+00:00',
+                      '2026-10-10T12:30:00', expected.timestamp()]:
+            self.assertEqual(parse_recorded_time(value), expected, value)
+
+    def test_rejects_invalid_timestamps(self):
+        for value in ['garbage', '2026-13-45T00:00:00Z']:
+            with self.assertRaises(ValueError):
+                parse_recorded_time(value)
+
+
+class TelemetryBatchWriterTests(SimpleTestCase):
+    def make_writer(self, max_pending=5):
+        return TelemetryBatchWriter(batch_size=100, flush_interval_ms=1000, lock_rovers=False, max_pending=max_pending)
+
+    def test_connection_errors_requeue_the_batch_in_order(self):
+        writer = self.make_writer()
+        for i in range(3):
+            writer.submit(f'rover-{i}', {})
+        with mock.patch('api.telemetry_writer.persist_telemetry_batch', side_effect=OperationalError('down')):
+            writer.flush()
+        writer.submit('rover-3', {})
+
+        written = []
+        with mock.patch('api.telemetry_writer.persist_telemetry_batch',
+                        side_effect=lambda batch, lock: written.extend(batch) or (len(batch), 0)):
+            writer.flush()
+        self.assertEqual([entry[0] for entry in written], ['rover-0', 'rover-1', 'rover-2', 'rover-3'])
+        stats = writer.get_stats()
+        self.assertEqual((stats['flush_errors'], stats['dropped'], stats['telemetry_rows']), (1, 0, 4))
+
+    def test_requeue_respects_max_pending(self):
+        writer = self.make_writer(max_pending=5)
+        for i in range(4):
+            writer.submit(f'old-{i}', {})
+        batch = writer._take_batch()
+        for i in range(3):
+            writer.submit(f'new-{i}', {})
+        writer._requeue(batch)
+        # As mensagens mais antigas do lote devolvido são as descartadas
+        self.assertEqual([entry[0] for entry in writer._buffer], ['old-2', 'old-3', 'new-0', 'new-1', 'new-2'])
+        self.assertEqual(writer.get_stats()['dropped'], 2)
+        self.assertGreater(writer._flush_delay(), 0)
+
+    def test_data_errors_drop_the_batch(self):
+        writer = self.make_writer()
+        writer.submit('rover', {})
+        with mock.patch('api.telemetry_writer.persist_telemetry_batch', side_effect=DataError('bad')):
+            writer.flush()
+        stats = writer.get_stats()
+        self.assertEqual((stats['pending'], stats['dropped'], stats['flush_errors']), (0, 1, 1))
+
+    def test_full_buffer_drops_the_oldest_message(self):
+        writer = self.make_writer(max_pending=3)
+        for i in range(5):
+            writer.submit(f'rover-{i}', {})
+        self.assertEqual([entry[0] for entry in writer._buffer], ['rover-2', 'rover-3', 'rover-4'])
+        self.assertEqual(writer.get_stats()['dropped'], 2)
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    def test_zero_quality_excludes_the_coding(self):
+        self.assertEqual(choose_encoding('gzip;q=0'), 'identity')
+        self.assertEqual(choose_encoding('br, gzip;q=0'), 'br')
+
+    def test_higher_quality_wins_over_server_preference(self):
+        self.assertEqual(choose_encoding('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(choose_encoding('gzip, br'), 'br')
+
+    def test_wildcard(self):
+        self.assertEqual(choose_encoding('*'), 'br')
+        self.assertEqual(choose_encoding('*;q=0'), 'identity')
+        self.assertEqual(choose_encoding('gzip, *;q=0'), 'gzip')
+
+    def test_identity_fallback(self):
+        for header in ['', 'deflate', 'compress;q=1', 'gzip;q=abc']:
+            self.assertEqual(choose_encoding(header), 'identity', header)
+
+
+class RenderedResponseTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.rendered = RenderedJSON({'nodes': [{'id': i, 'lat': -22.9, 'lng': -43.2} for i in range(50)]})
+
+    def get(self, **headers):
+        return rendered_response(self.factory.get('/api/graph/', headers=headers), self.rendered)
+
+    def test_serves_the_precompressed_body_with_its_etag(self):
+        for accept, encoding in [('br', 'br'), ('gzip', 'gzip'), ('', 'identity')]:
+            response = self.get(accept_encoding=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, self.rendered.bodies[encoding])
+            self.assertEqual(response['ETag'], self.rendered.etags[encoding])
+            self.assertEqual(response.get('Content-Encoding'), None if encoding == 'identity' else encoding)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(len(set(self.rendered.etags.values())), 3)
+
+    def test_if_none_match_hit_returns_304_with_the_per_encoding_etag(self):
+        # O cliente revalida com o ETag gzip, mas agora negocia brotli
+        response = self.get(accept_encoding='br', if_none_match=self.rendered.etags['gzip'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], self.rendered.etags['br'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_if_none_match_miss_returns_the_body(self):
+        response = self.get(accept_encoding='gzip', if_none_match='"outro", W/"antigo"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], self.rendered.etags['gzip'])
+
+
+class BoundedWorkQueueTests(SimpleTestCase):
+    def drain(self, queue):
+        """Processa os itens pendentes e devolve-os na ordem de atendimento."""
+        handled = []
+        queue.start(handled.append)
+        queue.stop()
+        return handled
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            BoundedWorkQueue('x', 1, policy='fifo')
+
+    def test_block_drops_after_timeout(self):
+        queue = BoundedWorkQueue('block', 2, policy=POLICY_BLOCK, block_timeout=0.01)
+        with self.assertLogs('api.work_queues', 'ERROR'):
+            self.assertEqual([queue.put(None, i) for i in range(3)], [True, True, False])
+        self.assertEqual(self.drain(queue), [0, 1])
+        stats = queue.get_stats()
+        self.assertEqual((stats['enqueued'], stats['processed'], stats['dropped']), (2, 2, 1))
+        self.assertEqual((stats['depth'], stats['max_depth']), (0, 2))
+
+    def test_block_waits_for_a_free_slot(self):
+        queue = BoundedWorkQueue('block', 1, policy=POLICY_BLOCK, block_timeout=5)
+        handled = []
+        queue.put(None, 0)
+        # Com o consumidor ativo, o produtor bloqueado é liberado sem descarte
+        queue.start(handled.append)
+        self.assertTrue(queue.put(None, 1))
+        queue.stop()
+        self.assertEqual(handled, [0, 1])
+        self.assertEqual(queue.get_stats()['dropped'], 0)
+
+    def test_drop_oldest(self):
+        queue = BoundedWorkQueue('drop', 3, policy=POLICY_DROP_OLDEST)
+        self.assertEqual([queue.put(None, i) for i in range(5)], [True, True, True, False, False])
+        self.assertEqual(self.drain(queue), [2, 3, 4])
+        stats = queue.get_stats()
+        self.assertEqual((stats['enqueued'], stats['processed'], stats['dropped'], stats['max_depth']), (5, 3, 2, 3))
+
+    def test_latest_coalesces_per_key(self):
+        queue = BoundedWorkQueue('latest', 10, policy=POLICY_LATEST)
+        accepted = [queue.put(rover, (rover, seq)) for seq, rover in enumerate(['a', 'b', 'a', 'c', 'a'])]
+        self.assertEqual(accepted, [True, True, False, True, False])
+        # Cada rover mantém só o item mais recente, na posição da última atualização
+        self.assertEqual(self.drain(queue), [('b', 1), ('c', 3), ('a', 4)])
+        stats = queue.get_stats()
+        self.assertEqual((stats['enqueued'], stats['processed'], stats['dropped'], stats['max_depth']), (5, 3, 2, 3))
+
+    def test_latest_evicts_the_oldest_key_when_full(self):
+        queue = BoundedWorkQueue('latest', 2, policy=POLICY_LATEST)
+        for rover in ['a', 'b', 'c']:
+            queue.put(rover, rover)
+        self.assertEqual(self.drain(queue), ['b', 'c'])
+        self.assertEqual(queue.get_stats()['dropped'], 1)
+
+    def test_handler_errors_are_counted(self):
+        queue = BoundedWorkQueue('errors', 5)
+        for i in range(3):
+            queue.put(None, i)
+
+        def handler(item):
+            if item == 1:
+                raise RuntimeError('falha')
+
+        with self.assertLogs('api.work_queues', 'ERROR'):
+            queue.start(handler)
+            queue.stop()
+        stats = queue.get_stats()
+        self.assertEqual((stats['processed'], stats['errors']), (3, 1))
+
+
+class TopicRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = TopicRouter()
+        self.calls = []
+        self.telemetry = self.router.register('telemetry', lambda *args: self.calls.append(args))
+        self.config = self.router.register('insta/config', lambda *args: self.calls.append(args), qos=0)
+
+    def test_match(self):
+        self.assertEqual(
+            self.router.match('substations/SUB001/rovers/Rover-1/telemetry'), (self.telemetry, 'SUB001', 'Rover-1')
+        )
+        self.assertEqual(
+            self.router.match('substations/SUB002/rovers/Rover-2/insta/config'), (self.config, 'SUB002', 'Rover-2')
+        )
+        for topic in ['substations/SUB001/rovers/Rover-1/battery', 'substations/SUB001/rovers/Rover-1',
+                      'substation/SUB001/rovers/Rover-1/telemetry', 'substations/SUB001/robots/Rover-1/telemetry',
+                      'substations/SUB001/rovers/Rover-1/telemetry/extra']:
+            self.assertIsNone(self.router.match(topic), topic)
+
+    def test_subscriptions_and_duplicates(self):
+        self.assertEqual(self.router.subscriptions(), [
+            ('substations/+/rovers/+/telemetry', 1), ('substations/+/rovers/+/insta/config', 0),
+        ])
+        with self.assertRaises(ValueError):
+            self.router.register('telemetry', print)
+
+    def test_prefix_needs_two_wildcards(self):
+        with self.assertRaises(ValueError):
+            TopicRouter('substations/+/rovers')
+        router = TopicRouter('site/+/fleet/+/v1')
+        router.register('telemetry', print)
+        self.assertEqual(router.match('site/S/fleet/R/v1/telemetry')[1:], ('S', 'R'))
+
+    def test_dispatch_decodes_and_counts(self):
+        with self.assertLogs('api.topic_router', 'WARNING'):
+            self.router.dispatch('substations/SUB001/rovers/Rover-1/unknown', b'{}')
+        self.router.dispatch('substations/SUB001/rovers/Rover-1/telemetry', b'{"battery": 80}')
+        self.assertEqual(self.calls, [('SUB001', 'Rover-1', {'battery': 80})])
+        self.assertEqual(self.router.get_stats()['unrouted'], 1)
+
+    def test_decode_errors(self):
+        topic = 'substations/SUB001/rovers/Rover-1/telemetry'
+        with self.assertLogs('api.topic_router', 'ERROR'):
+            self.assertIsNone(self.router.dispatch(topic, b'{not json'))
+            self.assertIsNone(self.router.dispatch(topic, b'\xff\xfe'))
+        self.assertEqual(self.calls, [])
+        stats = self.router.get_stats()['routes']['telemetry']
+        self.assertEqual((stats['messages'], stats['decode_errors']), (2, 2))
+
+    def test_binary_route(self):
+        self.router.register('telemetry/bin', lambda *args: self.calls.append(args), decoder=decode_binary,
+                             queue='telemetry')
+        self.router.dispatch('substations/SUB001/rovers/Rover-1/telemetry/bin', bytearray(b'\x01\x02'))
+        self.assertEqual(self.calls, [('SUB001', 'Rover-1', b'\x01\x02')])
+        self.assertEqual(self.router.get_stats()['routes']['telemetry/bin']['queue'], 'telemetry')
+
+
+class TelemetryCodecTests(SimpleTestCase):
+    telemetry = {
+        'battery': 87.5,
+        'temperature': 31.25,
+        'speed': 1.5,
+        'location': {'lat': -22.912345678, 'lng': -43.187654321},
+        'status': 'active',
+        'timestamp': '2026-10-10T12:30:00.123000+00:00',
+        'seq': 42,
+    }
+
+    def test_struct_round_trip(self):
+        payload = encode_telemetry_struct(self.telemetry)
+        self.assertEqual(len(payload), 42)
+        # battery/temperature/speed são float32, escolhidos para serem exatos aqui
+        self.assertEqual(decode_telemetry_struct(payload), self.telemetry)
+
+    def test_struct_accepts_z_and_unknown_status(self):
+        data = dict(self.telemetry, timestamp='2026-10-10T12:30:00.123Z', status='dancing')
+        decoded = decode_telemetry_struct(encode_telemetry_struct(data))
+        self.assertEqual(decoded['timestamp'], self.telemetry['timestamp'])
+        self.assertEqual(decoded['status'], 'unknown')
+
+    def test_struct_rejects_bad_payloads(self):
+        payload = encode_telemetry_struct(self.telemetry)
+        for bad in [b'', bytes([9]) + payload[1:], payload[:-1], payload + b'\x00']:
+            with self.assertRaises(ValueError):
+                decode_telemetry_struct(bad)
+
+    def test_msgpack_round_trip(self):
+        self.assertEqual(decode_telemetry_msgpack(encode_telemetry_msgpack(self.telemetry)), self.telemetry)
+
+    def test_msgpack_timestamp_forms(self):
+        expected = '2026-10-10T12:30:00+00:00'
+        moment = datetime(2026, 10, 10, 12, 30, tzinfo=dt_timezone.utc)
+        for timestamp in [moment, int(moment.timestamp() * 1000), expected]:
+            payload = msgpack.packb({'timestamp': timestamp}, datetime=True)
+            self.assertEqual(decode_telemetry_msgpack(payload)['timestamp'], expected, timestamp)
+
+    def test_msgpack_rejects_non_maps(self):
+        for bad in [msgpack.packb([1, 2]), b'\xc1', msgpack.packb({}) + b'\x00']:
+            with self.assertRaises(ValueError):
+                decode_telemetry_msgpack(bad)
+
+
+class ChooseResolutionTests(SimpleTestCase):
+    start = datetime(2026, 10, 10, tzinfo=dt_timezone.utc)
+
+    def test_raw_only_when_readings_fit(self):
+        end = self.start + timedelta(hours=2)
+        self.assertEqual(choose_resolution(self.start, end, 100, raw_points=100), RAW)
+        self.assertEqual(choose_resolution(self.start, end, 120, raw_points=121), '1m')
+        self.assertEqual(choose_resolution(self.start, end, 120), '1m')
+
+    def test_budget_edges(self):
+        end = self.start + timedelta(hours=2)
+        # 120 intervalos de 1 minuto, 2 de 1 hora
+        self.assertEqual(choose_resolution(self.start, end, 120), '1m')
+        self.assertEqual(choose_resolution(self.start, end, 119), '1h')
+        self.assertEqual(choose_resolution(self.start, end, 2), '1h')
+
+        end = self.start + timedelta(days=2)
+        self.assertEqual(choose_resolution(self.start, end, 48), '1h')
+        self.assertEqual(choose_resolution(self.start, end, 47), '2h')
+        self.assertEqual(choose_resolution(self.start, end, 24), '2h')
+        self.assertEqual(choose_resolution(self.start, end, 23), '3h')
+        self.assertEqual(resolution_step('3h'), timedelta(hours=3))
+
+    def test_unaligned_period_counts_partial_buckets(self):
+        start = self.start + timedelta(minutes=30)
+        end = start + timedelta(hours=2)
+        # 00:30-02:30 toca três intervalos de 1 hora
+        self.assertEqual(choose_resolution(start, end, 3), '1h')
+        self.assertEqual(choose_resolution(start, end, 2), '2h')
+        # De 01:30 a 05:30, intervalos de 2 h seriam três (00-02, 02-04, 04-06): o alinhamento pede 3 h
+        start = self.start + timedelta(hours=1, minutes=30)
+        self.assertEqual(choose_resolution(start, start + timedelta(hours=4), 2), '3h')
+
+
+class RefreshRollupsTests(TestCase):
+    start = datetime(2026, 10, 10, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        substation = Substation.objects.create(name='SUB', identifier='SUB-T')
+        self.rover = Rover.objects.create(substation=substation, identifier='Rover-T', name='Rover T', model='X')
+        # Três horas de telemetria a cada 20 s e uma leitura extra por minuto
+        RoverTelemetry.objects.bulk_create([
+            RoverTelemetry(rover=self.rover, timestamp=self.start + timedelta(seconds=20 * i),
+                           battery_level=100 - i * 0.1, temperature=20 + i % 7, speed=None, status='active')
+            for i in range(540)
+        ])
+        SensorReading.objects.bulk_create([
+            SensorReading(rover=self.rover, timestamp=self.start + timedelta(minutes=i), sensor_type='humidity',
+                          value=float(i), unit='%')
+            for i in range(180)
+        ])
+        self.end = self.start + timedelta(hours=3)
+
+    def rollups(self, resolution, sensor_type='battery'):
+        return SensorRollup.objects.filter(rover=self.rover, sensor_type=sensor_type, resolution=resolution)
+
+    def test_refresh_aggregates_every_level(self):
+        refresh_rollups(self.start, self.end)
+        self.assertEqual(self.rollups('1m').count(), 180)
+        self.assertEqual(self.rollups('1h').count(), 3)
+        self.assertEqual(self.rollups('1m', 'humidity').count(), 180)
+        self.assertFalse(self.rollups('1m', 'speed').exists())
+
+        minute = self.rollups('1m').get(bucket=self.start + timedelta(minutes=1))
+        self.assertEqual((minute.count, minute.max_value, minute.last_timestamp),
+                         (3, 99.7, self.start + timedelta(seconds=100)))
+        self.assertAlmostEqual(minute.min_value, 99.5)
+        self.assertAlmostEqual(minute.last_value, 99.5)
+        hour = self.rollups('1h').get(bucket=self.start + timedelta(hours=1))
+        self.assertEqual(hour.count, 180)
+        self.assertAlmostEqual(hour.sum_value, sum(100 - i * 0.1 for i in range(180, 360)))
+
+    def test_refresh_upserts_existing_buckets(self):
+        refresh_rollups(self.start, self.end)
+        RoverTelemetry.objects.filter(timestamp=self.start + timedelta(seconds=20)).update(battery_level=500)
+        refresh_rollups(self.start, self.start + timedelta(minutes=1))
+
+        self.assertEqual(self.rollups('1m').count(), 180)
+        self.assertEqual(self.rollups('1h').count(), 3)
+        self.assertEqual(self.rollups('1m').get(bucket=self.start).max_value, 500)
+        self.assertEqual(self.rollups('1h').get(bucket=self.start).max_value, 500)
+
+    def test_query_series_fits_the_budget(self):
+        refresh_rollups(self.start, self.end)
+        for max_points, resolution, count in [(1000, RAW, 540), (180, '1m', 180), (100, '1h', 3), (2, '2h', 2)]:
+            chosen, points = query_series(self.rover, 'battery', self.start, self.end, max_points)
+            self.assertEqual((chosen, len(points)), (resolution, count), max_points)
+            self.assertEqual(sum(point['count'] for point in points), 540)
+
+
+class FakeRedis:
+    """Subconjunto do cliente Redis usado por FleetSnapshot, em memória."""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value)
+        return True
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    def hgetall(self, key):
+        self.calls.append('hgetall')
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FleetSnapshotViewTests(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.snapshot = FleetSnapshot(self.redis)
+        # A view e os signals (bump_fleet_version) usam a instância do módulo
+        for target in ['api.views.fleet_snapshot', 'api.fleet.fleet_snapshot']:
+            patcher = mock.patch(target, self.snapshot)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        substation = Substation.objects.create(name='Subestação', identifier='SUB-T')
+        self.rover = Rover.objects.create(substation=substation, identifier='Rover-T', name='Rover T', model='X')
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/fleet-snapshot/')
+        self.assertEqual(response.status_code, 200)
+        version = int(self.redis.values['fleet:version'])
+        self.assertEqual(response['ETag'], f'"fleet-{version}"')
+        self.assertEqual(response.json()['substations'][0]['rovers'][0]['id'], 'Rover-T')
+
+        self.redis.calls.clear()
+        response = self.client.get('/api/fleet-snapshot/', headers={'If-None-Match': f'"fleet-{version}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"fleet-{version}"')
+        # Revalidar custa só a leitura da versão
+        self.assertEqual(self.redis.calls, ['get'])
+
+    def test_bump_changes_the_etag(self):
+        etag = self.client.get('/api/fleet-snapshot/')['ETag']
+        bump_fleet_version()
+        response = self.client.get('/api/fleet-snapshot/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_document_is_rebuilt_once_per_version(self):
+        for _ in range(3):
+            self.client.get('/api/fleet-snapshot/')
+        self.assertEqual(self.snapshot.get_stats()['builds'], 1)
+        self.rover.name = 'Rover renomeado'
+        self.rover.save()
+        response = self.client.get('/api/fleet-snapshot/')
+        self.assertEqual(response.json()['substations'][0]['rovers'][0]['name'], 'Rover renomeado')
+        self.assertEqual(self.snapshot.get_stats()['builds'], 2)
+
+    def test_redis_state_newer_than_the_database_wins(self):
+        stored = datetime(2026, 10, 10, 12, tzinfo=dt_timezone.utc)
+        RoverLatestState.objects.create(rover=self.rover, timestamp=stored, battery_level=50, temperature=30,
+                                        status='idle')
+        self.redis.hashes['fleet:snapshot'] = {
+            'Rover-T': json.dumps({'battery': 90, 'status': 'active', 'received_at': '2026-10-10T12:00:05Z'}),
+        }
+        bump_fleet_version()
+        rover = self.client.get('/api/fleet-snapshot/').json()['substations'][0]['rovers'][0]
+        self.assertEqual((rover['battery'], rover['status']), (90, 'active'))
+
+
+class SnapshotRoverTests(SimpleTestCase):
+    stored = datetime(2026, 10, 10, 12, tzinfo=dt_timezone.utc)
+
+    def row(self, timestamp):
+        return ('SUB-T', 'Subestação', 'Rover-T', 'Rover T', timestamp, 50.0, 30.0, 1.0, -22.9, -43.2, 'idle')
+
+    def cached(self, received_at, **state):
+        return json.dumps(dict({'battery': 90.0, 'status': 'active'}, received_at=received_at, **state))
+
+    def test_cached_state_parses_received_at(self):
+        state, received_at = _cached_state(self.cached('2026-10-10T12:00:00Z'))
+        self.assertEqual(state['battery'], 90.0)
+        self.assertEqual(received_at, self.stored)
+        # Horários sem fuso são tratados como UTC
+        self.assertEqual(_cached_state(self.cached('2026-10-10T12:00:00'))[1], self.stored)
+
+    def test_cached_state_rejects_bad_entries(self):
+        for cached in [None, '', '{broken', '[]', json.dumps({'battery': 1}), self.cached(None),
+                       self.cached('yesterday'), self.cached('2026-13-45T00:00:00Z')]:
+            self.assertEqual(_cached_state(cached), (None, None), cached)
+
+    def test_newest_state_wins(self):
+        newer = _snapshot_rover(self.row(self.stored), self.cached('2026-10-10T12:00:01+00:00'))
+        self.assertEqual((newer['status'], newer['last_seen']), ('active', '2026-10-10T12:00:01+00:00'))
+        same = _snapshot_rover(self.row(self.stored), self.cached('2026-10-10T12:00:00Z'))
+        self.assertEqual(same['status'], 'active')
+        older = _snapshot_rover(self.row(self.stored), self.cached('2026-10-10T11:59:59Z'))
+        self.assertEqual((older['status'], older['last_seen']), ('idle', self.stored.isoformat()))
+
+    def test_falls_back_to_the_database(self):
+        self.assertEqual(_snapshot_rover(self.row(self.stored), '{broken')['battery'], 50.0)
+        self.assertEqual(_snapshot_rover(self.row(None), self.cached('2026-10-10T12:00:00Z'))['battery'], 90.0)
+        self.assertEqual(
+            _snapshot_rover(self.row(None), None), {'id': 'Rover-T', 'name': 'Rover T', 'status': None, 'last_seen': None}
+        )
+
+
+class ParseCursorTests(SimpleTestCase):
+    expected = (datetime(2026, 10, 10, 12, 30, 0, 250000, tzinfo=dt_timezone.utc), 42)
+
+    def test_offsets(self):
+        for value in ['2026-10-10T12:30:00.250000+00:00,42', '2026-10-10T12:30:00.250Z,42',
+                      '2026-10-10 12:30:00.25+00,42', '2026-10-10T09:30:00.250-03:00,42']:
+            self.assertEqual(parse_cursor(value), self.expected, value)
+
+    def test_unencoded_plus_arrives_as_space(self):
+        for value in ['2026-10-10T12:30:00.250000 00:00,42', '2026-10-10 12:30:00.25 00,42',
+                      '2026-10-10T12:30:00.250 0000,42']:
+            self.assertEqual(parse_cursor(value), self.expected, value)
+
+    def test_round_trip_and_naive(self):
+        self.assertEqual(parse_cursor(format_cursor((42, self.expected[0]))), self.expected)
+        self.assertIsNone(parse_cursor('2026-10-10T12:30:00,1')[0].tzinfo)
+
+    def test_invalid(self):
+        for value in ['', '42', '2026-10-10T12:30:00Z', '2026-10-10T12:30:00Z,x', 'garbage,1', '2026-13-45T00:00:00Z,1']:
+            with self.assertRaises(ValueError):
+                parse_cursor(value)
+
+
+class TelemetryHistoryTests(TestCase):
+    start = datetime(2026, 10, 10, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        substation = Substation.objects.create(name='SUB', identifier='SUB-T')
+        rover = Rover.objects.create(substation=substation, identifier='Rover-T', name='Rover T', model='X')
+        RoverTelemetry.objects.bulk_create([
+            RoverTelemetry(rover=rover, timestamp=self.start + timedelta(minutes=i), battery_level=100 - i,
+                           temperature=20, status='active')
+            for i in range(5)
+        ])
+
+    async def history(self, **params):
+        response = await AsyncClient().get('/api/history/', {
+            'rover': 'Rover-T', 'start': '2026-10-10T00:00:00Z', 'end': '2026-10-11T00:00:00Z', **params
+        })
+        if response.status_code != 200:
+            return response.status_code, []
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        return response.status_code, content.splitlines()
+
+    async def test_ndjson_ends_with_the_next_cursor(self):
+        _, lines = await self.history()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[-1], {'next_after': f"{rows[4]['timestamp']},{rows[4]['id']}"})
+
+        # O cursor de uma linha, mesmo com o '+' decodificado como espaço, retoma logo depois dela
+        cursor = f"{rows[1]['timestamp']},{rows[1]['id']}"
+        status, lines = await self.history(after=cursor.replace('+', ' '))
+        self.assertEqual(status, 200)
+        self.assertEqual([json.loads(line) for line in lines], rows[2:])
+
+        _, lines = await self.history(after=rows[-1]['next_after'])
+        self.assertEqual(lines, [])
+
+    async def test_csv_has_no_trailer(self):
+        _, lines = await self.history(format='csv')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[0].startswith('id,timestamp'))
+
+    async def test_invalid_cursor(self):
+        status, _ = await self.history(after='yesterday,1')
+        self.assertEqual(status, 400)
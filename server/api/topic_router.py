@@ -0,0 +1,137 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def decode_json(payload):
+    """Decodificador padrão: payload JSON em UTF-8."""
+    return json.loads(payload.decode('utf-8') if isinstance(payload, (bytes, bytearray)) else payload)
+
+
+def decode_binary(payload):
+    """Decodificador para payloads binários: entrega os bytes sem alteração."""
+    return payload if isinstance(payload, bytes) else bytes(payload)
+
+
+class Route:
+    """Registro de um tipo de mensagem: handler, decodificador, QoS e destinos."""
+
+    __slots__ = ('message_type', 'topic', 'handler', 'decoder', 'qos', 'sinks', 'queue', 'messages', 'decode_errors')
+
+    def __init__(self, message_type, topic, handler, decoder, qos, sinks, queue):
+        self.message_type = message_type
+        self.topic = topic
+        self.handler = handler
+        self.decoder = decoder
+        self.qos = qos
+        self.sinks = tuple(sinks)
+        self.queue = queue
+        self.messages = 0
+        self.decode_errors = 0
+
+    def describe(self):
+        return {
+            'topic': self.topic,
+            'qos': self.qos,
+            'decoder': getattr(self.decoder, '__name__', str(self.decoder)),
+            'sinks': list(self.sinks),
+            'queue': self.queue,
+            'messages': self.messages,
+            'decode_errors': self.decode_errors,
+        }
+
+
+class TopicRouter:
+    """
+    Roteador de tópicos MQTT dos rovers.
+
+    O prefixo (por padrão `substations/+/rovers/+`) é compilado uma única vez
+    nas posições de seus segmentos fixos e curingas. Cada tipo de mensagem é
+    registrado pelo sufixo do tópico (`telemetry`, `insta/config`, ...) e o
+    despacho é um único split mais uma consulta em dicionário, sem cadeia de
+    if/elif, independente do número de tipos registrados.
+    """
+
+    def __init__(self, prefix='substations/+/rovers/+'):
+        self.prefix = prefix
+        segments = prefix.split('/')
+        self._prefix_len = len(segments)
+        self._literals = tuple((i, segment) for i, segment in enumerate(segments) if segment != '+')
+        wildcards = [i for i, segment in enumerate(segments) if segment == '+']
+        if len(wildcards) != 2:
+            raise ValueError("O prefixo deve ter dois curingas: subestação e rover")
+        self._substation_index, self._rover_index = wildcards
+        self._routes = {}
+        self.unrouted = 0
+
+    def register(self, message_type, handler, decoder=decode_json, qos=1, sinks=(), queue=None):
+        """
+        Registra o handler de um tipo de mensagem. O handler recebe
+        (substation_id, rover_id, data), com data já decodificado.
+        `queue` é o nome da fila de trabalho usada pela rota (por padrão, o
+        próprio tipo), para que variantes de um mesmo tipo, como
+        `telemetry/bin`, compartilhem a fila do tipo principal.
+        """
+        if message_type in self._routes:
+            raise ValueError(f"Tipo de mensagem já registrado: {message_type}")
+        route = Route(message_type, f'{self.prefix}/{message_type}', handler, decoder, qos, sinks, queue or message_type)
+        self._routes[message_type] = route
+        return route
+
+    def subscriptions(self):
+        """Lista (tópico, QoS) para assinar no broker."""
+        return [(route.topic, route.qos) for route in self._routes.values()]
+
+    def match(self, topic):
+        """
+        Retorna (route, substation_id, rover_id) ou None se o tópico não
+        corresponder a nenhum tipo registrado.
+        """
+        parts = topic.split('/', self._prefix_len)
+        if len(parts) <= self._prefix_len:
+            return None
+        route = self._routes.get(parts[-1])
+        if route is None:
+            return None
+        for i, literal in self._literals:
+            if parts[i] != literal:
+                return None
+        return route, parts[self._substation_index], parts[self._rover_index]
+
+    def resolve(self, topic):
+        """Como match(), mas contabiliza e registra tópicos sem handler."""
+        matched = self.match(topic)
+        if matched is None:
+            self.unrouted += 1
+            logger.warning(f"[MQTT] Tópico sem handler registrado: {topic}")
+        return matched
+
+    def handle(self, route, substation_id, rover_id, payload):
+        """
+        Decodifica o payload e chama o handler da rota.
+        Retorna o valor do handler (uma corrotina, no caso de handlers async).
+        """
+        route.messages += 1
+        try:
+            data = route.decoder(payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            route.decode_errors += 1
+            logger.error(f"[MQTT] Payload inválido para {route.message_type} do rover {rover_id}: {e}")
+            return None
+
+        return route.handler(substation_id, rover_id, data)
+
+    def dispatch(self, topic, payload):
+        """Resolve o tópico e executa o handler correspondente."""
+        matched = self.resolve(topic)
+        if matched is None:
+            return None
+        route, substation_id, rover_id = matched
+        return self.handle(route, substation_id, rover_id, payload)
+
+    def get_stats(self):
+        return {
+            'routes': {message_type: route.describe() for message_type, route in self._routes.items()},
+            'unrouted': self.unrouted,
+        }
@@ -0,0 +1,206 @@
+import math
+from array import array
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from .geo import filter_bbox
+from .models import RoverTelemetry, SimplifiedTrack
+
+# Raio médio da Terra, para projetar as posições em metros
+EARTH_RADIUS_M = 6371008.8
+
+# Formato gravado em SimplifiedTrack.points: (epoch em segundos, latitude, longitude) por ponto
+_POINT_DTYPE = np.dtype([('time', '<f8'), ('latitude', '<f8'), ('longitude', '<f8')])
+
+
+def _project(latitudes, longitudes):
+    """Projeção equirretangular local (metros), suficiente para trajetos de alguns km."""
+    scale = math.pi / 180 * EARTH_RADIUS_M
+    x = longitudes * scale * math.cos(math.radians(float(latitudes.mean())))
+    y = latitudes * scale
+    return x, y
+
+
+def _segment_distances(x, y, points, starts, ends):
+    """Distância (metros) de cada ponto ao segmento [start, end] correspondente."""
+    ax, ay = x[starts], y[starts]
+    dx, dy = x[ends] - ax, y[ends] - ay
+    px, py = x[points] - ax, y[points] - ay
+    length2 = dx * dx + dy * dy
+    # Segmentos degenerados (rover parado ou voltando ao ponto de partida) usam a distância ao início
+    t = np.clip((px * dx + py * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def simplify_mask(latitudes, longitudes, tolerance):
+    """
+    Douglas-Peucker vetorizado: máscara dos pontos mantidos para que nenhum
+    ponto removido fique a mais de `tolerance` metros do trajeto simplificado.
+    Cada iteração divide de uma vez todos os segmentos ainda acima da
+    tolerância, no ponto mais distante de cada um. O primeiro e o último
+    ponto são sempre mantidos.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    count = len(latitudes)
+    keep = np.zeros(count, dtype=bool)
+    if count <= 2 or tolerance <= 0:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+
+    x, y = _project(latitudes, longitudes)
+    pending = np.arange(1, count - 1)
+    while pending.size:
+        anchors = np.flatnonzero(keep)
+        segment = np.searchsorted(anchors, pending) - 1
+        distances = _segment_distances(x, y, pending, anchors[segment], anchors[segment + 1])
+
+        # pending está em ordem, então os pontos de cada segmento são contíguos
+        group_start = np.r_[True, segment[1:] != segment[:-1]]
+        group = np.cumsum(group_start) - 1
+        farthest = np.maximum.reduceat(distances, np.flatnonzero(group_start))
+        split = farthest > tolerance
+        if not split.any():
+            break
+
+        candidates = np.flatnonzero((distances == farthest[group]) & split[group])
+        first = candidates[np.r_[True, group[candidates][1:] != group[candidates][:-1]]]
+        keep[pending[first]] = True
+
+        remaining = split[group]
+        remaining[first] = False
+        pending = pending[remaining]
+    return keep
+
+
+def thin_indices(count, max_points):
+    """Índices de uma a cada N posições (sempre com a última) para caber em `max_points`."""
+    stride = max(1, -(-count // max_points))
+    indices = np.arange(0, count, stride)
+    if count and indices[-1] != count - 1:
+        indices = np.append(indices, count - 1)
+    return indices
+
+
+def pack_points(times, latitudes, longitudes):
+    points = np.empty(len(times), dtype=_POINT_DTYPE)
+    points['time'], points['latitude'], points['longitude'] = times, latitudes, longitudes
+    return points.tobytes()
+
+
+def unpack_points(data):
+    points = np.frombuffer(bytes(data), dtype=_POINT_DTYPE)
+    return points['time'], points['latitude'], points['longitude']
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _day_runs(days):
+    """Dias (em ordem) agrupados em sequências contíguas [(primeiro, último)]."""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def _read_positions(queryset, stride=1, total=0):
+    """
+    (epoch, latitude, longitude) das posições do queryset em ordem de tempo,
+    uma a cada `stride` (sempre com a última de `total`).
+    """
+    times, latitudes, longitudes = array('d'), array('d'), array('d')
+    rows = queryset.order_by('timestamp').values_list('timestamp', 'latitude', 'longitude')
+    for index, (timestamp, latitude, longitude) in enumerate(rows.iterator(chunk_size=5000)):
+        if index % stride == 0 or index == total - 1:
+            times.append(timestamp.timestamp())
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+    return np.frombuffer(times), np.frombuffer(latitudes), np.frombuffer(longitudes)
+
+
+def _positions(rover):
+    return RoverTelemetry.objects.filter(rover=rover, latitude__isnull=False, longitude__isnull=False)
+
+
+def compact_day(rover, day, tolerance):
+    """SimplifiedTrack (não gravado) com o trajeto do rover no dia (UTC); None se não houver posições."""
+    start, end = day_bounds(day)
+    times, latitudes, longitudes = _read_positions(_positions(rover).filter(timestamp__gte=start, timestamp__lt=end))
+    if not len(times):
+        return None
+    keep = simplify_mask(latitudes, longitudes, tolerance)
+    return SimplifiedTrack(
+        rover=rover,
+        day=day,
+        tolerance=tolerance,
+        raw_points=len(times),
+        point_count=int(keep.sum()),
+        points=pack_points(times[keep], latitudes[keep], longitudes[keep]),
+    )
+
+
+def track_points(rover, start, end, bbox=None, max_points=5000, tolerance=None):
+    """
+    Trajeto do rover em [start, end) em ordem de tempo:
+    [{'timestamp', 'latitude', 'longitude'}]. Dias compactados
+    (SimplifiedTrack) são lidos do trajeto gravado em vez das linhas brutas.
+    Com `tolerance` (metros), o trajeto é simplificado com Douglas-Peucker;
+    acima de `max_points`, mantém uma posição a cada N.
+    Retorna (pontos, total de posições no período).
+    """
+    stored = list(SimplifiedTrack.objects.filter(
+        rover=rover,
+        day__gte=start.astimezone(dt_timezone.utc).date(),
+        day__lte=(end - timedelta(microseconds=1)).astimezone(dt_timezone.utc).date(),
+    ).order_by('day'))
+
+    queryset = _positions(rover).filter(timestamp__gte=start, timestamp__lt=end)
+    if bbox:
+        queryset = filter_bbox(queryset, bbox)
+    for first_day, last_day in _day_runs([track.day for track in stored]):
+        queryset = queryset.exclude(timestamp__gte=day_bounds(first_day)[0], timestamp__lt=day_bounds(last_day)[1])
+
+    # Limita a memória usada pela simplificação em períodos muito longos
+    raw_total = queryset.count()
+    input_limit = settings.TRACK_SIMPLIFY_MAX_INPUT if tolerance is not None else max_points
+    stride = max(1, -(-raw_total // input_limit))
+    parts = [_read_positions(queryset, stride, raw_total)] if raw_total else []
+
+    stored_total = 0
+    for track in stored:
+        times, latitudes, longitudes = unpack_points(track.points)
+        inside = (times >= start.timestamp()) & (times < end.timestamp())
+        if bbox:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            inside &= (latitudes >= min_lat) & (latitudes <= max_lat) & (longitudes >= min_lng) & (longitudes <= max_lng)
+        stored_total += int(inside.sum())
+        parts.append((times[inside], latitudes[inside], longitudes[inside]))
+
+    if not parts:
+        return [], 0
+    times, latitudes, longitudes = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(times, kind='stable')
+    times, latitudes, longitudes = times[order], latitudes[order], longitudes[order]
+
+    if tolerance is not None:
+        keep = simplify_mask(latitudes, longitudes, tolerance)
+        times, latitudes, longitudes = times[keep], latitudes[keep], longitudes[keep]
+    indices = thin_indices(len(times), max_points)
+
+    points = [
+        {
+            'timestamp': datetime.fromtimestamp(times[index], tz=dt_timezone.utc).isoformat(),
+            'latitude': float(latitudes[index]),
+            'longitude': float(longitudes[index]),
+        }
+        for index in indices.tolist()
+    ]
+    return points, raw_total + stored_total
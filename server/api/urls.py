@@ -5,6 +5,11 @@ from .views import (
     CameraFeedView,
     direction_view,
     get_sensor_data,
+    sensor_series,
+    telemetry_history,
+    telemetry_parquet,
+    rovers_in_area,
+    rover_track,
     select_mission_view,
     GPSDataView,
     ImageView,
@@ -12,7 +17,9 @@ from .views import (
     RoverViewSet,
     SubstationViewSet,
     list_active_rovers,
+    fleet_snapshot_view,
     health_check,
+    ingest_stats,
     request_image_view,
     process_mapping,
     iniciar_missao,
@@ -33,14 +40,21 @@ router.register(r'substations', SubstationViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('health/', health_check, name='health-check'),
+    path('ingest-stats/', ingest_stats, name='ingest-stats'),
     path('camera-feed/', CameraFeedView.as_view(), name='camera-feed'),
     path('box-click/', box_click_view, name='box-click'),
     path('imagem/', ImageView.as_view(), name='image_view'),
     path('direction/', direction_view, name='direction'),
     path('sensor-data/', get_sensor_data, name='sensor-data'),
+    path('sensor-series/', sensor_series, name='sensor-series'),
+    path('history/', telemetry_history, name='telemetry-history'),
+    path('export/parquet/', telemetry_parquet, name='telemetry-parquet'),
+    path('geo/rovers/', rovers_in_area, name='geo-rovers'),
+    path('geo/track/', rover_track, name='geo-track'),
     path('select-mission/', select_mission_view, name='select-mission'),
     path('gps-data/', GPSDataView.as_view(), name='gps-data'),
     path('active-rovers/', list_active_rovers, name='active-rovers'),
+    path('fleet-snapshot/', fleet_snapshot_view, name='fleet-snapshot'),
     path('request-image/', request_image_view, name='request-image'),
     path('process-mapping/', process_mapping, name='process-mapping'),
     path('iniciar-missao/', iniciar_missao, name='iniciar_missao'),
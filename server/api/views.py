@@ -1,30 +1,49 @@
 import os
 import json
+import base64
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import paho.mqtt.client as mqtt
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import cache
 from django.db import connections
 from django.db.utils import OperationalError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from redis import Redis
 import redis
 import requests
-from .models import Rover, Substation, RoverTelemetry
+from .models import Rover, Substation, RoverTelemetry, RoverLatestState
+from .image_frames import IMAGE_CONTENT_TYPE
+from .image_renditions import ORIGINAL, rendition_names, rendition_redis_key
+from .history import HISTORY_FORMATS, HISTORY_SOURCES, archived_rows, parse_cursor, stream_history
+from .geo import AREA_COLUMNS, parse_bbox, rovers_in_bbox
+from .tracks import track_points
+from .fleet import alist_fleet, fleet_snapshot
+from .ingest import collect_worker_stats
+from .parquet_export import PARQUET_CONTENT_TYPE, PARQUET_SOURCES, export_archived, export_queryset, stream_parquet
+from .redis_pool import get_async_redis, get_redis, pool_stats
+from .rover_cache import rover_cache
+from .rollups import query_series
+from .mqtt_handler import image_redis_key
 from .mapping_manager import MapManager
 from .serializers import RoverSerializer, SubstationSerializer
 
 logger = logging.getLogger(__name__)
 
-redis_client = redis.Redis(host='redis', port=6379, db=1)
+# Cliente do pool compartilhado (api.redis_pool): nenhuma conexão nova por requisição.
+# As views async de leitura usam get_async_redis(), do pool do event loop.
+redis_client = get_redis()
 
 class RoverViewSet(viewsets.ModelViewSet):
     queryset = Rover.objects.all()
@@ -128,7 +147,7 @@ def clean_rover_redis_data(rover):
         redis_client.delete(key)
 
 class GPSDataView(View):
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         rover_id = request.GET.get('rover')
         substation_id = request.GET.get('substation')
 
@@ -137,7 +156,7 @@ class GPSDataView(View):
 
         # Tentar pegar do Redis primeiro
         redis_key = f'telemetry:sub{substation_id}:rover{rover_id}'
-        data = redis_client.get(redis_key)
+        data = await get_async_redis().get(redis_key)
 
         if data:
             telemetry = json.loads(data)
@@ -147,49 +166,42 @@ class GPSDataView(View):
                 'status': telemetry.get('status')
             })
 
-        # Se não encontrar no Redis, buscar último registro do PostgreSQL
+        # Se não encontrar no Redis, buscar o último estado gravado no PostgreSQL
         try:
-            rover = Rover.objects.get(identifier=rover_id)
-            last_telemetry = RoverTelemetry.objects.filter(rover=rover).latest('timestamp')
+            last_state = await RoverLatestState.objects.aget(rover__identifier=rover_id)
 
             return JsonResponse({
-                'latitude': last_telemetry.latitude,
-                'longitude': last_telemetry.longitude,
-                'status': last_telemetry.status
+                'latitude': last_state.latitude,
+                'longitude': last_state.longitude,
+                'status': last_state.status
             })
 
-        except (Rover.DoesNotExist, RoverTelemetry.DoesNotExist):
+        except RoverLatestState.DoesNotExist:
             return JsonResponse({'error': 'No data available'}, status=404)
 
-@api_view(['GET'])
-def get_sensor_data(request):
+@require_GET
+async def get_sensor_data(request):
     """
     Endpoint para obter dados dos sensores do rover.
     """
     rover_id = request.GET.get('rover')
     if not rover_id:
-        return Response({'error': 'Rover ID is required'}, status=400)
+        return JsonResponse({'error': 'Rover ID is required'}, status=400)
 
     try:
-        # Primeiro, buscar o rover para obter a subestação
-        rover = Rover.objects.select_related('substation').get(identifier=rover_id)
-        substation_id = rover.substation.identifier
+        # Subestação pelo cache de rovers: nenhuma consulta ao banco para rovers conhecidos
+        rover = await rover_cache.aget(rover_id)
+        if rover is None:
+            return JsonResponse({'error': 'Rover not found'}, status=404)
+        substation_id = rover.substation_identifier
 
         logger.info(f"Buscando dados para rover {rover_id} da substation {substation_id}")
 
-        # Conectar ao Redis
-        redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=1,
-            decode_responses=True
-        )
-
         # Tentar pegar do Redis primeiro
         redis_key = f'telemetry:sub{substation_id}:rover{rover_id}'
         logger.info(f"Buscando dados do Redis com chave: {redis_key}")
 
-        data = redis_client.get(redis_key)
+        data = await get_async_redis().get(redis_key)
         if data:
             try:
                 telemetry = json.loads(data)
@@ -199,91 +211,264 @@ def get_sensor_data(request):
                     'speed': float(telemetry.get('speed', 0)),
                     'substation': substation_id
                 }
-                return Response(response_data)
+                return JsonResponse(response_data)
             except json.JSONDecodeError as e:
                 logger.error(f"Erro ao decodificar dados do Redis: {e}")
 
-        # Se não encontrar no Redis, buscar do banco
+        # Se não encontrar no Redis, buscar o último estado gravado no banco
         try:
-            last_telemetry = RoverTelemetry.objects.filter(
-                rover=rover
-            ).latest('timestamp')
+            last_state = await RoverLatestState.objects.aget(rover_id=rover.pk)
 
             response_data = {
-                'battery': float(last_telemetry.battery_level),
-                'temperature': float(last_telemetry.temperature),
-                'speed': float(last_telemetry.speed or 0),
+                'battery': float(last_state.battery_level),
+                'temperature': float(last_state.temperature),
+                'speed': float(last_state.speed or 0),
                 'substation': substation_id
             }
-            return Response(response_data)
+            return JsonResponse(response_data)
 
-        except RoverTelemetry.DoesNotExist:
-            return Response({
+        except RoverLatestState.DoesNotExist:
+            return JsonResponse({
                 'battery': 0,
                 'temperature': 0,
                 'speed': 0,
                 'substation': substation_id
             })
 
-    except Rover.DoesNotExist:
-        return Response({'error': 'Rover not found'}, status=404)
     except Exception as e:
         logger.error(f"Erro ao buscar dados dos sensores: {str(e)}", exc_info=True)
-        return Response({
+        return JsonResponse({
             'battery': 0,
             'temperature': 0,
             'speed': 0
         })
 
+def parse_time_range(request, default_span=timedelta(hours=24)):
+    """
+    Lê ?start= e ?end= (ISO 8601) da requisição; sem eles, usa as últimas
+    `default_span`. Levanta ValueError se as datas forem inválidas.
+    """
+    end = parse_datetime(request.GET['end']) if request.GET.get('end') else timezone.now()
+    start = parse_datetime(request.GET['start']) if request.GET.get('start') else end - default_span
+    if start is None or end is None:
+        raise ValueError("Invalid start/end datetime")
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if start >= end:
+        raise ValueError("start must be before end")
+    return start, end
+
 @api_view(['GET'])
-def list_active_rovers(request):
-    """Lista todos os rovers ativos com seus últimos dados"""
+def sensor_series(request):
+    """
+    Série histórica de um sensor do rover para gráficos. A resolução (leituras
+    brutas, 1 minuto ou 1 hora) é escolhida pelo período e pelo limite de pontos.
+    """
+    rover_id = request.GET.get('rover')
+    sensor_type = request.GET.get('sensor')
+    if not rover_id or not sensor_type:
+        return Response({'error': 'Rover ID and sensor are required'}, status=400)
+
+    try:
+        start, end = parse_time_range(request)
+        max_points = min(int(request.GET.get('points', 500)), 5000)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    try:
+        rover = Rover.objects.get(identifier=rover_id)
+    except Rover.DoesNotExist:
+        return Response({'error': 'Rover not found'}, status=404)
+
+    resolution, points = query_series(rover, sensor_type, start, end, max(max_points, 1))
+    return Response({
+        'rover': rover_id,
+        'sensor': sensor_type,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'resolution': resolution,
+        'points': points
+    })
+
+@api_view(['GET'])
+def rovers_in_area(request):
+    """
+    Rovers que passaram por uma área em um período:
+    ?bbox=min_lng,min_lat,max_lng,max_lat&start=&end=[&substation=].
+    Dias já arquivados são lidos do arquivo frio.
+    """
+    try:
+        bbox = parse_bbox(request.GET.get('bbox'))
+        start, end = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    queryset = RoverTelemetry.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    substation = None
     substation_id = request.GET.get('substation')
+    if substation_id:
+        substation = Substation.objects.filter(identifier=substation_id).first()
+        if substation is None:
+            return Response({'bbox': bbox, 'start': start.isoformat(), 'end': end.isoformat(), 'rovers': []})
+        queryset = queryset.filter(rover__substation=substation)
+    archived = archived_rows('telemetry', AREA_COLUMNS, start, end, substation=substation)
+
+    return Response({
+        'bbox': bbox,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rovers': rovers_in_bbox(queryset, bbox, archived),
+    })
 
-    if not substation_id:
-        return Response({'error': 'Substation ID is required'}, status=400)
+@api_view(['GET'])
+def rover_track(request):
+    """
+    Trajeto GPS de um rover em um período, opcionalmente restrito a uma área
+    e simplificado (tolerância em metros): ?rover=&start=&end=[&bbox=][&points=][&tolerance=].
+    """
+    rover_id = request.GET.get('rover')
+    if not rover_id:
+        return Response({'error': 'Rover ID is required'}, status=400)
+
+    try:
+        start, end = parse_time_range(request)
+        bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+        max_points = min(int(request.GET.get('points', 5000)), 50000)
+        tolerance = float(request.GET['tolerance']) if request.GET.get('tolerance') else None
+        if tolerance is not None and not 0 <= tolerance < float('inf'):
+            raise ValueError("tolerance must be a non-negative number of meters")
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    try:
+        rover = Rover.objects.get(identifier=rover_id)
+    except Rover.DoesNotExist:
+        return Response({'error': 'Rover not found'}, status=404)
+
+    points, total = track_points(rover, start, end, bbox, max(max_points, 2), tolerance)
+
+    return Response({
+        'rover': rover_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total': total,
+        'tolerance': tolerance,
+        'points': points,
+    })
+
+@require_GET
+def telemetry_history(request):
+    """
+    Exporta o histórico de um rover em um período como NDJSON ou CSV, em
+    streaming: ?rover=&source=telemetry|sensors&start=&end=&format=ndjson|csv.
+    Para retomar uma exportação interrompida, passe ?after=<timestamp>,<id>
+    do último registro recebido; em NDJSON, a linha final {"next_after": ...}
+    traz esse cursor para continuar a exportação depois.
+    """
+    rover_id = request.GET.get('rover')
+    source = request.GET.get('source', 'telemetry')
+    output_format = request.GET.get('format', 'ndjson')
+
+    if not rover_id:
+        return JsonResponse({'error': 'Rover ID is required'}, status=400)
+    if source not in HISTORY_SOURCES:
+        return JsonResponse({'error': f'Unknown source: {source}'}, status=400)
+    if output_format not in HISTORY_FORMATS:
+        return JsonResponse({'error': f'Unknown format: {output_format}'}, status=400)
+
+    try:
+        start, end = parse_time_range(request)
+        after = parse_cursor(request.GET['after']) if request.GET.get('after') else None
+        if after and timezone.is_naive(after[0]):
+            after = (timezone.make_aware(after[0]), after[1])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        rover = Rover.objects.get(identifier=rover_id)
+    except Rover.DoesNotExist:
+        return JsonResponse({'error': 'Rover not found'}, status=404)
 
-    # Buscar rovers do PostgreSQL
-    rovers = Rover.objects.filter(
-        substation__identifier=substation_id,
-        is_active=True
+    response = StreamingHttpResponse(
+        stream_history(rover, source, start, end, output_format, request.GET.get('sensor'), after),
+        content_type=HISTORY_FORMATS[output_format]
     )
+    filename = f'{rover_id}_{source}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}.{output_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Evita que proxies (nginx) acumulem a resposta inteira antes de repassar
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+def telemetry_parquet(request):
+    """
+    Exporta em Parquet o histórico de um rover ou de todos os rovers de uma
+    subestação em um período: ?rover=|substation=&source=telemetry|sensors&start=&end=.
+    O arquivo é enviado em streaming, um row group por vez.
+    """
+    rover_id = request.GET.get('rover')
+    substation_id = request.GET.get('substation')
+    source = request.GET.get('source', 'telemetry')
 
-    rovers_data = []
-    for rover in rovers:
-        # Tentar pegar dados do Redis
-        redis_key = f'telemetry:sub{substation_id}:rover{rover.identifier}'
-        data = redis_client.get(redis_key)
+    if not rover_id and not substation_id:
+        return JsonResponse({'error': 'Rover ID or Substation ID is required'}, status=400)
+    if source not in PARQUET_SOURCES:
+        return JsonResponse({'error': f'Unknown source: {source}'}, status=400)
 
-        if data:
-            telemetry = json.loads(data)
-            rovers_data.append({
-                'id': rover.identifier,
-                'name': rover.name,
-                'battery': telemetry.get('battery', 0),
-                'temperature': telemetry.get('temperature', 0),
-                'status': telemetry.get('status', 'unknown'),
-                'last_seen': 'now'  # Dados do Redis são sempre recentes
-            })
+    try:
+        start, end = parse_time_range(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rover = substation = None
+    try:
+        if rover_id:
+            rover = Rover.objects.get(identifier=rover_id)
         else:
-            # Se não encontrar no Redis, buscar do PostgreSQL
-            try:
-                last_telemetry = RoverTelemetry.objects.filter(
-                    rover=rover
-                ).latest('timestamp')
-
-                rovers_data.append({
-                    'id': rover.identifier,
-                    'name': rover.name,
-                    'battery': last_telemetry.battery_level,
-                    'temperature': last_telemetry.temperature,
-                    'status': last_telemetry.status,
-                    'last_seen': last_telemetry.timestamp.isoformat()
-                })
-            except RoverTelemetry.DoesNotExist:
-                continue  # Pular rovers sem dados de telemetria
+            substation = Substation.objects.get(identifier=substation_id)
+    except (Rover.DoesNotExist, Substation.DoesNotExist):
+        return JsonResponse({'error': 'Rover or substation not found'}, status=404)
+
+    queryset = export_queryset(source, start, end, rover, substation, request.GET.get('sensor'))
+    archived = export_archived(source, start, end, rover, substation, request.GET.get('sensor'))
+    response = StreamingHttpResponse(stream_parquet(source, queryset, archived=archived), content_type=PARQUET_CONTENT_TYPE)
+    filename = f'{rover_id or substation_id}_{source}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}.parquet'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+async def list_active_rovers(request):
+    """Lista todos os rovers ativos com seus últimos dados"""
+    substation_id = request.GET.get('substation')
+
+    if not substation_id:
+        return JsonResponse({'error': 'Substation ID is required'}, status=400)
+
+    # Uma consulta ao banco e um MGET no Redis, qualquer que seja o tamanho da frota
+    return JsonResponse(await alist_fleet(substation_id, get_async_redis()), safe=False)
 
-    return Response(rovers_data)
+@require_GET
+def fleet_snapshot_view(request):
+    """
+    Todas as subestações com os rovers e o último estado de cada um, em um só
+    documento. A ETag é a versão do snapshot: enquanto nada mudar, o cliente
+    que envia If-None-Match recebe 304 sem corpo, ao custo de um GET no Redis.
+    """
+    version = fleet_snapshot.version()
+    etag = f'"fleet-{version}"' if version is not None else None
+
+    if etag and etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(fleet_snapshot.get(version), content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    # O navegador pode guardar a resposta, mas deve sempre revalidar com a ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
 # api/views.py (adicione junto com as outras views)
 
 class CameraFeedView(View):
@@ -389,7 +574,14 @@ def select_mission_view(request):
    return JsonResponse({'status': 'failure'}, status=400)
 
 class ImageView(View):
-    def get(self, request, *args, **kwargs):
+    """
+    Última imagem do rover. Por padrão responde JSON com a imagem em base64 e
+    as boxes; com ?format=jpeg responde os bytes do JPEG diretamente.
+    ?rendition=thumb|medium escolhe uma versão reduzida (com a original como
+    alternativa enquanto a versão reduzida ainda não foi gerada).
+    """
+
+    async def get(self, request, *args, **kwargs):
         rover_id = request.GET.get('rover')
         substation_id = request.GET.get('substation')
 
@@ -397,24 +589,30 @@ class ImageView(View):
             return JsonResponse({'error': 'Rover and substation IDs are required'}, status=400)
 
         try:
-            # Tentar pegar do Redis primeiro (cache temporário)
-            redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=1,
-                decode_responses=True
-            )
-
-            # Usar chaves separadas para imagem e boxes
-            image_key = f'image:sub{substation_id}:rover{rover_id}'
+            rendition = request.GET.get('rendition', ORIGINAL)
+            if rendition not in rendition_names():
+                return JsonResponse({'error': f'Unknown rendition: {rendition}'}, status=400)
+
+            # Versão pedida primeiro, original como alternativa, boxes por último: um único MGET
+            image_keys = [image_redis_key(substation_id, rover_id)]
+            if rendition != ORIGINAL:
+                image_keys.insert(0, rendition_redis_key(substation_id, rover_id, rendition))
             boxes_key = f'boxes:sub{substation_id}:rover{rover_id}'
 
-            image_data = redis_client.get(image_key)
-            boxes_data = redis_client.get(boxes_key)
+            # A imagem é guardada como bytes do JPEG: cliente sem decode_responses
+            *images, boxes_data = await get_async_redis(binary=True).mget(*image_keys, boxes_key)
+            image_bytes = next((image for image in images if image), None)
+
+            if request.GET.get('format') == 'jpeg':
+                if not image_bytes:
+                    return JsonResponse({'error': 'No recent image data available'}, status=404)
+                response = HttpResponse(image_bytes, content_type=IMAGE_CONTENT_TYPE)
+                response['Cache-Control'] = 'no-store'
+                return response
 
-            if image_data and boxes_data:
+            if image_bytes and boxes_data:
                 return JsonResponse({
-                    'image': image_data,
+                    'image': base64.b64encode(image_bytes).decode('ascii'),
                     'objects': json.loads(boxes_data)
                 })
             else:
@@ -443,11 +641,6 @@ def health_check(request):
 
     # Verificar conexão com Redis
     try:
-        redis_client = Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            socket_connect_timeout=1
-        )
         redis_status = redis_client.ping()
     except Exception:
         redis_status = False
@@ -460,6 +653,27 @@ def health_check(request):
 
     return Response(status)
 
+@api_view(['GET'])
+def ingest_stats(request):
+    """
+    Métricas do pipeline de ingestão MQTT: do MQTTHandler deste processo (se
+    ativo) e de cada worker `run_ingest`, com a parcela de mensagens de cada um,
+    e o uso dos pools de conexões Redis deste processo
+    """
+    response_data = {'redis_pools': pool_stats()}
+
+    mqtt_handler = apps.get_app_config('api').mqtt_handler
+    if mqtt_handler is not None:
+        response_data['mqtt_handler'] = mqtt_handler.get_stats()
+
+    try:
+        response_data['ingest_workers'] = collect_worker_stats(redis_client)
+    except redis.RedisError as e:
+        logger.error(f"Erro ao ler métricas dos workers de ingestão: {e}")
+        response_data['ingest_workers'] = None
+
+    return Response(response_data)
+
 @api_view(['POST'])
 def request_image_view(request):
     try:
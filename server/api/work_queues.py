@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import deque, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Políticas de estouro de fila
+POLICY_BLOCK = 'block'              # produtor espera por espaço (até block_timeout)
+POLICY_DROP_OLDEST = 'drop_oldest'  # descarta o item mais antigo da fila
+POLICY_LATEST = 'latest'            # mantém só o item mais recente de cada chave (ex.: rover)
+
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST)
+
+
+class BoundedWorkQueue:
+    """
+    Fila limitada entre o callback MQTT e as threads que executam os handlers.
+
+    O callback apenas enfileira; `workers` threads consomem a fila chamando o
+    handler informado em start(). O comportamento com a fila cheia é definido
+    pela política (ver POLICIES). Profundidade, descartes e tempo em fila são
+    expostos por get_stats().
+    """
+
+    def __init__(self, name, maxsize, policy=POLICY_BLOCK, workers=1, block_timeout=30.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de fila desconhecida: {policy}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.workers = workers
+        self.block_timeout = block_timeout
+
+        # Na política 'latest' os itens ficam indexados pela chave
+        self._items = OrderedDict() if policy == POLICY_LATEST else deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._handler = None
+
+        self._stats = {
+            'enqueued': 0,
+            'processed': 0,
+            'dropped': 0,
+            'errors': 0,
+            'max_depth': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
+
+    def start(self, handler):
+        self._handler = handler
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'queue-{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def put(self, key, item):
+        """
+        Enfileira um item. Retorna False se o item (ou outro, mais antigo)
+        tiver sido descartado por falta de espaço.
+        """
+        enqueued_at = time.monotonic()
+        accepted = True
+        with self._cond:
+            if self.policy == POLICY_LATEST:
+                if key in self._items:
+                    # Substitui o item pendente da mesma chave
+                    del self._items[key]
+                    self._stats['dropped'] += 1
+                    accepted = False
+                elif len(self._items) >= self.maxsize:
+                    self._items.popitem(last=False)
+                    self._stats['dropped'] += 1
+                    accepted = False
+                self._items[key] = (item, enqueued_at)
+            else:
+                if len(self._items) >= self.maxsize:
+                    if self.policy == POLICY_DROP_OLDEST:
+                        self._items.popleft()
+                        self._stats['dropped'] += 1
+                        accepted = False
+                    elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize, self.block_timeout):
+                        self._stats['dropped'] += 1
+                        logger.error(f"Fila '{self.name}' cheia por {self.block_timeout}s; mensagem descartada")
+                        return False
+                self._items.append((item, enqueued_at))
+
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], len(self._items))
+            self._cond.notify_all()
+        return accepted
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['depth'] = len(self._items)
+        total_wait_ms = stats.pop('total_wait_ms')
+        stats['avg_wait_ms'] = round(total_wait_ms / stats['processed'], 3) if stats['processed'] else 0.0
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        stats['maxsize'] = self.maxsize
+        stats['policy'] = self.policy
+        stats['workers'] = self.workers
+        return stats
+
+    def _take(self):
+        if self.policy == POLICY_LATEST:
+            return self._items.popitem(last=False)[1]
+        return self._items.popleft()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items or not self._running)
+                if not self._items:
+                    return
+                item, enqueued_at = self._take()
+                # Libera produtores bloqueados aguardando espaço
+                self._cond.notify_all()
+
+            wait_ms = (time.monotonic() - enqueued_at) * 1000
+            try:
+                self._handler(item)
+            except Exception as e:
+                logger.error(f"Erro ao processar item da fila '{self.name}': {e}", exc_info=True)
+                with self._cond:
+                    self._stats['errors'] += 1
+
+            with self._cond:
+                self._stats['processed'] += 1
+                self._stats['total_wait_ms'] += wait_ms
+                self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait_ms)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -153,10 +154,107 @@ USE_TZ = True
 
 MQTT_HOST = os.environ.get('MQTT_HOST', 'mqtt')
 MQTT_PORT = int(os.environ.get('MQTT_PORT', 1883))
+# Keepalive (segundos) das conexões da ingestão com o broker
+MQTT_KEEPALIVE = int(os.environ.get('MQTT_KEEPALIVE', 60))
+
+# Modo de ingestão MQTT:
+#   'thread'   -> MQTTHandler (paho loop_start) dentro do processo web (padrão)
+#   'external' -> ingestão feita por processos separados (`manage.py run_ingest`)
+MQTT_INGEST_MODE = os.environ.get('MQTT_INGEST_MODE', 'thread')
+INGEST_CONCURRENCY = int(os.environ.get('INGEST_CONCURRENCY', 256))
+INGEST_RECONNECT_INTERVAL = float(os.environ.get('INGEST_RECONNECT_INTERVAL', 5))
+# Filas limitadas entre o callback do paho e os handlers (api.work_queues).
+# Políticas: 'block' (espera por espaço), 'drop_oldest', 'latest' (só o mais recente por rover).
+# Com mais de um worker, mensagens de um mesmo rover podem ser processadas fora de ordem
+# (na 'latest', um quadro antigo sobrescreveria um mais novo): essas filas usam um worker.
+# A 'block' espera dentro da thread de rede do paho, que não envia o PINGREQ enquanto isso:
+# MQTT_QUEUE_BLOCK_TIMEOUT precisa ficar abaixo de MQTT_KEEPALIVE (verificado no MQTTHandler).
+MQTT_QUEUE_BLOCK_TIMEOUT = float(os.environ.get('MQTT_QUEUE_BLOCK_TIMEOUT', 10))
+MQTT_WORK_QUEUES = {
+    'telemetry': {
+        'maxsize': int(os.environ.get('MQTT_TELEMETRY_QUEUE_SIZE', 10000)),
+        'policy': 'block',
+        'workers': 1,
+        'block_timeout': MQTT_QUEUE_BLOCK_TIMEOUT,
+    },
+    'image': {'maxsize': int(os.environ.get('MQTT_IMAGE_QUEUE_SIZE', 50)), 'policy': 'latest', 'workers': 1},
+    'boxes': {'maxsize': int(os.environ.get('MQTT_BOXES_QUEUE_SIZE', 1000)), 'policy': 'drop_oldest', 'workers': 1},
+    'insta/config': {'maxsize': 100, 'policy': 'block', 'workers': 1, 'block_timeout': MQTT_QUEUE_BLOCK_TIMEOUT},
+}
+
+# Grupo de assinatura compartilhada ($share/<grupo>/...) para dividir a carga entre vários workers
+INGEST_SHARED_GROUP = os.environ.get('INGEST_SHARED_GROUP', '')
+INGEST_STATS_INTERVAL = float(os.environ.get('INGEST_STATS_INTERVAL', 10))
 
 # Redis Settings
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+REDIS_DB = int(os.environ.get('REDIS_DB', 1))
+# Pools de conexões compartilhados (api.redis_pool): conexões por pool e por processo, espera
+# máxima (s) por uma conexão livre e timeout (s) para abrir uma conexão
+REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get('REDIS_POOL_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 5))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 2))
+
+# Gravação da telemetria em lotes (api.telemetry_writer)
+TELEMETRY_BATCH_SIZE = int(os.environ.get('TELEMETRY_BATCH_SIZE', 500))
+TELEMETRY_FLUSH_INTERVAL_MS = int(os.environ.get('TELEMETRY_FLUSH_INTERVAL_MS', 1000))
+TELEMETRY_LOCK_ROVERS = os.environ.get('TELEMETRY_LOCK_ROVERS', 'false').lower() == 'true'
+TELEMETRY_MAX_PENDING = int(os.environ.get('TELEMETRY_MAX_PENDING', 20000))
+
+# Registro de sensores da telemetria (api.sensors): campo do payload -> como gravar. Nomes só com [a-z0-9_].
+#   'column': sensor do núcleo, gravado só nessa coluna de RoverTelemetry
+#   sem 'column': gravado em SensorReading, no máximo uma leitura a cada 'sample_seconds' por rover (0 = todas)
+# Sensores extras via JSON, ex.: TELEMETRY_EXTRA_SENSORS='{"humidity": {"unit": "%", "sample_seconds": 10}}'
+TELEMETRY_SENSORS = {
+    'battery': {'column': 'battery_level', 'unit': '%'},
+    'temperature': {'column': 'temperature', 'unit': '°C'},
+    'speed': {'column': 'speed', 'unit': 'km/h'},
+    **json.loads(os.environ.get('TELEMETRY_EXTRA_SENSORS', '{}')),
+}
+
+# Gravação agrupada dos últimos valores no Redis (api.redis_batcher)
+REDIS_BATCH_INTERVAL_MS = int(os.environ.get('REDIS_BATCH_INTERVAL_MS', 50))
+REDIS_BATCH_MAX_PENDING = int(os.environ.get('REDIS_BATCH_MAX_PENDING', 1000))
+
+# Particionamento por faixa de tempo de RoverTelemetry/SensorReading (api.partitions, PostgreSQL)
+TELEMETRY_PARTITION_INTERVAL = os.environ.get('TELEMETRY_PARTITION_INTERVAL', 'week')  # 'day' ou 'week'
+TELEMETRY_PARTITIONS_AHEAD = int(os.environ.get('TELEMETRY_PARTITIONS_AHEAD', 4))
+# Retenção em dias (0 = manter tudo); aplicada removendo partições inteiras
+TELEMETRY_RETENTION_DAYS = int(os.environ.get('TELEMETRY_RETENTION_DAYS', 0))
+
+# Arquivo frio da telemetria (api.archive): diretório dos arquivos Parquet por rover e dia e
+# idade, em dias, a partir da qual as linhas saem do banco (0 = não arquivar)
+TELEMETRY_ARCHIVE_DIR = os.environ.get('TELEMETRY_ARCHIVE_DIR', '/data/telemetry_archive')
+TELEMETRY_ARCHIVE_AFTER_DAYS = int(os.environ.get('TELEMETRY_ARCHIVE_AFTER_DAYS', 0))
+
+# Agregados de sensores (api.rollups): margem para dados atrasados e intervalo do update_rollups --loop
+ROLLUP_LATE_DATA_SECONDS = int(os.environ.get('ROLLUP_LATE_DATA_SECONDS', 120))
+ROLLUP_UPDATE_INTERVAL = int(os.environ.get('ROLLUP_UPDATE_INTERVAL', 60))
+
+# Trajetos dos rovers (api.tracks): tolerância padrão da simplificação (metros), idade mínima
+# dos dias compactados pelo compact_tracks e máximo de posições lidas por trajeto simplificado
+TRACK_SIMPLIFY_TOLERANCE = float(os.environ.get('TRACK_SIMPLIFY_TOLERANCE', 2.0))
+TRACK_COMPACT_AFTER_DAYS = int(os.environ.get('TRACK_COMPACT_AFTER_DAYS', 7))
+TRACK_SIMPLIFY_MAX_INPUT = int(os.environ.get('TRACK_SIMPLIFY_MAX_INPUT', 500000))
+
+# Exportação do histórico em streaming (api.history): linhas por página (keyset)
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 5000))
+
+# Exportação em Parquet (api.parquet_export): linhas por row group e compressão das colunas
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PARQUET_ROW_GROUP_SIZE', 100000))
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+
+# Versões reduzidas das imagens dos rovers (api.image_renditions): lado maior em pixels e qualidade JPEG
+IMAGE_RENDITIONS = {
+    'thumb': {'max_size': int(os.environ.get('IMAGE_THUMB_SIZE', 160)), 'quality': 70},
+    'medium': {'max_size': int(os.environ.get('IMAGE_MEDIUM_SIZE', 640)), 'quality': 80},
+}
+IMAGE_RENDITION_WORKERS = int(os.environ.get('IMAGE_RENDITION_WORKERS', 2))
+
+# Cache identifier -> pk dos rovers (api.rover_cache)
+ROVER_CACHE_NEGATIVE_TTL = float(os.environ.get('ROVER_CACHE_NEGATIVE_TTL', 30))
+ROVER_CACHE_REFRESH_INTERVAL = float(os.environ.get('ROVER_CACHE_REFRESH_INTERVAL', 300))
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
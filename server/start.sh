@@ -18,6 +18,10 @@ wait_for_db
 echo "Applying database migrations..."
 python manage.py migrate
 
+# Criar partições futuras de telemetria e aplicar a retenção
+echo "Managing telemetry partitions..."
+python manage.py manage_partitions
+
 # Criar dados iniciais
 echo "Setting up initial data..."
 python manage.py setup_initial_data